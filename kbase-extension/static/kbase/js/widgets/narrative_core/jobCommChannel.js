@@ -500,7 +500,9 @@ define([
         getJobInitCode() {
             return [
                 'from biokbase.narrative.jobs.jobcomm import JobComm',
-                'JobComm().start_job_status_loop(init_jobs=True)'
+                'from biokbase.narrative.jobs.specmanager import SpecManager',
+                'JobComm().start_job_status_loop(init_jobs=True)',
+                'SpecManager().start_auto_refresh()'
             ].join('\n');
         }
     }
@@ -7,6 +7,7 @@ import requests
 import json
 from biokbase.narrative.common.url_config import URLS
 from biokbase.narrative.common.util import kbase_env
+import biokbase.narrative.clients as clients
 
 tokenenv = 'KB_AUTH_TOKEN'
 token_api_url = URLS.auth + "/api/V2"
@@ -29,8 +30,10 @@ def validate_token():
 def set_environ_token(token):
     """
     Sets a login token in the local environment variable.
+    Any cached service clients get dropped, since they were built with the old token.
     """
     kbase_env.auth_token = token
+    clients.reset()
 
 
 def get_auth_token():
@@ -64,6 +67,9 @@ def init_session_env(auth_info, ip):
         user: the username of whoever created the auth token
       ip: the client IP address
     """
+    # imported here, since app_util imports this module
+    from biokbase.narrative.app_util import clear_system_variable_cache
+    clear_system_variable_cache()
     set_environ_token(auth_info.get('token', None))
     kbase_env.session = auth_info.get('id', '')
     kbase_env.user = auth_info.get('user', '')
@@ -7,6 +7,7 @@
 
 import json as _json
 import requests as _requests
+from biokbase import session_pool as _session_pool
 import random as _random
 import os as _os
 
@@ -165,9 +166,10 @@ class BaseClient(object):
             arg_hash['context'] = context
 
         body = _json.dumps(arg_hash, cls=_JSONObjectEncoder)
-        ret = _requests.post(url, data=body, headers=self._headers,
-                             timeout=self.timeout,
-                             verify=not self.trust_all_ssl_certificates)
+        session = _session_pool.get_session(url)
+        ret = session.post(url, data=body, headers=self._headers,
+                           timeout=self.timeout,
+                           verify=not self.trust_all_ssl_certificates)
         ret.encoding = 'utf-8'
         if ret.status_code == 500:
             if ret.headers.get(_CT) == _AJ:
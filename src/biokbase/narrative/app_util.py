@@ -1,8 +1,10 @@
 import os
 import re
 import json
+import functools
 import biokbase.narrative.clients as clients
 import biokbase.auth
+from biokbase.narrative.common.cache import TTLCache
 import time
 
 """
@@ -12,6 +14,24 @@ __author__ = "Bill Riehl <wjriehl@lbl.gov>, Roman Sutormin <rsutormin@lbl.gov>"
 
 app_version_tags = ['release', 'beta', 'dev']
 
+# max number of objects to look up in a single Workspace call
+OBJECT_INFO_BATCH_SIZE = 1000
+# max number of object infos to keep cached, and for how many seconds
+OBJECT_INFO_CACHE_SIZE = 5000
+OBJECT_INFO_CACHE_TTL = 300
+# names and unversioned references can point to a new version at any time (e.g. after an
+# upload, or a save by someone else), so they're only kept for this many seconds
+OBJECT_NAME_CACHE_TTL = 10
+
+# keys = versioned UPA (or reference path ending in one), values = (object info, path)
+_object_info_cache = TTLCache(maxsize=OBJECT_INFO_CACHE_SIZE, ttl=OBJECT_INFO_CACHE_TTL)
+# keys = any other object reference, values = (object info, path)
+_object_name_cache = TTLCache(maxsize=OBJECT_INFO_CACHE_SIZE, ttl=OBJECT_NAME_CACHE_TTL)
+
+# Looked up system variables, these don't change during a session.
+# keys = (variable name, workspace name or auth token), values = variable value
+_system_variable_cache = dict()
+
 
 def check_tag(tag, raise_exception=False):
     """
@@ -50,6 +70,9 @@ def system_variable(var):
         user_id - returns the current user's id
 
     if anything is not found, returns None
+
+    workspace_id and user_id are looked up once per workspace and auth token,
+    then remembered until clear_system_variable_cache is called.
     """
     var = var.lower()
     if var == 'workspace':
@@ -58,8 +81,12 @@ def system_variable(var):
         ws_name = os.environ.get('KB_WORKSPACE_ID', None)
         if ws_name is None:
             return None
+        cache_key = ('workspace_id', ws_name)
+        if cache_key in _system_variable_cache:
+            return _system_variable_cache[cache_key]
         try:
             ws_info = clients.get('workspace').get_workspace_info({'workspace': ws_name})
+            _system_variable_cache[cache_key] = ws_info[0]
             return ws_info[0]
         except:
             return None
@@ -67,9 +94,15 @@ def system_variable(var):
         token = biokbase.auth.get_auth_token()
         if token is None:
             return None
+        cache_key = ('user_id', token)
+        if cache_key in _system_variable_cache:
+            return _system_variable_cache[cache_key]
         try:
             user_info = biokbase.auth.get_user_info(token)
-            return user_info.get('user', None)
+            user_id = user_info.get('user', None)
+            if user_id is not None:
+                _system_variable_cache[cache_key] = user_id
+            return user_id
         except:
             return None
         # TODO: make this better with more exception handling.
@@ -83,6 +116,14 @@ def system_variable(var):
         return None
 
 
+def clear_system_variable_cache():
+    """
+    Forgets all looked up system variables, so they get looked up again on
+    next use.
+    """
+    _system_variable_cache.clear()
+
+
 def map_inputs_from_job(job_inputs, app_spec):
     """
     Unmaps the actual list of job inputs back to the
@@ -209,10 +250,91 @@ def app_param(p):
     return p_info
 
 
-def map_outputs_from_state(state, params, app_spec):
+class AppParams(list):
+    """
+    The compiled parameters of an app spec - see compile_app_params.
+    This is the list of parameter infos (see app_param, plus parameter groups), with required
+    parameters first and outputs last. It also keeps these indexes over them:
+    by_id - dict, keys = param id, values = param info
+    group_of - dict, keys = id of a param that's part of a group, values = id of the group
+    output_ids - list of ids of the output object params
+    type_patterns - dict, keys = param id, values = list of compiled allowed type regexes
+
+    These get cached and shared by the SpecManager, so don't change them.
+    """
+    def __init__(self, params):
+        super().__init__(params)
+        self.by_id = dict()
+        self.group_of = dict()
+        self.output_ids = list()
+        self.type_patterns = dict()
+        for p in self:
+            self.by_id[p['id']] = p
+            for child in p.get('parameter_ids') or []:
+                self.group_of[child] = p['id']
+            if p.get('is_output'):
+                self.output_ids.append(p['id'])
+            if p.get('allowed_types'):
+                self.type_patterns[p['id']] = _type_patterns(tuple(p['allowed_types']))
+
+
+def compile_app_params(spec):
+    """
+    Returns the AppParams for an app spec. The list of params has a dict for each param
+    (see app_param) and each param group, like this:
+    {
+        optional = boolean,
+        is_constant = boolean,
+        value = (whatever, optional),
+        type = [text|int|float|list|group],
+        is_output = boolean,
+        short_hint = string,
+        description = string,
+        allowed_values = list (optional),
+    }
+    """
+    params = list()
+    for p in spec['parameters']:
+        p_info = app_param(p)
+        params.append(p_info)
+
+    for p in spec.get('parameter_groups', []):
+        p_info = {'id': p.get('id', ''), 'is_group': True}
+        p_info['optional'] = p.get('optional', 0) == 1
+        p_info['short_hint'] = p.get('short_hint', '')
+        p_info['description'] = p.get('ui_name', '')
+        p_info['parameter_ids'] = p.get('parameter_ids', [])
+        p_info['id_mapping'] = p.get('id_mapping', {})
+        p_info['allow_multiple'] = p.get('allow_multiple', 0)
+        p_info['type'] = 'group'
+
+        params.append(p_info)
+
+    return AppParams(sorted(params, key=lambda p: (p.get('optional', False),
+                                                   p.get('is_output', False))))
+
+
+def params_index(spec_params):
+    """
+    Returns a dict of the given list of spec params, keys = param id, values = param info.
+    If it's an AppParams, that's already made.
+    """
+    if isinstance(spec_params, AppParams):
+        return spec_params.by_id
+    return dict((p['id'], p) for p in spec_params)
+
+
+@functools.lru_cache(maxsize=1024)
+def _type_patterns(allowed_types):
+    return [re.compile(t) for t in allowed_types]
+
+
+def map_outputs_from_state(state, params, app_spec, spec_params=None):
     """
     Returns the dict of output values from a completed app.
     Also returns the output widget.
+    spec_params is an optional AppParams for app_spec, used instead of rebuilding the
+    param infos.
     """
     if 'behavior' not in app_spec:
         raise ValueError("Invalid app spec - unable to map outputs")
@@ -222,8 +344,11 @@ def map_outputs_from_state(state, params, app_spec):
         # for viewers or short-running things, but the inner keys are the same.
         out_mapping_key = 'output_mapping'
 
-    spec_params = dict((app_spec_param['id'], app_param(app_spec_param))
-                       for app_spec_param in app_spec['parameters'])
+    if spec_params is None:
+        spec_params = dict((app_spec_param['id'], app_param(app_spec_param))
+                           for app_spec_param in app_spec['parameters'])
+    else:
+        spec_params = params_index(spec_params)
 
     for out_param in app_spec['behavior'].get(out_mapping_key, []):
         value = None
@@ -241,6 +366,8 @@ def map_outputs_from_state(state, params, app_spec):
         spec_param = None
         if input_param_id:
             spec_param = spec_params.get(input_param_id)
+            if spec_param is not None and spec_param.get('is_group'):
+                spec_param = None
         value = transform_param_value(out_param.get('target_type_transform'), value, spec_param)
 
         p_id = out_param.get('target_property', None)
@@ -313,14 +440,14 @@ def get_result_sub_path(result, path):
     return get_result_sub_path(result.get(path_head), path_tail)
 
 
-def extract_ws_refs(app_id, tag, spec_params, params):
+def extract_ws_refs(app_id, tag, spec_params, params, ws_infos=None):
     """
     Returns a list of workspace refs (xxx/yyy/zzz) from the given parameters,
     if they are actual workspace objects.
+    ws_infos is an optional dict of object infos from resolve_object_infos,
+    used instead of looking up each object separately.
     """
-    # Cheater way for making a dict of params with param[id] => param
-    params_dict = dict((spec_params[i]['id'], spec_params[i])
-                       for i in range(len(spec_params)))
+    params_dict = params_index(spec_params)
     workspace = system_variable('workspace')
     ws_input_refs = list()
     for p in spec_params:
@@ -328,7 +455,8 @@ def extract_ws_refs(app_id, tag, spec_params, params):
             (wsref, err) = check_parameter(p,
                                            params[p['id']],
                                            workspace,
-                                           all_params=params_dict)
+                                           all_params=params_dict,
+                                           ws_infos=ws_infos)
             if wsref is not None:
                 if isinstance(wsref, list):
                     for ref in wsref:
@@ -339,7 +467,7 @@ def extract_ws_refs(app_id, tag, spec_params, params):
     return ws_input_refs
 
 
-def validate_parameters(app_id, tag, spec_params, params):
+def validate_parameters(app_id, tag, spec_params, params, ws_infos=None):
     """
     Validates the dict of params against the spec_params. If all is good,
     it updates a few parameters that need it - checkboxes go from
@@ -352,12 +480,12 @@ def validate_parameters(app_id, tag, spec_params, params):
     If it fails, this will raise a ValueError with a description of the
     problem and a (hopefully useful!) hint for the user as to what went
     wrong.
-    """
-    spec_param_ids = [p['id'] for p in spec_params]
 
-    # Cheater way for making a dict of params with param[id] => param
-    params_dict = dict((spec_params[i]['id'], spec_params[i])
-                       for i in range(len(spec_params)))
+    ws_infos is an optional dict of object infos from resolve_object_infos.
+    If not given, all workspace objects in params get looked up here in a
+    single call.
+    """
+    params_dict = params_index(spec_params)
 
     # First, test for presence.
     missing_params = list()
@@ -375,7 +503,7 @@ def validate_parameters(app_id, tag, spec_params, params):
     # Next, test for extra params that don't make sense
     extra_params = list()
     for p in params.keys():
-        if p not in spec_param_ids:
+        if p not in params_dict:
             extra_params.append(p)
     if len(extra_params):
         msg = 'Unknown parameters {} - maybe something was misspelled?\n' \
@@ -394,6 +522,11 @@ def validate_parameters(app_id, tag, spec_params, params):
         msg = msg.format(workspace, ws_id)
         raise ValueError(msg)
 
+    if ws_infos is None:
+        ws_infos = resolve_object_infos(
+            workspace, collect_object_values(spec_params, [params])
+        )
+
     param_errors = list()
     # If they're workspace objects, track their refs in a list we'll pass
     # to run_job as a separate param to track provenance.
@@ -403,7 +536,8 @@ def validate_parameters(app_id, tag, spec_params, params):
             (wsref, err) = check_parameter(p,
                                            params[p['id']],
                                            workspace,
-                                           all_params=params_dict)
+                                           all_params=params_dict,
+                                           ws_infos=ws_infos)
             if err is not None:
                 param_errors.append("{} - {}".format(p['id'], err))
             if wsref is not None:
@@ -434,7 +568,7 @@ def validate_parameters(app_id, tag, spec_params, params):
     return (params, ws_input_refs)
 
 
-def check_parameter(param, value, workspace, all_params=dict()):
+def check_parameter(param, value, workspace, all_params=dict(), ws_infos=None):
     """
     Checks if the given value matches the rules provided in the param dict.
     If yes, returns None
@@ -455,6 +589,8 @@ def check_parameter(param, value, workspace, all_params=dict()):
     all_params : dict (param id -> param dict)
         All spec parameters. Really only needed when validating a parameter
         group, because it probably needs to dig into all of them.
+    ws_infos : dict (optional)
+        Object infos already fetched by resolve_object_infos.
     """
     if param['allow_multiple'] and isinstance(value, list):
         ws_refs = list()
@@ -465,7 +601,8 @@ def check_parameter(param, value, workspace, all_params=dict()):
                 (ref, err) = validate_group_values(param,
                                                    v,
                                                    workspace,
-                                                   all_params)
+                                                   all_params,
+                                                   ws_infos=ws_infos)
                 if err:
                     error_list += err
                 if ref:
@@ -474,7 +611,8 @@ def check_parameter(param, value, workspace, all_params=dict()):
                 # returns a single ref / err pair
                 (ref, err) = validate_param_value(param,
                                                   v,
-                                                  workspace)
+                                                  workspace,
+                                                  ws_infos=ws_infos)
                 if err:
                     error_list.append(err)
                 if ref:
@@ -483,10 +621,10 @@ def check_parameter(param, value, workspace, all_params=dict()):
             return (None, "\n\t".join(error_list))
         else:
             return (ws_refs, None)
-    return validate_param_value(param, value, workspace)
+    return validate_param_value(param, value, workspace, ws_infos=ws_infos)
 
 
-def validate_group_values(param, value, workspace, spec_params):
+def validate_group_values(param, value, workspace, spec_params, ws_infos=None):
     ref = list()
     err = list()
 
@@ -509,7 +647,7 @@ def validate_group_values(param, value, workspace, spec_params):
             )
             continue
         (param_ref, param_err) = validate_param_value(
-            spec_params[param_id], value[param_id], workspace
+            spec_params[param_id], value[param_id], workspace, ws_infos=ws_infos
         )
         if param_ref:
             ref.append(param_ref)
@@ -518,7 +656,7 @@ def validate_group_values(param, value, workspace, spec_params):
     return (ref, err)
 
 
-def validate_param_value(param, value, workspace):
+def validate_param_value(param, value, workspace, ws_infos=None):
     """
     Tests a value to make sure it's valid, based on the rules given in the
     param dict. Returns None if valid, an error string if not.
@@ -535,6 +673,9 @@ def validate_param_value(param, value, workspace):
     workspace : string
         The name of the current workspace to test workspace object types
         against, if required by the parameter.
+    ws_infos : dict (optional)
+        Object infos already fetched by resolve_object_infos. Objects not in
+        there get looked up one at a time.
     """
     # The workspace reference for the parameter. Can be None.
     ws_ref = None
@@ -594,20 +735,16 @@ def validate_param_value(param, value, workspace):
                                          'have the right format - should be ' +
                                          'workspace/object/version(optional)'
                                          ).format(value))
-                info = clients.get('workspace').get_object_info_new({
-                    'objects': [{'ref': value}]
-                })[0]
+                info = get_object_info(workspace, value, ws_infos)
                 path_items[len(path_items) - 1] = "{}/{}/{}".format(info[6], info[0], info[4])
                 ws_ref = ';'.join(path_items)
             # Otherwise, assume it's a name, not a reference.
             else:
-                info = clients.get('workspace').get_object_info_new({
-                    'objects': [{'workspace': workspace, 'name': value}]
-                })[0]
+                info = get_object_info(workspace, value, ws_infos)
                 ws_ref = "{}/{}/{}".format(info[6], info[0], info[4])
             type_ok = False
-            for t in param['allowed_types']:
-                if re.match(t, info[2]):
+            for pattern in _type_patterns(tuple(param['allowed_types'])):
+                if pattern.match(info[2]):
                     type_ok = True
             if not type_ok:
                 msg = 'Type of data object, {}, ' \
@@ -668,7 +805,206 @@ def validate_param_value(param, value, workspace):
     return (ws_ref, None)
 
 
-def resolve_single_ref(workspace, value):
+def collect_object_values(spec_params, param_sets):
+    """
+    Returns a list of all the workspace object names and references given as
+    input values in param_sets (a list of parameter dicts). Only values of
+    parameters that expect an input workspace object are included - that's
+    any with allowed_types that isn't an output - including those inside
+    parameter groups.
+
+    The result is meant to be passed along to resolve_object_infos.
+    """
+    params_dict = params_index(spec_params)
+    values = list()
+    for param_set in param_sets:
+        for param_id, value in param_set.items():
+            spec_param = params_dict.get(param_id)
+            if spec_param is None:
+                continue
+            if spec_param.get('type') == 'group':
+                groups = value if isinstance(value, list) else [value]
+                for group in groups:
+                    if not isinstance(group, dict):
+                        continue
+                    for group_param_id, group_value in group.items():
+                        if group_param_id in params_dict:
+                            values += _object_values(params_dict[group_param_id], group_value)
+            else:
+                values += _object_values(spec_param, value)
+    return values
+
+
+def _object_values(spec_param, value):
+    if not spec_param.get('allowed_types') or spec_param.get('is_output', False):
+        return []
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, str)]
+    if isinstance(value, str):
+        return [value]
+    return []
+
+
+def _object_key(workspace, value):
+    """
+    Returns the reference string used to look up a value, which is either an
+    object reference already, or a name of an object in the given workspace.
+    """
+    if '/' in value:
+        return value
+    return "{}/{}".format(workspace, value)
+
+
+def _object_ident(workspace, value):
+    """
+    Returns the Workspace ObjectSpecification for a value.
+    """
+    if '/' in value:
+        return {'ref': value}
+    return {'workspace': workspace, 'name': value}
+
+
+def _info_cache_for(key):
+    """
+    Returns the cache for an object key - versioned UPAs (which always mean the same
+    object) go in the long-lived cache, everything else in the short-lived one.
+    """
+    parts = key.split(';')[-1].strip().split('/')
+    if len(parts) == 3 and all(part.isdigit() for part in parts):
+        return _object_info_cache
+    return _object_name_cache
+
+
+def lookup_objects(workspace, values, ignore_errors=True):
+    """
+    Looks up the object info and reference path for all of the given
+    workspace object names or references. Names are looked up in the given
+    workspace. Anything in the object info cache gets used from there, and
+    the rest are fetched with as few Workspace calls as possible - one
+    get_object_info3 call per OBJECT_INFO_BATCH_SIZE unique objects - then
+    cached.
+
+    Returns a dict where keys = object reference strings (either the given
+    reference, or workspace/name), values = (object info, path) tuples.
+
+    If ignore_errors is True, anything that can't be found or isn't a valid
+    reference gets left out. Otherwise, Workspace errors get raised.
+    """
+    keys = list()
+    idents = dict()
+    for value in values:
+        if not isinstance(value, str) or len(value) == 0:
+            continue
+        if '/' in value:
+            if ignore_errors and any(len(item.split('/')) > 3 for item in value.split(';')):
+                continue
+        elif workspace is None:
+            continue
+        key = _object_key(workspace, value)
+        if key not in idents:
+            idents[key] = _object_ident(workspace, value)
+            keys.append(key)
+
+    found = dict()
+    missing = list()
+    for key in keys:
+        cached = _info_cache_for(key).get(key)
+        if cached is not None:
+            found[key] = cached
+        else:
+            missing.append(key)
+    if len(missing) == 0:
+        return found
+
+    ws = clients.get('workspace')
+    for i in range(0, len(missing), OBJECT_INFO_BATCH_SIZE):
+        batch = missing[i:i + OBJECT_INFO_BATCH_SIZE]
+        try:
+            result = ws.get_object_info3({
+                'objects': [idents[key] for key in batch],
+                'ignoreErrors': 1 if ignore_errors else 0
+            })
+        except Exception:
+            if not ignore_errors:
+                raise
+            # leave them all out, they'll get looked up individually.
+            continue
+        for key, info, path in zip(batch, result.get('infos', []), result.get('paths', [])):
+            if info is not None:
+                found[key] = (info, path)
+                _info_cache_for(key).put(key, (info, path))
+    return found
+
+
+def resolve_object_infos(workspace, values):
+    """
+    Looks up the object info for all of the given workspace object names or
+    references with lookup_objects.
+
+    Returns a dict of object infos, meant to be passed as ws_infos to the
+    validation and reference resolving functions in this module. Anything
+    that couldn't be found or isn't a valid reference gets left out, and is
+    looked up (and fails) the usual way by whatever uses it later.
+    """
+    return dict((key, info) for (key, (info, path)) in lookup_objects(workspace, values).items())
+
+
+def get_object_info(workspace, value, ws_infos=None):
+    """
+    Returns the object info for a single workspace object name or reference.
+    Uses ws_infos (from resolve_object_infos) or the object info cache if
+    either has the object, otherwise looks it up from the Workspace.
+    """
+    key = _object_key(workspace, value)
+    if ws_infos:
+        info = ws_infos.get(key)
+        if info is not None:
+            return info
+    cached = _info_cache_for(key).get(key)
+    if cached is not None:
+        return cached[0]
+    info = clients.get('workspace').get_object_info_new({
+        'objects': [_object_ident(workspace, value)]
+    })[0]
+    # the path's only known without a reference path
+    if ';' not in value:
+        _info_cache_for(key).put(key, (info, ["{}/{}/{}".format(info[6], info[0], info[4])]))
+    return info
+
+
+def invalidate_object_info(workspace=None):
+    """
+    Drops cached object infos. If workspace (a name or numerical id) is given,
+    only objects in that workspace are dropped, otherwise everything is.
+    """
+    for cache in (_object_info_cache, _object_name_cache):
+        if workspace is None:
+            cache.clear()
+        else:
+            cache.invalidate_matching(
+                lambda key: any(item.strip().split('/')[0] == str(workspace)
+                                for item in key.split(';'))
+            )
+
+
+def object_info_cache_stats(reset_counts=False):
+    """
+    Returns the object info cache counters - hits, misses, hit_rate and size - for
+    versioned and unversioned references together.
+    """
+    stats = [cache.stats(reset_counts=reset_counts)
+             for cache in (_object_info_cache, _object_name_cache)]
+    hits = sum(s['hits'] for s in stats)
+    misses = sum(s['misses'] for s in stats)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "size": sum(s['size'] for s in stats)
+    }
+
+
+def resolve_single_ref(workspace, value, ws_infos=None):
     ret = None
     if '/' in value:
         path_items = [item.strip() for item in value.split(';')]
@@ -676,24 +1012,24 @@ def resolve_single_ref(workspace, value):
             if len(path_item.split('/')) > 3:
                 raise ValueError('Object reference {} has too many slashes  - should be workspace/object/version(optional)'.format(value))
             # return (ws_ref, 'Data reference named {} does not have the right format - should be workspace/object/version(optional)')
-        info = clients.get('workspace').get_object_info_new({'objects': [{'ref': value}]})[0]
+        info = get_object_info(workspace, value, ws_infos)
         path_items[len(path_items) - 1] = "{}/{}/{}".format(info[6], info[0], info[4])
         ret = ';'.join(path_items)
     # Otherwise, assume it's a name, not a reference.
     else:
-        info = clients.get('workspace').get_object_info_new({'objects': [{'workspace': workspace, 'name': value}]})[0]
+        info = get_object_info(workspace, value, ws_infos)
         ret = "{}/{}/{}".format(info[6], info[0], info[4])
     return ret
 
 
-def resolve_ref(workspace, value):
+def resolve_ref(workspace, value, ws_infos=None):
     if isinstance(value, list):
-        return [resolve_single_ref(workspace, v) for v in value]
+        return [resolve_single_ref(workspace, v, ws_infos=ws_infos) for v in value]
     else:
-        return resolve_single_ref(workspace, value)
+        return resolve_single_ref(workspace, value, ws_infos=ws_infos)
 
 
-def resolve_ref_if_typed(value, spec_param):
+def resolve_ref_if_typed(value, spec_param, ws_infos=None):
     """
     For a given value and associated spec, if this is not an output param,
     then ensure that the reference points to an object in the current
@@ -704,11 +1040,11 @@ def resolve_ref_if_typed(value, spec_param):
         allowed_types = spec_param['allowed_types']
         if len(allowed_types) > 0:
             workspace = system_variable('workspace')
-            return resolve_ref(workspace, value)
+            return resolve_ref(workspace, value, ws_infos=ws_infos)
     return value
 
 
-def transform_param_value(transform_type, value, spec_param):
+def transform_param_value(transform_type, value, spec_param, ws_infos=None):
     """
     Transforms an input according to the rules given in
     NarrativeMethodStore.ServiceMethodInputMapping
@@ -718,6 +1054,9 @@ def transform_param_value(transform_type, value, spec_param):
       3. list<type> - turns the given list into a list of the given type.
       (4.) none or None - doesn't transform.
 
+    ws_infos is an optional dict of object infos from resolve_object_infos,
+    used when resolving references.
+
     Returns a transformed (or not) value.
     """
     if transform_type is None and spec_param is not None and spec_param['type'] == 'textsubdata':
@@ -735,7 +1074,7 @@ def transform_param_value(transform_type, value, spec_param):
     elif transform_type == "resolved-ref":
         # make a workspace ref
         if value is not None:
-            value = resolve_ref(system_variable('workspace'), value)
+            value = resolve_ref(system_variable('workspace'), value, ws_infos=ws_infos)
         return value
 
     elif transform_type == "future-default":
@@ -744,7 +1083,7 @@ def transform_param_value(transform_type, value, spec_param):
             return value
         else:
             if value is not None:
-                value = resolve_ref_if_typed(value, spec_param)
+                value = resolve_ref_if_typed(value, spec_param, ws_infos=ws_infos)
             return value
 
     elif transform_type == "int":
@@ -770,10 +1109,10 @@ def transform_param_value(transform_type, value, spec_param):
         if isinstance(value, list):
             ret = []
             for pos in range(0, len(value)):
-                ret.append(transform_param_value(list_type, value[pos], None))
+                ret.append(transform_param_value(list_type, value[pos], None, ws_infos=ws_infos))
             return ret
         else:
-            return [transform_param_value(list_type, value, None)]
+            return [transform_param_value(list_type, value, None, ws_infos=ws_infos)]
 
     else:
         raise ValueError("Unsupported Transformation type: " +
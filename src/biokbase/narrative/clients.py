@@ -1,3 +1,6 @@
+import os
+import threading
+
 from biokbase.workspace.client import Workspace
 from biokbase.narrative_method_store.client import NarrativeMethodStore
 from biokbase.userandjobstate.client import UserAndJobState
@@ -7,13 +10,87 @@ from biokbase.execution_engine2.execution_engine2Client import execution_engine2
 
 from biokbase.narrative.common.url_config import URLS
 
+# maps each accepted client name to the name of the client that gets built
+_ALIASES = {
+    'service_wizard': 'service',
+    'execution_engine': 'execution_engine2',
+    'job_service': 'execution_engine2'
+}
+
+# maps each client name to the URLS key for its service
+_URL_KEYS = {
+    'workspace': 'workspace',
+    'narrative_method_store': 'narrative_method_store',
+    'user_and_job_state': 'user_and_job_state',
+    'catalog': 'catalog',
+    'service': 'service_wizard',
+    'execution_engine2': 'execution_engine2'
+}
+
+# keys = (client name, token, url), values = client instances
+__clients = dict()
+__stats = {'hits': 0, 'misses': 0}
+__lock = threading.RLock()
+
 
 def get(client_name, token=None):
-    return __init_client(client_name, token=token)
+    """
+    Returns a client for the given service name. Clients are built once per
+    (service, token, url) and reused after that. If no token is given, the one
+    in the KB_AUTH_TOKEN environment variable is used, same as the clients do.
+    """
+    name = _ALIASES.get(client_name, client_name)
+    key = (name, _effective_token(token), _client_url(name))
+    with __lock:
+        client = __clients.get(key)
+        if client is not None:
+            __stats['hits'] += 1
+            return client
+        __stats['misses'] += 1
+        client = __init_client(name, token=token)
+        __clients[key] = client
+    return client
 
 
 def reset():
-    __clients = dict()
+    """
+    Drops all cached clients. The next get() for each service builds a new one.
+    This gets called whenever the auth token changes.
+    """
+    with __lock:
+        __clients.clear()
+
+
+def cache_stats(reset_counts=False):
+    """
+    Returns a dict with the client cache counters:
+    {
+        "hits": int - number of get() calls served by an existing client,
+        "misses": int - number of get() calls that built a new client,
+        "size": int - number of cached clients
+    }
+    If reset_counts is True, hits and misses get zeroed after reading them.
+    """
+    with __lock:
+        stats = dict(__stats)
+        stats['size'] = len(__clients)
+        if reset_counts:
+            __stats['hits'] = 0
+            __stats['misses'] = 0
+    return stats
+
+
+def _effective_token(token):
+    if token is not None:
+        return token
+    return os.environ.get('KB_AUTH_TOKEN')
+
+
+def _client_url(client_name):
+    url_key = _URL_KEYS.get(client_name)
+    if url_key is None:
+        return None
+    return URLS.get_url(url_key)
 
 
 def __init_client(client_name, token=None):
@@ -0,0 +1,93 @@
+"""
+A small, thread-safe, in-memory cache with a size bound and expiring entries.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache(object):
+    """
+    A least-recently-used cache where each entry also expires after ttl seconds.
+    Once maxsize entries are stored, adding a new one drops the least recently used.
+
+    Keeps hit and miss counters - see stats().
+    """
+    def __init__(self, maxsize=1000, ttl=300):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # keys = cache key, values = (expiration time, value)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, default=None):
+        """
+        Returns the value for key, or default if it's not there or has expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._data[key]
+            self._misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Removes a single key. Does nothing if it's not there.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_matching(self, predicate):
+        """
+        Removes all keys where predicate(key) is True.
+        """
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self, reset_counts=False):
+        """
+        Returns a dict with the cache counters:
+        {
+            "hits": int,
+            "misses": int,
+            "hit_rate": float - hits / (hits + misses), or 0 if nothing's been looked up,
+            "size": int - number of stored entries (some may have expired)
+        }
+        If reset_counts is True, hits and misses get zeroed after reading them.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "size": len(self._data)
+            }
+            if reset_counts:
+                self._hits = 0
+                self._misses = 0
+        return stats
+
+    def __len__(self):
+        return len(self._data)
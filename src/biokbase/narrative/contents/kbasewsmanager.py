@@ -270,23 +270,36 @@ class KBaseWSManager(KBaseWSManagerMixin, ContentsManager):
 
         try:
             ref = self._parse_path(path)
-            result = self.write_narrative(ref, nb, self.get_userid())
+            user = self.get_userid()
+            (nb, obj_info) = self._write_narrative(ref, nb, user)
+            (ws_id, obj_id, ver) = (obj_info[6], obj_info[0], obj_info[4])
 
-            new_id = "ws.%s.obj.%s" % (result[1], result[2])
+            new_id = "ws.%s.obj.%s" % (ws_id, obj_id)
             util.kbase_env.narrative = new_id
 
-            nb = result[0]
             self.validate_notebook_model(model)
             validation_message = model.get('message', None)
 
-            model = self.get(path, content=False)
+            model = self._saved_model(path, user)
             if validation_message:
                 model['message'] = validation_message
-            self.narrative_logger.narrative_save('{}/{}'.format(result[1], result[2]), result[3])
+            self.narrative_logger.narrative_save('{}/{}'.format(ws_id, obj_id), ver)
             return model
         except WorkspaceError as err:
             raise HTTPError(err.http_code, "While saving your Narrative: {}".format(err.message))
 
+    def _saved_model(self, path, user):
+        """
+        Returns the model of a Narrative that was just saved, without content. This is the
+        same as get(path, content=False), but it doesn't need to go back to the Workspace -
+        the save succeeded, so the Narrative exists, and the user can write to it.
+        """
+        model = base_model(path, path)
+        model['type'] = 'notebook'
+        if user is not None:
+            model['writable'] = True
+        return model
+
     def delete_file(self, path):
         """Delete file or directory by path."""
         raise HTTPError(501, 'Narrative deletion not implemented here. Deletion is handled elsewhere.')
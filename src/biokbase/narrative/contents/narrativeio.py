@@ -32,6 +32,7 @@ import json
 from collections import Counter
 from .updater import update_narrative
 from biokbase.narrative.common.narrative_ref import NarrativeRef
+from biokbase.narrative.common.cache import TTLCache
 
 
 # The list_workspace_objects method has been deprecated, the
@@ -47,6 +48,18 @@ MAX_METADATA_STRING_BYTES = 900
 MAX_METADATA_SIZE_BYTES = 16000
 WORKSPACE_TIMEOUT = 30  # seconds
 NARRATIVE_TYPE = "KBaseNarrative.Narrative"
+# Workspace permissions are kept for this many seconds, so that saving and loading a
+# Narrative doesn't look them up every time.
+PERMISSIONS_CACHE_TTL = 60
+PERMISSIONS_CACHE_SIZE = 100
+# The Narrative metadata last set on each workspace is remembered for as long as the
+# permissions used to set it, and isn't set again while it's unchanged.
+WS_METADATA_CACHE_TTL = PERMISSIONS_CACHE_TTL
+
+# keys = (auth token, workspace id), values = permissions dict from get_permissions
+_permissions_cache = TTLCache(maxsize=PERMISSIONS_CACHE_SIZE, ttl=PERMISSIONS_CACHE_TTL)
+# keys = (auth token, workspace id), values = workspace metadata last set
+_ws_metadata_cache = TTLCache(maxsize=PERMISSIONS_CACHE_SIZE, ttl=WS_METADATA_CACHE_TTL)
 
 g_log = get_logger("biokbase.narrative")
 
@@ -152,7 +165,15 @@ class KBaseWSManagerMixin(object):
         4. Return any notebook changes as a list-
            (narrative, ws_id, obj_id, ver)
         """
+        assert isinstance(ref, NarrativeRef), "write_narrative must use a NarrativeRef as input!"
+        (nb, obj_info) = self._write_narrative(ref, nb, cur_user)
+        return (nb, obj_info[6], obj_info[0], obj_info[4])
 
+    def _write_narrative(self, ref, nb, cur_user):
+        """
+        Does the work of write_narrative, but returns a tuple of the updated notebook and the
+        saved object's info - (narrative, obj_info).
+        """
         assert isinstance(ref, NarrativeRef), "write_narrative must use a NarrativeRef as input!"
         if 'worksheets' in nb:
             # it's an old version. update it by replacing the 'worksheets' key with
@@ -202,18 +223,26 @@ class KBaseWSManagerMixin(object):
         except Exception as e:
             raise HTTPError(400, 'Unexpected error setting Narrative attributes: %s' %e)
 
-        # With that set, update the workspace metadata with the new info.
-        perms = self.narrative_permissions(ref, user=cur_user)
-        if perms[cur_user] == 'a':
-            try:
-                updated_metadata = {
-                    'is_temporary': 'false',
-                    'narrative_nice_name': nb['metadata']['name'],
-                    'searchtags': 'narrative'
-                }
-                self.ws_client().alter_workspace_metadata({'wsi': {'id': ws_id}, 'new': updated_metadata})
-            except ServerError as err:
-                raise WorkspaceError(err, ws_id, message="Error adjusting Narrative metadata", http_code=500)
+        # With that set, update the workspace metadata with the new info - unless it was
+        # already set last time.
+        updated_metadata = {
+            'is_temporary': 'false',
+            'narrative_nice_name': nb['metadata']['name'],
+            'searchtags': 'narrative'
+        }
+        meta_key = (biokbase.auth.get_auth_token(), str(ws_id))
+        if _ws_metadata_cache.get(meta_key) != updated_metadata:
+            perms = self.narrative_permissions(ref, user=cur_user)
+            if perms[cur_user] == 'a':
+                try:
+                    self.ws_client().alter_workspace_metadata({
+                        'wsi': {'id': ws_id},
+                        'new': updated_metadata
+                    })
+                except ServerError as err:
+                    raise WorkspaceError(err, ws_id, message="Error adjusting Narrative metadata",
+                                         http_code=500)
+                _ws_metadata_cache.put(meta_key, updated_metadata)
 
         # Now we can save the Narrative object.
         try:
@@ -261,7 +290,7 @@ class KBaseWSManagerMixin(object):
             obj_info = self.ws_client().save_objects({'id': ws_id,
                                                       'objects': [ws_save_obj]})[0]
 
-            return (nb, obj_info[6], obj_info[0], obj_info[4])
+            return (nb, obj_info)
 
         except ServerError as err:
             raise WorkspaceError(err, ws_id)
@@ -486,18 +515,26 @@ class KBaseWSManagerMixin(object):
         'n' is returned for that key's value.
 
         If nobody is logged in, this raises a WorkspaceError.
+
+        Permissions are cached for PERMISSIONS_CACHE_TTL seconds for each auth token and
+        workspace.
         """
         assert isinstance(ref, NarrativeRef), "narrative_permissions must use a NarrativeRef as input!"
-        perms = {}
-        try:
-            perms = self.ws_client().get_permissions({'id': ref.wsid})
-        except ServerError as err:
-            raise WorkspaceError(err, ref.wsid)
+        cache_key = (biokbase.auth.get_auth_token(), str(ref.wsid))
+        perms = _permissions_cache.get(cache_key)
+        if perms is None:
+            try:
+                perms = self.ws_client().get_permissions({'id': ref.wsid})
+            except ServerError as err:
+                raise WorkspaceError(err, ref.wsid)
+            _permissions_cache.put(cache_key, perms)
         if user is not None:
             if user in perms:
                 perms = {user: perms[user]}
             else:
                 perms = {user: 'n'}
+        else:
+            perms = dict(perms)
         return perms
 
     def narrative_writable(self, ref, user):
@@ -13,10 +13,16 @@ from biokbase.narrative.app_util import (
     strict_system_variable,
     map_outputs_from_state,
     validate_parameters,
-    resolve_ref_if_typed,
-    transform_param_value,
-    extract_ws_refs
+    extract_ws_refs,
+    collect_object_values,
+    resolve_object_infos
 )
+from .specstore import spec_key
+from .inputmapping import (
+    InputMappingPlan,
+    generate_input
+)
+from biokbase.narrative.common.cache import TTLCache
 from biokbase.narrative.exception_util import (
     transform_job_exception
 )
@@ -24,7 +30,6 @@ from biokbase.narrative.common import kblogging
 import re
 import datetime
 import traceback
-import random
 
 """
 A module for managing apps, specs, requirements, and for starting jobs.
@@ -52,6 +57,9 @@ class AppManager(object):
     __MAX_TOKEN_NAME_LEN = 30
 
     spec_manager = specmanager.SpecManager()
+    # keys = spec key, values = InputMappingPlan
+    _input_plans = TTLCache(maxsize=specmanager.APP_PARAMS_CACHE_SIZE,
+                            ttl=specmanager.APP_PARAMS_CACHE_TTL)
     _log = kblogging.get_logger(__name__)
     _comm = None
     viewer_count = 1
@@ -62,13 +70,18 @@ class AppManager(object):
             AppManager.__instance._comm = None
         return AppManager.__instance
 
-    def reload(self):
+    def reload(self, incremental=False):
         """
         Reloads all app specs into memory from the App Catalog.
+        If incremental is True, this only fetches the specs of loaded apps that changed
+        since they were loaded (see SpecManager.refresh).
         Any outputs of app_usage, app_description, or available_apps
         should be run again after the update.
         """
-        self.spec_manager.reload()
+        if incremental:
+            self.spec_manager.refresh()
+        else:
+            self.spec_manager.reload()
 
     def app_usage(self, app_id, tag='release'):
         """
@@ -165,17 +178,18 @@ class AppManager(object):
 
         # A list of lists of UPAs, used for each subjob.
         batch_ws_upas = list()
-        # The list of actual input values, post-mapping.
-        batch_run_inputs = list()
+
+        # Look up every input object across all param sets at once, and share
+        # them between validation and input mapping.
+        ws_infos = resolve_object_infos(system_variable('workspace'),
+                                        collect_object_values(spec_params, params))
 
         for param_set in params:
-            spec_params_map = dict((spec_params[i]['id'], spec_params[i])
-                                   for i in range(len(spec_params)))
-            batch_ws_upas.append(extract_ws_refs(app_id, tag, spec_params, param_set))
-            batch_run_inputs.append(self._map_inputs(
-                spec['behavior']['kb_service_input_mapping'],
-                param_set,
-                spec_params_map))
+            batch_ws_upas.append(extract_ws_refs(app_id, tag, spec_params, param_set,
+                                                 ws_infos=ws_infos))
+        # The list of actual input values, post-mapping.
+        batch_run_inputs = self._input_mapping_plan(spec, spec_params).apply_all(
+            params, ws_infos=ws_infos)
 
         service_method = spec['behavior']['kb_service_method']
         service_name = spec['behavior']['kb_service_name']
@@ -365,13 +379,10 @@ class AppManager(object):
         # values are the right type, all numerical values are in given ranges
         spec_params = self.spec_manager.app_params(spec)
 
-        spec_params_map = dict((spec_params[i]['id'], spec_params[i])
-                               for i in range(len(spec_params)))
-        ws_input_refs = extract_ws_refs(app_id, tag, spec_params, params)
-        input_vals = self._map_inputs(
-            spec['behavior']['kb_service_input_mapping'],
-            params,
-            spec_params_map)
+        ws_infos = resolve_object_infos(system_variable('workspace'),
+                                        collect_object_values(spec_params, [params]))
+        ws_input_refs = extract_ws_refs(app_id, tag, spec_params, params, ws_infos=ws_infos)
+        input_vals = self._input_mapping_plan(spec, spec_params).apply(params, ws_infos=ws_infos)
 
         service_method = spec['behavior']['kb_service_method']
         service_name = spec['behavior']['kb_service_name']
@@ -548,7 +559,8 @@ class AppManager(object):
 
         (output_widget, widget_params) = map_outputs_from_state([],
                                                                 params,
-                                                                spec)
+                                                                spec,
+                                                                spec_params=spec_params)
 
         # All a local app does is route the inputs to outputs through the
         # spec's mapping, and then feed that into the specified output widget.
@@ -695,40 +707,25 @@ class AppManager(object):
                              "instead.")
         return spec
 
-    def _map_group_inputs(self, value, spec_param, spec_params):
-        if isinstance(value, list):
-            return [self._map_group_inputs(v, spec_param, spec_params)
-                    for v in value]
-        elif value is None:
-            return None
-        else:
-            mapped_value = dict()
-            id_map = spec_param.get('id_mapping', {})
-            for param_id in id_map:
-                # ensure that the param referenced in the group param list
-                # exists in the spec.
-                # NB: This should really never happen if the sdk registration
-                # process validates them.
-                if param_id not in spec_params:
-                    msg = "Unknown parameter id in group mapping: " + param_id
-                    raise ValueError(msg)
-            for param_id in value:
-                target_key = id_map.get(param_id, param_id)
-                # Sets either the raw value, or if the parameter is an object
-                # reference the full object refernce (see the method).
-                if value[param_id] is None:
-                    target_val = None
-                else:
-                    target_val = resolve_ref_if_typed(value[param_id], spec_params[param_id])
-
-                mapped_value[target_key] = target_val
-            return mapped_value
-
-    def _map_inputs(self, input_mapping, params, spec_params):
+    def _input_mapping_plan(self, spec, spec_params):
+        """
+        Returns the compiled InputMappingPlan for the app spec's kb_service_input_mapping.
+        These are cached for each distinct spec, see SpecManager.app_params.
+        """
+        key = spec_key(spec)
+        plan = self._input_plans.get(key)
+        if plan is None:
+            plan = InputMappingPlan(spec['behavior']['kb_service_input_mapping'],
+                                    spec_params.by_id,
+                                    generate=self._generate_input)
+            self._input_plans.put(key, plan)
+        return plan
+
+    def _map_inputs(self, input_mapping, params, spec_params, ws_infos=None):
         """
         Maps the dictionary of parameters and inputs based on rules provided in
-        the input_mapping. This iterates over the list of input_mappings, and
-        uses them as a filter to apply to each parameter.
+        the input_mapping. See InputMappingPlan - to map many sets of params with the
+        same spec, use _input_mapping_plan instead.
 
         Returns a list of inputs that can be passed directly to NJSW.run_job
 
@@ -736,109 +733,18 @@ class AppManager(object):
         NarrativeMethodStore.ServiceMethodInputMapping.
         params is a dict of key-value-pairs, each key is the input_parameter
         field of some parameter.
+        ws_infos is an optional dict of object infos from resolve_object_infos,
+        used to resolve object references without looking each one up.
         """
-        inputs_dict = dict()
-        for p in input_mapping:
-            # 2 steps - figure out the proper value, then figure out the
-            # proper position. value first!
-            p_value = None
-            input_param_id = None
-            if 'input_parameter' in p:
-                input_param_id = p['input_parameter']
-                p_value = params.get(input_param_id, None)
-                if spec_params[input_param_id].get('type', '') == 'group':
-                    p_value = self._map_group_inputs(p_value, spec_params[input_param_id],
-                                                     spec_params)
-                # turn empty strings into None
-                if isinstance(p_value, str) and len(p_value) == 0:
-                    p_value = None
-            elif 'narrative_system_variable' in p:
-                p_value = system_variable(p['narrative_system_variable'])
-            if 'constant_value' in p and p_value is None:
-                p_value = p['constant_value']
-            if 'generated_value' in p and p_value is None:
-                p_value = self._generate_input(p['generated_value'])
-
-            spec_param = None
-            if input_param_id:
-                spec_param = spec_params[input_param_id]
-            p_value = transform_param_value(p.get('target_type_transform'), p_value, spec_param)
-
-            # get position!
-            arg_position = p.get('target_argument_position', 0)
-            target_prop = p.get('target_property', None)
-            if target_prop is not None:
-                final_input = inputs_dict.get(arg_position, dict())
-                if '/' in target_prop:
-                    # This is case when slashes in target_prop separate
-                    # elements in nested maps. We ignore escaped slashes
-                    # (separate backslashes should be escaped as well).
-                    bck_slash = "\u244A"
-                    fwd_slash = "\u20EB"
-                    temp_string = target_prop.replace("\\\\", bck_slash)
-                    temp_string = temp_string.replace("\\/", fwd_slash)
-                    temp_path = []
-                    for part in temp_string.split("/"):
-                        part = part.replace(bck_slash, "\\")
-                        part = part.replace(fwd_slash, "/")
-                        temp_path.append(part.encode('ascii', 'ignore').decode("ascii"))
-                    temp_map = final_input
-                    temp_key = None
-                    # We're going along the path and creating intermediate
-                    # dictionaries.
-                    for temp_path_item in temp_path:
-                        if temp_key:
-                            if temp_key not in temp_map:
-                                temp_map[temp_key] = {}
-                            temp_map = temp_map[temp_key]
-                        temp_key = temp_path_item
-                    # temp_map points to deepest nested map now, temp_key is
-                    # the last item in the path
-                    temp_map[temp_key] = p_value
-                else:
-                    final_input[target_prop] = p_value
-                inputs_dict[arg_position] = final_input
-            else:
-                inputs_dict[arg_position] = p_value
-
-        inputs_list = list()
-        keys = sorted(inputs_dict.keys())
-        for k in keys:
-            inputs_list.append(inputs_dict[k])
-        return inputs_list
+        plan = InputMappingPlan(input_mapping, spec_params, generate=self._generate_input)
+        return plan.apply(params, ws_infos=ws_infos)
 
     def _generate_input(self, generator):
         """
         Generates an input value using rules given by
-        NarrativeMethodStore.AutoGeneratedValue.
-        generator - dict
-            has 3 optional properties:
-            prefix - if present, is prepended to the generated string.
-            symbols - if present is the number of symbols to autogenerate (if
-                      not present, default=8)
-            suffix - if present, is appended to the generated string.
-        So, if generator is None or an empty dict, returns an 8-symbol string.
+        NarrativeMethodStore.AutoGeneratedValue - see inputmapping.generate_input.
         """
-        symbols = 8
-        if 'symbols' in generator:
-            try:
-                symbols = int(generator['symbols'])
-            except:
-                raise ValueError(
-                    'The "symbols" input to the generated value must be an ' +
-                    'integer > 0!'
-                )
-        if symbols < 1:
-            raise ValueError(
-                'Must have at least 1 symbol to randomly generate!'
-            )
-        ret = ''.join([chr(random.randrange(0, 26) + ord('A'))
-                      for _ in range(symbols)])
-        if 'prefix' in generator:
-            ret = str(generator['prefix']) + ret
-        if 'suffix' in generator:
-            ret = ret + str(generator['suffix'])
-        return ret
+        return generate_input(generator)
 
     def _send_comm_message(self, msg_type, content):
         JobComm().send_comm_message(msg_type, content)
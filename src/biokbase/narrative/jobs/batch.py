@@ -35,7 +35,7 @@ def get_input_scaffold(app, tag='release', use_defaults=False):
     sm = specmanager.SpecManager()
     spec = sm.get_spec(app, tag=tag)  # will raise an exception if it's not found.
     spec_params = sm.app_params(spec)
-    (spec_params_dict, grouped_params) = _index_spec_params(spec_params)
+    (spec_params_dict, grouped_params) = (spec_params.by_id, spec_params.group_of)
 
     input_scaffold = dict()
     for p in spec_params:
@@ -43,25 +43,6 @@ def get_input_scaffold(app, tag='release', use_defaults=False):
             input_scaffold[p['id']] = _make_scaffold_input(p, spec_params_dict, use_defaults)
     return input_scaffold
 
-def _index_spec_params(spec_params):
-    """
-    Makes an index of the spec parameters. It dict-ifies the list of spec params
-    provided by the SpecManager, and also returns the set of param ids that are
-    used in groups.
-    This gets returned as a tuple (indexed params, group param ids)
-    """
-    spec_params_dict = dict()
-    grouped_parents = dict()
-    for p in spec_params:
-        spec_params_dict[p['id']] = p
-        # groupify the parameters - identify params that are part of groups, and don't include
-        # them in the list separately.
-        children = p.get('parameter_ids')
-        if children:
-            for child in children:
-                grouped_parents[child] = p['id']
-    return (spec_params_dict, grouped_parents)
-
 def _make_scaffold_input(param, params_dict, use_defaults):
     """
     param = dict of info about one param - id, is it a group, what types are allowed, etc.
@@ -249,7 +230,7 @@ def generate_input_batch(app, tag='release', **kwargs):
     if not kwargs:
         raise ValueError("No inputs were given! If you just want to build an empty input set, try get_input_scaffold.")
     spec_params = sm.app_params(spec)
-    (spec_params_dict, grouped_params) = _index_spec_params(spec_params)
+    (spec_params_dict, grouped_params) = (spec_params.by_id, spec_params.group_of)
 
     # Initial checking, make sure all kwargs exist as params.
     input_vals = dict()
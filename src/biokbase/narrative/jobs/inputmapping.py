@@ -0,0 +1,203 @@
+"""
+Compiled input mappings for running apps.
+
+An app spec's kb_service_input_mapping says how to turn the app's parameters into the list
+of arguments for its service method. An InputMappingPlan works all of that out once per spec -
+where each value comes from, its transform, its argument position, and the path to set
+inside that argument - so it can then be applied to any number of parameter sets.
+"""
+import random
+from biokbase.narrative.app_util import (
+    system_variable,
+    resolve_ref_if_typed,
+    transform_param_value
+)
+
+# Placeholders for escaped slashes while splitting target_property paths.
+_BACK_SLASH = "\u244A"
+_FORWARD_SLASH = "\u20EB"
+
+
+def split_target_property(target_prop):
+    """
+    Splits a target_property into the path of keys in nested dicts it points to.
+    Slashes separate the keys, unless they're escaped (and backslashes have to be escaped
+    as well). Returns None if there's no path, just a single key.
+    """
+    if '/' not in target_prop:
+        return None
+    temp_string = target_prop.replace("\\\\", _BACK_SLASH)
+    temp_string = temp_string.replace("\\/", _FORWARD_SLASH)
+    path = list()
+    for part in temp_string.split("/"):
+        part = part.replace(_BACK_SLASH, "\\")
+        part = part.replace(_FORWARD_SLASH, "/")
+        path.append(part.encode('ascii', 'ignore').decode("ascii"))
+    return tuple(path)
+
+
+def generate_input(generator):
+    """
+    Generates an input value using rules given by
+    NarrativeMethodStore.AutoGeneratedValue.
+    generator - dict
+        has 3 optional properties:
+        prefix - if present, is prepended to the generated string.
+        symbols - if present is the number of symbols to autogenerate (if
+                  not present, default=8)
+        suffix - if present, is appended to the generated string.
+    So, if generator is None or an empty dict, returns an 8-symbol string.
+    """
+    symbols = 8
+    if 'symbols' in generator:
+        try:
+            symbols = int(generator['symbols'])
+        except:
+            raise ValueError(
+                'The "symbols" input to the generated value must be an ' +
+                'integer > 0!'
+            )
+    if symbols < 1:
+        raise ValueError(
+            'Must have at least 1 symbol to randomly generate!'
+        )
+    ret = ''.join([chr(random.randrange(0, 26) + ord('A'))
+                  for _ in range(symbols)])
+    if 'prefix' in generator:
+        ret = str(generator['prefix']) + ret
+    if 'suffix' in generator:
+        ret = ret + str(generator['suffix'])
+    return ret
+
+
+class _MappingSlot(object):
+    """
+    A single compiled entry of an input mapping.
+    """
+    __slots__ = ["input_param_id", "spec_param", "group_error", "system_variable",
+                 "has_constant", "constant", "generator", "transform", "position", "prop",
+                 "path"]
+
+    def __init__(self, mapping, spec_params):
+        self.input_param_id = mapping.get('input_parameter')
+        self.spec_param = None
+        self.group_error = None
+        self.system_variable = None
+        if self.input_param_id is not None:
+            self.spec_param = spec_params[self.input_param_id]
+            if self.spec_param.get('type', '') == 'group':
+                # ensure that the params referenced in the group param list exist in the spec.
+                # NB: This should really never happen if the sdk registration
+                # process validates them.
+                for param_id in self.spec_param.get('id_mapping', {}):
+                    if param_id not in spec_params:
+                        self.group_error = "Unknown parameter id in group mapping: " + param_id
+                        break
+        elif 'narrative_system_variable' in mapping:
+            self.system_variable = mapping['narrative_system_variable']
+        self.has_constant = 'constant_value' in mapping
+        self.constant = mapping.get('constant_value')
+        self.generator = mapping.get('generated_value')
+        self.transform = mapping.get('target_type_transform')
+        self.position = mapping.get('target_argument_position', 0)
+        self.prop = mapping.get('target_property')
+        self.path = split_target_property(self.prop) if self.prop is not None else None
+
+    @property
+    def is_group(self):
+        return self.spec_param is not None and self.spec_param.get('type', '') == 'group'
+
+
+class InputMappingPlan(object):
+    """
+    A compiled kb_service_input_mapping. Make one with the input mapping and the app's
+    params indexed by id (e.g. AppParams.by_id), then use apply or apply_all to map
+    parameter sets into service method inputs.
+    """
+    def __init__(self, input_mapping, spec_params, generate=generate_input):
+        """
+        input_mapping - list of dicts, as defined by NarrativeMethodStore.ServiceMethodInputMapping
+        spec_params - dict, keys = param id, values = param info
+        generate - function that makes an auto-generated value from a generated_value dict
+        """
+        self.spec_params = spec_params
+        self._generate = generate
+        self.slots = [_MappingSlot(m, spec_params) for m in input_mapping]
+        self.system_variables = sorted(set(s.system_variable for s in self.slots
+                                           if s.system_variable is not None))
+
+    def apply(self, params, ws_infos=None):
+        """
+        Maps a single dict of params into the list of inputs for the service method.
+        ws_infos is an optional dict of object infos from resolve_object_infos, used to
+        resolve object references without looking each one up.
+        """
+        return self.apply_all([params], ws_infos=ws_infos)[0]
+
+    def apply_all(self, param_sets, ws_infos=None):
+        """
+        Maps each dict of params in param_sets, and returns the list of input lists, in the
+        same order. System variables only get looked up once for all of them.
+        """
+        sys_vars = {name: system_variable(name) for name in self.system_variables}
+        return [self._map(params, sys_vars, ws_infos) for params in param_sets]
+
+    def _map(self, params, sys_vars, ws_infos):
+        inputs_dict = dict()
+        for slot in self.slots:
+            p_value = None
+            if slot.input_param_id is not None:
+                p_value = params.get(slot.input_param_id, None)
+                if slot.is_group:
+                    p_value = self._map_group(p_value, slot, ws_infos)
+                # turn empty strings into None
+                if isinstance(p_value, str) and len(p_value) == 0:
+                    p_value = None
+            elif slot.system_variable is not None:
+                p_value = sys_vars[slot.system_variable]
+            if slot.has_constant and p_value is None:
+                p_value = slot.constant
+            if slot.generator is not None and p_value is None:
+                p_value = self._generate(slot.generator)
+            p_value = transform_param_value(slot.transform, p_value, slot.spec_param,
+                                            ws_infos=ws_infos)
+
+            if slot.prop is None:
+                inputs_dict[slot.position] = p_value
+                continue
+            final_input = inputs_dict.get(slot.position, dict())
+            if slot.path is None:
+                final_input[slot.prop] = p_value
+            else:
+                # go along the path, making the intermediate dicts
+                target = final_input
+                for key in slot.path[:-1]:
+                    if not key:
+                        continue
+                    if key not in target:
+                        target[key] = {}
+                    target = target[key]
+                target[slot.path[-1]] = p_value
+            inputs_dict[slot.position] = final_input
+        return [inputs_dict[k] for k in sorted(inputs_dict.keys())]
+
+    def _map_group(self, value, slot, ws_infos):
+        if isinstance(value, list):
+            return [self._map_group(v, slot, ws_infos) for v in value]
+        if value is None:
+            return None
+        if slot.group_error is not None:
+            raise ValueError(slot.group_error)
+        id_map = slot.spec_param.get('id_mapping', {})
+        mapped_value = dict()
+        for param_id in value:
+            target_key = id_map.get(param_id, param_id)
+            # Sets either the raw value, or if the parameter is an object
+            # reference the full object reference.
+            if value[param_id] is None:
+                mapped_value[target_key] = None
+            else:
+                mapped_value[target_key] = resolve_ref_if_typed(value[param_id],
+                                                                self.spec_params[param_id],
+                                                                ws_infos=ws_infos)
+        return mapped_value
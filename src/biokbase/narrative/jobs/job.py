@@ -5,6 +5,7 @@ from biokbase.narrative.app_util import (
     map_outputs_from_state
 )
 import json
+import threading
 import uuid
 from jinja2 import Template
 from pprint import pprint
@@ -15,17 +16,66 @@ KBase job class
 __author__ = "Bill Riehl <wjriehl@lbl.gov>"
 
 EXCLUDED_JOB_STATE_FIELDS = ["authstrat", "job_input", "condor_job_ads"]
+TERMINAL_STATES = ['completed', 'terminated', 'error']
+# Number of log lines kept in memory for each job. Older lines get dropped, and are
+# fetched from EE2 again if they're asked for.
+JOB_LOG_BUFFER_SIZE = 10000
+
+
+class JobLogBuffer(object):
+    """
+    An append-only buffer of job log lines that keeps at most max_lines of the most recent
+    ones. Lines are numbered from the start of the log, including any that were dropped.
+    """
+    def __init__(self, max_lines=JOB_LOG_BUFFER_SIZE):
+        if max_lines < 1:
+            raise ValueError("max_lines must be at least 1")
+        self.max_lines = max_lines
+        self._lines = list()
+        # line number of self._lines[0]
+        self._first = 0
+
+    @property
+    def first_line(self):
+        """
+        The number of the oldest line still in the buffer.
+        """
+        return self._first
+
+    def append(self, lines: list) -> None:
+        self._lines.extend(lines)
+        # trim in chunks, so each line gets moved at most a few times
+        excess = len(self._lines) - self.max_lines
+        if excess > self.max_lines // 4:
+            del self._lines[:excess]
+            self._first += excess
+
+    def has_lines(self, first_line: int) -> bool:
+        """
+        True if the buffer still has every line from first_line onward.
+        """
+        return first_line >= self._first
+
+    def get(self, first_line: int, num_lines: int) -> list:
+        """
+        Returns up to num_lines lines, starting at line number first_line. That needs to be
+        in the buffer (see has_lines).
+        """
+        start = first_line - self._first
+        return self._lines[start:start + num_lines]
+
+    def __len__(self):
+        """
+        The total number of lines seen, including dropped ones.
+        """
+        return self._first + len(self._lines)
+
 
 class Job(object):
-    job_id = None
-    app_id = None
-    app_version = None
-    cell_id = None
-    run_id = None
-    inputs = None
-    token_id = None
-    _job_logs = list()
-    _last_state = None
+    # A Narrative can have thousands of jobs, so keep these small.
+    __slots__ = ("job_id", "app_id", "app_version", "tag", "cell_id", "run_id", "inputs",
+                 "owner", "token_id", "meta", "_job_logs", "_log_complete", "_log_lock",
+                 "_last_state")
 
     def __init__(self, job_id, app_id, inputs, owner, tag='release', app_version=None,
                  cell_id=None, run_id=None, token_id=None, meta=dict()):
@@ -33,6 +83,7 @@ class Job(object):
         Initializes a new Job with a given id, app id, and app app_version.
         The app_id and app_version should both align with what's available in
         the Narrative Method Store service.
+        If inputs is None, they get fetched from EE2 when needed - see parameters().
         """
         self.job_id = job_id
         self.app_id = app_id
@@ -44,6 +95,12 @@ class Job(object):
         self.owner = owner
         self.token_id = token_id
         self.meta = meta
+        # made on first use, see _update_log
+        self._job_logs = None
+        self._log_complete = False
+        # held while reading or updating the log, so two threads don't fetch the same lines
+        self._log_lock = threading.RLock()
+        self._last_state = None
 
     @classmethod
     def from_state(cls, job_id, job_info, owner, app_id, tag='release',
@@ -56,7 +113,8 @@ class Job(object):
         job_info - dict
             The job information returned from njs.get_job_params, just the first
             element of that list (not the extra list with URLs). Should have the following keys:
-            'params': The set of parameters sent to that job.
+            'params': The set of parameters sent to that job. If missing, these get fetched
+                when needed.
             'service_ver': The version of the service that was run.
         owner - string
             The owner of the job (username of person who started it)
@@ -71,7 +129,7 @@ class Job(object):
         """
         return cls(job_id,
                    app_id,
-                   job_info.get('params', {}),
+                   job_info.get('params'),
                    owner,
                    tag=tag,
                    app_version=job_info.get('service_ver', None),
@@ -86,8 +144,12 @@ class Job(object):
         if job_state is None or job_state.get('status', '') != 'completed':
             return None
 
-        spec = SpecManager().get_spec(app_id, app_tag)
-        (output_widget, widget_params) = map_outputs_from_state(job_state, map_inputs_from_job(job_inputs, spec), spec)
+        sm = SpecManager()
+        spec = sm.get_spec(app_id, app_tag)
+        (output_widget, widget_params) = map_outputs_from_state(job_state,
+                                                                map_inputs_from_job(job_inputs, spec),
+                                                                spec,
+                                                                spec_params=sm.app_params(spec))
         return {
             'name': output_widget,
             'tag': app_tag,
@@ -104,7 +166,7 @@ class Job(object):
             print(f"Status: {state['status']}")
             # inputs = map_inputs_from_state(state, spec)
             print("Inputs:\n------")
-            pprint(self.inputs)
+            pprint(self.parameters())
         except:
             print("Unable to retrieve current running state!")
 
@@ -180,9 +242,10 @@ class Job(object):
 
     def _get_output_info(self, state):
         spec = self.app_spec()
-        return map_outputs_from_state(state, map_inputs_from_job(self.parameters(), spec), spec)
+        return map_outputs_from_state(state, map_inputs_from_job(self.parameters(), spec), spec,
+                                      spec_params=SpecManager().app_params(spec))
 
-    def log(self, first_line=0, num_lines=None):
+    def log(self, first_line=0, num_lines=None, latest_only=False):
         """
         Fetch a list of Job logs from the Job Service.
         This returns a 2-tuple (number of available log lines, list of log lines)
@@ -199,33 +262,60 @@ class Job(object):
         num_lines - int or None
             Limit on the number of lines to return (if None, return everything). If <= 0,
             returns no lines.
+        latest_only - boolean
+            If True, returns the last num_lines lines, and first_line is ignored.
+        Only new lines are fetched from EE2, and the last JOB_LOG_BUFFER_SIZE lines are kept.
+        Asking for older lines than that fetches just those lines again.
         Usage:
         ------
         The parameters are kwargs, so the following cases can be true:
         log() - returns all available log lines
         log(first_line=5) - returns every line available starting with line 5
         log(num_lines=100) - returns the first 100 lines (or all lines available if < 100)
+        log(num_lines=100, latest_only=True) - returns the last 100 lines
         """
-        self._update_log()
-        num_available_lines = len(self._job_logs)
+        with self._log_lock:
+            self._update_log()
+            num_available_lines = len(self._job_logs)
 
-        if first_line < 0:
-            first_line = 0
-        if num_lines is None:
-            num_lines = num_available_lines - first_line
-        if num_lines < 0:
-            num_lines = 0
+            if latest_only:
+                first_line = num_available_lines - num_lines if num_lines is not None else 0
+            if first_line < 0:
+                first_line = 0
+            if num_lines is None:
+                num_lines = num_available_lines - first_line
+            if num_lines < 0:
+                num_lines = 0
 
-        if first_line >= num_available_lines or num_lines <= 0:
-            return (num_available_lines, list())
-        return (num_available_lines, self._job_logs[first_line:first_line+num_lines])
+            if first_line >= num_available_lines or num_lines <= 0:
+                return (num_available_lines, list())
+            num_lines = min(num_lines, num_available_lines - first_line)
+            if self._job_logs.has_lines(first_line):
+                return (num_available_lines, self._job_logs.get(first_line, num_lines))
+            log_range = clients.get("execution_engine2").get_job_logs(
+                {'job_id': self.job_id,
+                 'skip_lines': first_line,
+                 'limit': num_lines})
+            return (num_available_lines, log_range['lines'][:num_lines])
 
     def _update_log(self):
-        log_update = clients.get("execution_engine2").get_job_logs(
-            {'job_id': self.job_id,
-             'skip_lines': len(self._job_logs)})
-        if log_update['lines']:
-            self._job_logs = self._job_logs + log_update['lines']
+        """
+        Fetches any log lines that haven't been seen yet. Once the job is finished and its
+        log has been fetched, there's nothing new to ask for.
+        """
+        with self._log_lock:
+            if self._job_logs is None:
+                self._job_logs = JobLogBuffer()
+            if self._log_complete:
+                return
+            finished = self._last_state is not None and \
+                self._last_state.get('status') in TERMINAL_STATES
+            log_update = clients.get("execution_engine2").get_job_logs(
+                {'job_id': self.job_id,
+                 'skip_lines': len(self._job_logs)})
+            if log_update['lines']:
+                self._job_logs.append(log_update['lines'])
+            self._log_complete = finished
 
     def is_finished(self):
         """
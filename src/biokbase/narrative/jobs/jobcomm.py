@@ -1,9 +1,48 @@
 import threading
+import random
+import time
+import copy
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
 from ipykernel.comm import Comm
 import biokbase.narrative.jobs.jobmanager as jobmanager
+from biokbase.narrative.jobs.util import diff_states
 from biokbase.narrative.exception_util import NarrativeException
 from biokbase.narrative.common import kblogging
 
+# Seconds between status lookups of a single job, depending on how it's doing.
+# Jobs that have been running for longer than LONG_RUNNING_JOB_TIME seconds are
+# "long_running", and get looked up less often.
+JOB_POLL_INTERVALS = {
+    "queued": 15,
+    "running": 10,
+    "long_running": 30,
+    "finished": 30
+}
+LONG_RUNNING_JOB_TIME = 1800
+# Each job's interval gets randomly stretched or shrunk by up to this fraction,
+# so lookups for jobs started together spread out over time.
+JOB_POLL_JITTER = 0.2
+# Bounds, in seconds, on how long the lookup loop waits between runs.
+MIN_LOOP_INTERVAL = 1
+MAX_LOOP_INTERVAL = 10
+# Seconds between log lookups for jobs with a log subscription.
+LOG_POLL_INTERVAL = 5
+# Number of threads that handle requests from the front end.
+COMM_MAX_WORKERS = 4
+# Max number of requests of these types that get handled at the same time. Slow requests
+# get limited, so they can't take up all the threads.
+REQUEST_CONCURRENCY = {
+    "all_status": 1,
+    "cancel_job": 2,
+    "job_logs": 2,
+    "job_logs_latest": 2
+}
+# Requests that only fetch and send information. If one comes in while the same request
+# (same type and data) is still being handled, it shares the running one's result instead
+# of making its own.
+COALESCED_REQUESTS = ["all_status", "job_status", "job_info", "job_logs", "job_logs_latest"]
+
 
 class JobRequest:
     """
@@ -57,9 +96,15 @@ class JobComm:
     The JobComm officially exposes the channel for other things to use. Anything that
     needs to send messages about Jobs to the front end should use JobComm.send_comm_message.
 
+    Requests get handled on a small pool of worker threads, so a slow one doesn't hold up
+    the others, or the kernel. See COMM_MAX_WORKERS, REQUEST_CONCURRENCY, and
+    COALESCED_REQUESTS.
+
     It also maintains the lookup loop thread. This is a threading.Timer that, after
-    some interval, will lookup the status of all running jobs. If there are no jobs to
-    look up, this cancels itself.
+    some interval, will lookup the status of jobs that are either running or have
+    something listening for updates. Each job is looked up on its own schedule, based on
+    its status, and only jobs whose state changed get sent. If there are no jobs to look
+    up, this cancels itself.
 
     Allowed messages:
     * all_status - return job state for all jobs in this Narrative.
@@ -73,6 +118,14 @@ class JobComm:
     * cancel_job - cancels a running job, if it hasn't otherwise terminated (requires a job_id)
     * job_logs - sends job logs back over the comm channel (requires a job id and first line)
     * job_logs_latest - sends the most recent job logs over the comm channel (requires a job_id)
+    * start_job_status_deltas - the update loop sends job_status_delta messages with only the
+        changes to each job's state, instead of whole job states
+    * stop_job_status_deltas - the update loop goes back to sending whole job states
+    * resync_job_status - sends the full state of all jobs as a job_status_delta message, to
+        recover from a missed message
+    * subscribe_job_logs - sends new log lines for a job as they show up, until the job
+        finishes (requires a job_id, optional first_line to start from)
+    * unsubscribe_job_logs - stops sending new log lines for a job (requires a job_id)
     """
 
     # An instance of this class. It's meant to be a singleton, so this just gets created and
@@ -88,6 +141,28 @@ class JobComm:
     _msg_map = None
     _running_lookup_loop = False
     _lookup_timer = None
+    # guards starting and stopping the lookup loop, which can happen from any request thread
+    _loop_lock = threading.RLock()
+    # keys = job_id, values = time.monotonic() time when the job's next due to be looked up
+    _job_poll_times = None
+    # keys = job_id, values = the last state sent from the lookup loop
+    _last_job_states = None
+    # if True, the lookup loop sends job_status_delta messages
+    _send_deltas = False
+    # sequence number of the last job_status_delta message
+    _status_seq = 0
+    _status_lock = threading.RLock()
+    # keys = job_id, values = number of the next log line to send
+    _log_subscriptions = None
+    _log_timer = None
+    _log_lock = threading.RLock()
+    # handles requests, see _handle_comm_message
+    _executor = None
+    # keys = request type, values = BoundedSemaphore limiting how many run at once
+    _request_limits = None
+    # keys = request key (see _request_key), values = Future of the request being handled
+    _in_flight = None
+    _in_flight_lock = threading.RLock()
     _log = kblogging.get_logger(__name__)
 
     def __new__(cls):
@@ -112,8 +187,25 @@ class JobComm:
                "stop_job_update": self._modify_job_update,
                "cancel_job": self._cancel_job,
                "job_logs": self._get_job_logs,
-               "job_logs_latest": self._get_job_logs
+               "job_logs_latest": self._get_job_logs,
+               "start_job_status_deltas": self._start_job_status_deltas,
+               "stop_job_status_deltas": self._stop_job_status_deltas,
+               "resync_job_status": self._resync_job_status,
+               "subscribe_job_logs": self._subscribe_job_logs,
+               "unsubscribe_job_logs": self._unsubscribe_job_logs
             }
+        if self._job_poll_times is None:
+            self._job_poll_times = dict()
+        if self._last_job_states is None:
+            self._last_job_states = dict()
+        if self._log_subscriptions is None:
+            self._log_subscriptions = dict()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=COMM_MAX_WORKERS)
+            self._request_limits = dict(
+                (request, threading.BoundedSemaphore(limit))
+                for (request, limit) in REQUEST_CONCURRENCY.items())
+            self._in_flight = dict()
 
     def _verify_job_id(self, req: JobRequest) -> None:
         if req.job_id is None:
@@ -122,51 +214,227 @@ class JobComm:
 
     def start_job_status_loop(self, *args, **kwargs) -> None:
         """
-        Starts the job status lookup loop. This runs every 10 seconds.
+        Starts the job status lookup loop. This first looks up and sends all job states,
+        then checks on jobs as they come due (see _job_poll_interval).
         This has the bare *args and **kwargs to handle the case where this comes in as a job
         channel request (gets a JobRequest arg), or has the "init_jobs" kwarg.
 
-        If init_jobs=True, this attempts to reinitialize the JobManager's list of known jobs
-        from the workspace.
+        If init_jobs=True, this reinitializes the JobManager's list of known jobs from the
+        workspace, in the background. Jobs get sent as they load, newest first (see
+        _send_job_page), and the loop starts once they're all loaded. If jobs are already
+        loading, the loop waits for that to finish as well - see _finish_job_init.
         """
-        self._running_lookup_loop = True
-        if kwargs.get("init_jobs", False):
-            try:
-                self._jm.initialize_jobs()
-            except Exception as e:
-                error = {
-                    "error": "Unable to get initial jobs list",
-                    "message": getattr(e, "message", "Unknown reason"),
-                    "code": getattr(e, "code", -1),
-                    "source": getattr(e, "source", "jobmanager"),
-                    "name": getattr(e, "name", type(e).__name__),
-                    "service": "execution_engine2"
-                }
-                self.send_comm_message("job_init_err", error)
-        if self._lookup_timer is None:
-            self._lookup_job_status_loop()
+        with self._loop_lock:
+            self._running_lookup_loop = True
+            if kwargs.get("init_jobs", False):
+                self._jm.start_initialize_jobs(page_callback=self._send_job_page,
+                                               done_callback=self._finish_job_init)
+                return
+            if self._jm.jobs_loading():
+                return
+            if self._lookup_timer is None:
+                self._lookup_job_status_loop(full_lookup=True)
+
+    def _send_job_page(self, job_ids: list) -> None:
+        """
+        Looks up and sends the states of a page of jobs that was just loaded by the
+        JobManager, as job_status messages (or a job_status_delta message).
+        """
+        job_states = self._jm.lookup_job_states(job_ids)
+        with self._status_lock:
+            if self._send_deltas:
+                self._send_job_status_delta(job_states)
+            else:
+                for job_state in job_states.values():
+                    self.send_comm_message("job_status", job_state)
+            self._remember_job_states(job_states)
+
+    def _finish_job_init(self, error: Exception = None) -> None:
+        """
+        Runs once the JobManager is done loading jobs. If that failed, this sends a
+        job_init_err message. Then, it starts the lookup loop with a full lookup.
+        """
+        if error is not None:
+            self.send_comm_message("job_init_err", {
+                "error": "Unable to get initial jobs list",
+                "message": getattr(error, "message", "Unknown reason"),
+                "code": getattr(error, "code", -1),
+                "source": getattr(error, "source", "jobmanager"),
+                "name": getattr(error, "name", type(error).__name__),
+                "service": "execution_engine2"
+            })
+        with self._loop_lock:
+            if self._running_lookup_loop and self._lookup_timer is None:
+                self._lookup_job_status_loop(full_lookup=True)
 
     def stop_job_status_loop(self, *args, **kwargs) -> None:
         """
         Stops the job status lookup loop if it's running. Otherwise, this effectively
         does nothing.
         """
-        if self._lookup_timer:
-            self._lookup_timer.cancel()
-            self._lookup_timer = None
-        self._running_lookup_loop = False
+        with self._loop_lock:
+            if self._lookup_timer:
+                self._lookup_timer.cancel()
+                self._lookup_timer = None
+            self._running_lookup_loop = False
 
-    def _lookup_job_status_loop(self) -> None:
+    def _lookup_job_status_loop(self, full_lookup: bool = False) -> None:
+        """
+        Run a loop that will look up job info.
+        If full_lookup is True, this looks up all jobs and sends them as a job_status_all
+        message. Otherwise, it only looks up the running or listened-to jobs that are due, and
+        sends a job_status message for each one whose state changed since the last time.
+        If sending deltas, those are job_status_delta messages instead - see
+        _send_job_status_delta.
+        After running, this spawns a Timer thread to run itself again when the next job is due.
+        If there are no more jobs to check on, the loop stops.
+        """
+        with self._loop_lock:
+            # a Timer that fired after the loop was stopped (or restarted) has nothing to do
+            if not full_lookup and threading.current_thread() is not self._lookup_timer:
+                return
+            if full_lookup:
+                self._job_poll_times = dict()
+                if self._send_deltas:
+                    job_states = self._resync_job_status(None)
+                else:
+                    job_states = self._lookup_all_job_states(None)
+                    self._last_job_states = dict()
+                    self._remember_job_states(job_states)
+                self._schedule_job_lookups(job_states)
+            else:
+                self._lookup_due_job_states()
+            active_jobs = self._jm.list_active_jobs()
+            if len(active_jobs) == 0 or not self._running_lookup_loop:
+                self.stop_job_status_loop()
+            else:
+                self._lookup_timer = threading.Timer(self._next_loop_interval(active_jobs),
+                                                     self._lookup_job_status_loop)
+                self._lookup_timer.start()
+
+    def _lookup_due_job_states(self) -> dict:
+        """
+        Looks up the state of every active job whose next lookup is due, and sends the ones
+        that changed to the front end as job_status messages (or a job_status_delta message).
+        Returns all of the looked up states, keyed on job id.
+        """
+        now = time.monotonic()
+        due_jobs = [job_id for job_id in self._jm.list_active_jobs()
+                    if self._job_poll_times.get(job_id, 0) <= now]
+        if len(due_jobs) == 0:
+            return dict()
+        job_states = self._jm.lookup_job_states(due_jobs)
+        with self._status_lock:
+            changed = dict((job_id, job_state) for (job_id, job_state) in job_states.items()
+                           if job_state != self._last_job_states.get(job_id))
+            if self._send_deltas:
+                self._send_job_status_delta(changed)
+            else:
+                for job_state in changed.values():
+                    self.send_comm_message("job_status", job_state)
+            self._remember_job_states(changed)
+        self._schedule_job_lookups(job_states)
+        return job_states
+
+    def _remember_job_states(self, job_states: dict) -> None:
         """
-        Run a loop that will look up job info. After running, this spawns a Timer thread on a 10
-        second loop to run itself again.
+        Keeps a copy of the given job states as the last ones sent, to compare against later.
         """
-        job_statuses = self._lookup_all_job_states(None)
-        if len(job_statuses) == 0 or not self._running_lookup_loop:
-            self.stop_job_status_loop()
-        else:
-            self._lookup_timer = threading.Timer(10, self._lookup_job_status_loop)
-            self._lookup_timer.start()
+        with self._status_lock:
+            for (job_id, job_state) in job_states.items():
+                self._last_job_states[job_id] = copy.deepcopy(job_state)
+
+    def _send_job_status_delta(self, job_states: dict, full: bool = False) -> None:
+        """
+        Sends a job_status_delta message for the given job states, keyed on job id. This looks
+        like:
+        {
+            seq: int - goes up by one with each job_status_delta message. If the front end sees
+                a gap, it should send a resync_job_status request,
+            full: boolean - if True, jobs has the whole state of every job, and replaces
+                anything known before,
+            jobs: dict - keys = job id. If full, the values are job states. Otherwise, they're
+                lists of changes to the last state sent for that job, as made by
+                biokbase.narrative.jobs.util.diff_states.
+        }
+        If full is False and nothing changed, nothing gets sent.
+        """
+        with self._status_lock:
+            if full:
+                jobs = job_states
+            else:
+                jobs = dict((job_id, diff_states(self._last_job_states.get(job_id), job_state))
+                            for (job_id, job_state) in job_states.items())
+                jobs = dict((job_id, ops) for (job_id, ops) in jobs.items() if len(ops))
+                if len(jobs) == 0:
+                    return
+            self._status_seq += 1
+            self.send_comm_message("job_status_delta", {
+                "seq": self._status_seq,
+                "full": full,
+                "jobs": jobs
+            })
+
+    def _start_job_status_deltas(self, req: JobRequest) -> None:
+        """
+        Has the lookup loop send job_status_delta messages from now on, and sends the full
+        state of all jobs to start from.
+        """
+        self._send_deltas = True
+        self._resync_job_status(req)
+
+    def _stop_job_status_deltas(self, req: JobRequest) -> None:
+        """
+        Has the lookup loop go back to sending whole job states in job_status messages.
+        """
+        self._send_deltas = False
+
+    def _resync_job_status(self, req: JobRequest) -> dict:
+        """
+        Looks up all job states, and sends them to the front end as a full job_status_delta
+        message. Later deltas are based on these states.
+        req can be None, as it's not used.
+        """
+        job_states = self._jm.lookup_all_job_states(ignore_refresh_flag=True)
+        with self._status_lock:
+            self._send_job_status_delta(job_states, full=True)
+            self._last_job_states = dict()
+            self._remember_job_states(job_states)
+        return job_states
+
+    def _schedule_job_lookups(self, job_states: dict) -> None:
+        """
+        Sets when each of the given jobs is next due to be looked up.
+        """
+        now = time.monotonic()
+        for (job_id, job_state) in job_states.items():
+            interval = self._job_poll_interval(job_state)
+            jitter = random.uniform(-JOB_POLL_JITTER, JOB_POLL_JITTER)
+            self._job_poll_times[job_id] = now + interval * (1 + jitter)
+
+    def _job_poll_interval(self, job_state: dict) -> float:
+        """
+        Returns the number of seconds to wait before looking up a job again, based on its
+        state (as made by JobManager._construct_job_status). See JOB_POLL_INTERVALS.
+        """
+        state = job_state.get("state", {})
+        status = state.get("status")
+        if status in jobmanager.TERMINAL_STATES:
+            return JOB_POLL_INTERVALS["finished"]
+        if status == "running":
+            started = state.get("running")
+            if started and time.time() - started / 1000.0 > LONG_RUNNING_JOB_TIME:
+                return JOB_POLL_INTERVALS["long_running"]
+            return JOB_POLL_INTERVALS["running"]
+        return JOB_POLL_INTERVALS["queued"]
+
+    def _next_loop_interval(self, active_jobs: list) -> float:
+        """
+        Returns how long to wait, in seconds, before the next job is due to be looked up.
+        """
+        now = time.monotonic()
+        next_due = min(self._job_poll_times.get(job_id, now) for job_id in active_jobs)
+        return min(max(next_due - now, MIN_LOOP_INTERVAL), MAX_LOOP_INTERVAL)
 
     def _lookup_all_job_states(self, req: JobRequest) -> dict:
         """
@@ -303,7 +571,100 @@ class JobComm:
             })
             raise
 
-    def _handle_comm_message(self, msg: dict) -> None:
+    def _subscribe_job_logs(self, req: JobRequest) -> None:
+        """
+        Starts sending new log lines for a job, in job_logs messages, until the job finishes.
+        If the request has a first_line, lines from there on get sent. Otherwise, only lines
+        that show up from now on get sent.
+        """
+        self._verify_job_id(req)
+        first_line = req.rq_data.get("first_line")
+        try:
+            if first_line is None:
+                (_, first_line, _) = self._jm.get_job_logs(req.job_id, num_lines=0)
+        except ValueError:
+            self.send_error_message("job_does_not_exist", req)
+            raise
+        with self._log_lock:
+            self._log_subscriptions[req.job_id] = max(first_line, 0)
+            if self._log_timer is None:
+                self._lookup_job_logs_loop()
+
+    def _unsubscribe_job_logs(self, req: JobRequest) -> None:
+        """
+        Stops sending new log lines for a job. Does nothing if there's no subscription.
+        """
+        self._verify_job_id(req)
+        with self._log_lock:
+            self._log_subscriptions.pop(req.job_id, None)
+            if len(self._log_subscriptions) == 0:
+                self._stop_job_logs_loop()
+
+    def _stop_job_logs_loop(self) -> None:
+        with self._log_lock:
+            if self._log_timer is not None:
+                self._log_timer.cancel()
+                self._log_timer = None
+
+    def _lookup_job_logs_loop(self) -> None:
+        """
+        Sends the new log lines for each subscribed job, then runs again in
+        LOG_POLL_INTERVAL seconds. Once there are no subscriptions, this stops.
+        """
+        self._lookup_subscribed_logs()
+        with self._log_lock:
+            if len(self._log_subscriptions) == 0:
+                self._stop_job_logs_loop()
+            else:
+                self._log_timer = threading.Timer(LOG_POLL_INTERVAL, self._lookup_job_logs_loop)
+                self._log_timer.start()
+
+    def _lookup_subscribed_logs(self) -> None:
+        """
+        Sends a job_logs message with the new lines of each subscribed job, if there are any.
+        Jobs that were finished before their log got fetched have their whole log, so they
+        get sent with "done": True, and unsubscribed.
+        Jobs that fail the lookup get a job_comm_error, and are unsubscribed.
+        """
+        with self._log_lock:
+            subscriptions = dict(self._log_subscriptions)
+        if len(subscriptions) == 0:
+            return
+        job_states = self._jm.lookup_job_states(list(subscriptions.keys()))
+        for (job_id, first_line) in subscriptions.items():
+            status = job_states.get(job_id, {}).get("state", {}).get("status")
+            done = status in jobmanager.TERMINAL_STATES
+            try:
+                (first_line, max_lines, logs) = self._jm.get_job_logs(job_id,
+                                                                      first_line=first_line)
+            except Exception as e:
+                self.send_comm_message("job_comm_error", {
+                    "job_id": job_id,
+                    "source": "subscribe_job_logs",
+                    "error": "Unable to retrieve job logs",
+                    "message": getattr(e, "message", str(e)),
+                    "code": getattr(e, "code", -1),
+                    "name": getattr(e, "name", type(e).__name__)
+                })
+                done = True
+            else:
+                if len(logs) or done:
+                    self.send_comm_message("job_logs", {
+                        "job_id": job_id,
+                        "first": first_line,
+                        "max_lines": max_lines,
+                        "lines": logs,
+                        "latest": False,
+                        "done": done
+                    })
+            with self._log_lock:
+                if job_id in self._log_subscriptions:
+                    if done:
+                        del self._log_subscriptions[job_id]
+                    else:
+                        self._log_subscriptions[job_id] = first_line + len(logs)
+
+    def _handle_comm_message(self, msg: dict) -> Future:
         """
         Handles comm messages that come in from the other end of the KBaseJobs channel.
         Messages get translated into a JobRequest object, which is then passed to the
@@ -311,16 +672,60 @@ class JobComm:
 
         A handler dictionary is created on JobComm creation.
 
+        Handlers run on a worker thread, and send their replies when they're done. This
+        returns a Future for the handler's result - if the handler raises an exception,
+        that gets set on the Future (and logged).
+        If the same request is already being handled, and its type is in COALESCED_REQUESTS,
+        this returns that request's Future instead.
+
         Any unknown request is returned over the channel as a job_comm_error, and a
-        ValueError is raised.
+        ValueError is raised right away.
         """
         request = JobRequest(msg)
         kblogging.log_event(self._log, "handle_comm_message", {"msg": request.request})
-        if request.request in self._msg_map:
-            self._msg_map[request.request](request)
-        else:
+        if request.request not in self._msg_map:
             self.send_comm_message("job_comm_error", {"message": "Unknown message", "request_type": request.request})
             raise ValueError(f"Unknown KBaseJobs message '{request.request}'")
+        if request.request not in COALESCED_REQUESTS:
+            return self._submit_request(request)
+        key = self._request_key(request)
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._submit_request(request)
+                self._in_flight[key] = future
+                future.add_done_callback(lambda f: self._request_done(key, f))
+            return future
+
+    def _submit_request(self, request: JobRequest) -> Future:
+        future = self._executor.submit(self._run_request, request)
+        future.add_done_callback(lambda f: self._log_request_error(request, f))
+        return future
+
+    def _run_request(self, request: JobRequest):
+        limit = self._request_limits.get(request.request)
+        if limit is None:
+            return self._msg_map[request.request](request)
+        with limit:
+            return self._msg_map[request.request](request)
+
+    @staticmethod
+    def _request_key(request: JobRequest) -> tuple:
+        return (request.request, request.job_id,
+                json.dumps(request.rq_data, sort_keys=True, default=str))
+
+    def _request_done(self, key: tuple, future: Future) -> None:
+        with self._in_flight_lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def _log_request_error(self, request: JobRequest, future: Future) -> None:
+        if future.exception() is not None:
+            kblogging.log_event(self._log, "handle_comm_message_error", {
+                "msg": request.request,
+                "job_id": request.job_id,
+                "err": str(future.exception())
+            })
 
     def send_comm_message(self, msg_type: str, content: dict) -> None:
         """
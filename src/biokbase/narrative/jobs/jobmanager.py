@@ -1,7 +1,9 @@
 import biokbase.narrative.clients as clients
 from .job import Job
+from .statestore import JobStateStore
 # from ipykernel.comm import Comm
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from biokbase.narrative.common import kblogging
 from IPython.display import HTML
 from jinja2 import Template
@@ -11,7 +13,10 @@ from datetime import (
     timedelta
 )
 import time
-from biokbase.narrative.app_util import system_variable
+from biokbase.narrative.app_util import (
+    system_variable,
+    invalidate_object_info
+)
 from biokbase.narrative.exception_util import (
     transform_job_exception
 )
@@ -30,6 +35,20 @@ __version__ = "0.0.1"
 
 TERMINAL_STATES = ["completed", "terminated", "error"]
 EXCLUDED_JOB_STATE_FIELDS = ["authstrat", "job_input", "condor_job_ads"]
+# Fields of a job status that only apply to this session, and don't get saved with
+# finished job states.
+SESSION_JOB_STATE_FIELDS = ["listener_count"]
+# Fields left out when first loading jobs. The job parameters can be big, so they get
+# fetched only when they're needed (see Job.parameters).
+JOB_INIT_EXCLUDED_FIELDS = ["authstrat", "condor_job_ads", "job_input.params"]
+# Number of jobs registered at a time while loading a narrative's jobs.
+JOB_INIT_PAGE_SIZE = 100
+# Seconds to wait for jobs to finish loading, when asked about a job that isn't loaded yet.
+JOB_INIT_WAIT_TIMEOUT = 30
+# Max number of job ids sent in a single check_jobs call.
+CHECK_JOBS_CHUNK_SIZE = 100
+# Max number of check_jobs calls run at the same time.
+CHECK_JOBS_MAX_WORKERS = 4
 
 class JobManager(object):
     """
@@ -39,41 +58,129 @@ class JobManager(object):
     """
     __instance = None
 
-    # keys = job_id, values = { refresh = T/F, job = Job object }
+    # keys = job_id, values = { refresh = int, job = Job object, canceling = int (optional) }
+    # refresh and canceling get changed under _index_lock.
     _running_jobs = dict()
+    # Indexes of the jobs in _running_jobs. These get updated by _add_job and
+    # _index_job_state, and are used by the get_jobs_* functions.
+    # keys = cell_id, values = set of job ids
+    _jobs_by_cell = dict()
+    # keys = run_id, values = set of job ids
+    _jobs_by_run = dict()
+    # keys = parent job id, values = set of child job ids
+    _child_jobs = dict()
+    # keys = status (as reported by EE2), values = set of job ids
+    _jobs_by_status = dict()
+    # keys = job_id, values = last known status
+    _job_status = dict()
+    _index_lock = threading.RLock()
     # keys = job_id, values = state from either Job object or NJS (these are identical)
-    _completed_job_states = dict()
+    # These get saved to disk, so they survive a kernel restart.
+    _completed_job_states = JobStateStore()
+    # thread pool for running chunks of check_jobs calls, made on first use
+    _check_jobs_pool = None
+    # set when no jobs are being loaded by initialize_jobs
+    _jobs_loaded = None
+    # the thread started by start_initialize_jobs
+    _init_thread = None
 
     _log = kblogging.get_logger(__name__)
 
     def __new__(cls):
         if JobManager.__instance is None:
             JobManager.__instance = object.__new__(cls)
+            JobManager.__instance._jobs_loaded = threading.Event()
+            JobManager.__instance._jobs_loaded.set()
         return JobManager.__instance
 
-    def initialize_jobs(self):
+    def initialize_jobs(self, page_callback=None):
         """
         Initializes this JobManager.
         This is expected to be run by a running Narrative, and naturally linked to a workspace.
         So it does the following steps.
         1. app_util.system_variable('workspace_id')
         2. get list of jobs with that ws id from UJS (also gets tag, cell_id, run_id)
-        3. initialize the Job objects by running NJS.get_job_params (also gets app_id)
-        4. start the status lookup loop.
+        3. initialize the Job objects, newest first, in pages of JOB_INIT_PAGE_SIZE jobs.
+           After each page, page_callback(list of job ids) gets called, if given.
+        While this runs, asking about a job that isn't loaded yet waits for it to finish
+        (see _has_job). Known jobs are only replaced once the jobs have been fetched, so if
+        that fails they're all kept. Jobs registered while loading are kept either way.
         """
         ws_id = system_variable("workspace_id")
         job_states = dict()
         kblogging.log_event(self._log, "JobManager.initialize_jobs", {'ws_id': ws_id})
+        self._jobs_loaded.clear()
+        with self._index_lock:
+            known_jobs = set(self._running_jobs.keys())
         try:
-            job_states = clients.get('execution_engine2').check_workspace_jobs({
-                'workspace_id': ws_id, 'return_list': 0})
-            self._running_jobs = dict()
-        except Exception as e:
-            kblogging.log_event(self._log, 'init_error', {'err': str(e)})
-            new_e = transform_job_exception(e)
-            raise new_e
+            try:
+                job_states = clients.get('execution_engine2').check_workspace_jobs({
+                    'workspace_id': ws_id,
+                    'exclude_fields': JOB_INIT_EXCLUDED_FIELDS,
+                    'return_list': 0})
+            except Exception as e:
+                kblogging.log_event(self._log, 'init_error', {'err': str(e)})
+                new_e = transform_job_exception(e)
+                raise new_e
+            self._reset_jobs(known_jobs)
+
+            ordered_states = sorted(job_states.items(),
+                                    key=lambda item: item[1].get('created', 0), reverse=True)
+            for i in range(0, len(ordered_states), JOB_INIT_PAGE_SIZE):
+                page = ordered_states[i:i + JOB_INIT_PAGE_SIZE]
+                self._register_job_page(page)
+                if page_callback is not None:
+                    page_callback([job_id for (job_id, _) in page])
+        finally:
+            self._jobs_loaded.set()
+
+    def start_initialize_jobs(self, page_callback=None, done_callback=None) -> threading.Thread:
+        """
+        Runs initialize_jobs on a background thread, and returns that thread.
+        When it's done, done_callback(error) gets called, if given - error is None, or the
+        exception that stopped the jobs from loading.
+        """
+        self._jobs_loaded.clear()
+
+        def run_init():
+            error = None
+            try:
+                self.initialize_jobs(page_callback=page_callback)
+            except Exception as e:
+                error = e
+            if done_callback is not None:
+                done_callback(error)
+
+        self._init_thread = threading.Thread(target=run_init, daemon=True)
+        self._init_thread.start()
+        return self._init_thread
+
+    def jobs_loading(self) -> bool:
+        """
+        Returns True while jobs are being loaded by initialize_jobs.
+        """
+        return not self._jobs_loaded.is_set()
+
+    def _has_job(self, job_id: str) -> bool:
+        """
+        Returns True if the job is known. If jobs are still loading, this waits for them
+        first (up to JOB_INIT_WAIT_TIMEOUT seconds).
+        """
+        if job_id in self._running_jobs:
+            return True
+        if job_id is not None and not self._jobs_loaded.is_set():
+            self._jobs_loaded.wait(JOB_INIT_WAIT_TIMEOUT)
+        return job_id in self._running_jobs
 
-        for job_id, job_state in job_states.items():
+    def _register_job_page(self, job_states: list) -> None:
+        """
+        Makes Jobs from a list of (job id, job state) tuples, as returned by
+        check_workspace_jobs. Jobs that are already known (e.g. started while loading) are
+        left alone.
+        """
+        for job_id, job_state in job_states:
+            if job_id in self._running_jobs:
+                continue
             job_input = job_state.get('job_input', {})
             job_meta = job_input.get('narrative_cell_info', {})
             status = job_state.get('status')
@@ -86,10 +193,8 @@ class JobManager(object):
                                  run_id=job_meta.get('run_id', None),
                                  token_id=job_meta.get('token_id', None),
                                  meta=job_meta)
-            self._running_jobs[job_id] = {
-                'refresh': 1 if status not in ['completed', 'errored', 'terminated'] else 0,
-                'job': job
-            }
+            self._add_job(job, 1 if status not in ['completed', 'errored', 'terminated'] else 0)
+            self._index_job_state(job_id, job_state)
 
     def _create_jobs(self, job_ids):
         """
@@ -98,8 +203,7 @@ class JobManager(object):
         Initially used to make Child jobs from some parent, but will eventually be adapted to all jobs on startup.
         Just slaps them all into _running_jobs
         """
-        job_states = clients.get('execution_engine2').check_jobs({'job_ids': job_ids,
-                                                                  'return_list': 0})
+        (job_states, _) = self._check_jobs(job_ids, exclude_fields=JOB_INIT_EXCLUDED_FIELDS)
         for job_id in job_ids:
             if job_id in job_ids and job_id not in self._running_jobs:
                 job_state = job_states.get(job_id, {})
@@ -120,10 +224,100 @@ class JobManager(object):
                 # they are set to not be refreshed. Rather, if a client requests
                 # updates via the start_job_update message, the refresh flag will
                 # be set to True.
-                self._running_jobs[job_id] = {
-                    'refresh': 0,
-                    'job': job
-                }
+                self._add_job(job, 0)
+                self._index_job_state(job_id, job_state)
+
+    def _reset_jobs(self, known_jobs: set) -> None:
+        """
+        Forgets the jobs in known_jobs, and empties the job indexes. Any other jobs (i.e.
+        registered since known_jobs was taken) are kept, and indexed again.
+        """
+        with self._index_lock:
+            new_jobs = [(job_info, self._job_status.get(job_id))
+                        for (job_id, job_info) in self._running_jobs.items()
+                        if job_id not in known_jobs]
+            self._clear_jobs()
+            for (job_info, status) in new_jobs:
+                self._add_job(job_info['job'], job_info['refresh'])
+                self._index_job_state(job_info['job'].job_id, {'status': status})
+
+    def _clear_jobs(self) -> None:
+        """
+        Forgets all jobs, and empties the job indexes.
+        """
+        with self._index_lock:
+            self._running_jobs = dict()
+            self._jobs_by_cell = dict()
+            self._jobs_by_run = dict()
+            self._child_jobs = dict()
+            self._jobs_by_status = dict()
+            self._job_status = dict()
+
+    def _add_job(self, job: Job, refresh: int) -> None:
+        """
+        Adds a Job to the set of known jobs, and indexes it by cell and run id.
+        """
+        with self._index_lock:
+            self._running_jobs[job.job_id] = {'refresh': refresh, 'job': job}
+            if job.cell_id is not None:
+                self._jobs_by_cell.setdefault(job.cell_id, set()).add(job.job_id)
+            if job.run_id is not None:
+                self._jobs_by_run.setdefault(job.run_id, set()).add(job.job_id)
+
+    def _index_job_state(self, job_id: str, state: dict) -> None:
+        """
+        Updates the status and parent/child indexes with a job state as it comes from EE2.
+        """
+        if not state:
+            return
+        with self._index_lock:
+            status = state.get('status')
+            old_status = self._job_status.get(job_id)
+            if status is not None and status != old_status:
+                if old_status is not None:
+                    self._jobs_by_status.get(old_status, set()).discard(job_id)
+                self._jobs_by_status.setdefault(status, set()).add(job_id)
+                self._job_status[job_id] = status
+            if state.get('sub_jobs'):
+                self._child_jobs.setdefault(job_id, set()).update(state['sub_jobs'])
+            if state.get('parent_job_id'):
+                self._child_jobs.setdefault(state['parent_job_id'], set()).add(job_id)
+
+    def get_jobs_for_cells(self, cell_ids: list) -> dict:
+        """
+        Returns the ids of the jobs started from each of the given cells.
+        :param cell_ids: list of cell ids
+        :returns: dict - keys = cell id, values = list of job ids (empty if there aren't any)
+        """
+        with self._index_lock:
+            return {cell_id: sorted(self._jobs_by_cell.get(cell_id, [])) for cell_id in cell_ids}
+
+    def get_jobs_for_runs(self, run_ids: list) -> dict:
+        """
+        Returns the ids of the jobs started by each of the given run ids.
+        :param run_ids: list of run ids
+        :returns: dict - keys = run id, values = list of job ids (empty if there aren't any)
+        """
+        with self._index_lock:
+            return {run_id: sorted(self._jobs_by_run.get(run_id, [])) for run_id in run_ids}
+
+    def get_jobs_by_status(self, statuses: list) -> list:
+        """
+        Returns the ids of the jobs whose last known status is one of the given ones
+        (e.g. ["queued", "running"]).
+        """
+        with self._index_lock:
+            job_ids = set()
+            for status in statuses:
+                job_ids.update(self._jobs_by_status.get(status, []))
+            return sorted(job_ids)
+
+    def get_child_jobs(self, parent_job_id: str) -> list:
+        """
+        Returns the ids of the known child jobs of a parent job.
+        """
+        with self._index_lock:
+            return sorted(self._child_jobs.get(parent_job_id, []))
 
     def list_jobs(self):
         """
@@ -343,14 +537,15 @@ class JobManager(object):
 
         sub_job_list = sorted(sub_job_list)
 
-        job_states = clients.get('execution_engine2').check_jobs({
-            'job_ids': sub_job_list,
-            'exclude_fields': EXCLUDED_JOB_STATE_FIELDS,
-            'return_list': 0
-        })
+        (job_states, errors) = self._check_jobs(sub_job_list,
+                                                exclude_fields=EXCLUDED_JOB_STATE_FIELDS)
         child_job_states = list()
 
         for job_id in sub_job_list:
+            if job_id in errors:
+                child_job_states.append(self._create_error_state(
+                    errors[job_id], "Unable to return job state", -1, job_id=job_id))
+                continue
             job_state = job_states.get(job_id, {})
             params = job_state.get('job_input', {}).get('params', [])
             # if it's error, get the error.
@@ -395,29 +590,127 @@ class JobManager(object):
         # Fetch from cache of terminated jobs, where available.
         # These are already post-processed and ready to return.
         for job_id in job_ids:
-            if job_id in self._completed_job_states:
-                job_states[job_id] = self._completed_job_states[job_id]
+            state = self._get_finished_state(job_id)
+            if state is not None:
+                job_states[job_id] = state
             else:
                 jobs_to_lookup.append(job_id)
 
-        fetched_states = dict()
         # Get the rest of states direct from EE2.
-        if len(jobs_to_lookup):
-            try:
-                fetched_states = clients.get("execution_engine2").check_jobs({
-                    "job_ids": jobs_to_lookup,
-                    "exclude_fields": EXCLUDED_JOB_STATE_FIELDS,
-                    "return_list": 0
-                })
-            except Exception as e:
-                kblogging.log_event(self._log, "construct_job_status_set", {"err": str(e)})
+        (fetched_states, errors) = self._check_jobs(jobs_to_lookup,
+                                                    exclude_fields=EXCLUDED_JOB_STATE_FIELDS)
+        # Jobs that couldn't be looked up get an error state, but that doesn't get cached.
+        for job_id in errors:
+            if job_id in self._running_jobs:
+                job_states[job_id] = self._construct_job_status(self.get_job(job_id), None)
+        self._load_job_inputs([job_id for (job_id, state) in fetched_states.items()
+                               if state.get("finished")])
         for job_id, state in fetched_states.items():
+            self._index_job_state(job_id, state)
+            ee2_status = (state.get("status"), state.get("errormsg"))
             revised_state = self._construct_job_status(self.get_job(job_id), state)
-            if revised_state["state"]["status"] in TERMINAL_STATES:
-                self._completed_job_states[job_id] = revised_state
+            self._save_finished_state(job_id, ee2_status, revised_state)
             job_states[job_id] = revised_state
         return job_states
 
+    def _get_finished_state(self, job_id: str) -> dict:
+        """
+        Returns the saved state of a finished job, with the session fields filled back in,
+        or None if it isn't saved.
+        """
+        state = self._completed_job_states.get(job_id)
+        if state is None:
+            return None
+        state = dict(state)
+        if job_id in self._running_jobs:
+            state["listener_count"] = self._running_jobs[job_id]["refresh"]
+        return state
+
+    def _save_finished_state(self, job_id: str, ee2_status: tuple, state: dict) -> bool:
+        """
+        Saves a job status made by _construct_job_status, if EE2 says the job is finished.
+        ee2_status is the (status, errormsg) tuple that EE2 gave, before the status was built.
+        If building the status changed either of those - i.e. the output viewer couldn't be
+        made - it's not saved, since that might work next time. Returns True if it was saved.
+        """
+        (status, errormsg) = ee2_status
+        if status not in TERMINAL_STATES:
+            return False
+        if state["state"].get("status") != status or state["state"].get("errormsg") != errormsg:
+            return False
+        self._completed_job_states[job_id] = dict(
+            (key, value) for (key, value) in state.items()
+            if key not in SESSION_JOB_STATE_FIELDS)
+        # the job just finished, and may have saved new versions of objects in its workspace
+        invalidate_object_info(state["state"].get("wsid"))
+        return True
+
+    def _load_job_inputs(self, job_ids: list) -> None:
+        """
+        Fetches the parameters of any of the given jobs that don't have them yet, all together.
+        These are needed to build the output viewer of a finished job.
+        If the lookup fails, each Job can still fetch its own later.
+        """
+        job_ids = [job_id for job_id in job_ids
+                   if job_id in self._running_jobs and self.get_job(job_id).inputs is None]
+        if not job_ids:
+            return
+        (job_states, _) = self._check_jobs(job_ids, exclude_fields=["authstrat",
+                                                                    "condor_job_ads"])
+        for (job_id, state) in job_states.items():
+            params = state.get("job_input", {}).get("params")
+            if params is not None:
+                self.get_job(job_id).inputs = params
+
+    def _check_jobs(self, job_ids: list, exclude_fields: list = None) -> tuple:
+        """
+        Looks up the states of the given jobs with EE2.check_jobs. Big lists of jobs get
+        split into chunks of CHECK_JOBS_CHUNK_SIZE, which are looked up at the same time on
+        up to CHECK_JOBS_MAX_WORKERS threads.
+        If a chunk fails, the rest still get returned, and each job in the failed chunk gets
+        an error.
+        :returns: 2-tuple. elements in order:
+            dict - keys = job id, values = job state from EE2
+            dict - keys = job id, values = error string, for jobs that couldn't be looked up
+        """
+        job_states = dict()
+        errors = dict()
+        if not job_ids:
+            return (job_states, errors)
+        ee2 = clients.get("execution_engine2")
+        params = {"return_list": 0}
+        if exclude_fields is not None:
+            params["exclude_fields"] = exclude_fields
+        chunks = [job_ids[i:i + CHECK_JOBS_CHUNK_SIZE]
+                  for i in range(0, len(job_ids), CHECK_JOBS_CHUNK_SIZE)]
+
+        def check_chunk(chunk):
+            # returns the exception instead of raising it, so one bad chunk doesn't lose
+            # the others
+            try:
+                return ee2.check_jobs(dict(params, job_ids=chunk))
+            except Exception as e:
+                return e
+
+        if len(chunks) == 1:
+            results = [(chunks[0], check_chunk(chunks[0]))]
+        else:
+            if self._check_jobs_pool is None:
+                JobManager._check_jobs_pool = ThreadPoolExecutor(
+                    max_workers=CHECK_JOBS_MAX_WORKERS)
+            futures = [(chunk, self._check_jobs_pool.submit(check_chunk, chunk))
+                       for chunk in chunks]
+            results = [(chunk, future.result()) for (chunk, future) in futures]
+        for (chunk, result) in results:
+            if isinstance(result, Exception):
+                kblogging.log_event(self._log, "check_jobs_error", {"err": str(result),
+                                                                    "num_jobs": len(chunk)})
+                for job_id in chunk:
+                    errors[job_id] = str(result)
+            else:
+                job_states.update(result)
+        return (job_states, errors)
+
     def _verify_job_parentage(self, parent_job_id, child_job_id):
         """
         Validate job relationships.
@@ -425,12 +718,13 @@ class JobManager(object):
         2. If child doesn't exist, create it and add it to the list.
         If parent doesn't exist, or child isn't an actual child, raise an exception
         """
-        if parent_job_id not in self._running_jobs:
+        if not self._has_job(parent_job_id):
             raise ValueError('Parent job id {} not found, cannot validate child job {}.'.format(parent_job_id, child_job_id))
         if child_job_id not in self._running_jobs:
             parent_job = self.get_job(parent_job_id)
-            parent_state = parent_job.state()
-            if child_job_id not in parent_state.get('sub_jobs', []):
+            if child_job_id not in self.get_child_jobs(parent_job_id):
+                self._index_job_state(parent_job_id, parent_job.state())
+            if child_job_id not in self.get_child_jobs(parent_job_id):
                 raise ValueError('Child job id {} is not a child of parent job {}'.format(child_job_id, parent_job_id))
             else:
                 self._create_jobs([child_job_id])
@@ -459,7 +753,7 @@ class JobManager(object):
             'app_id': job.app_id,
             'app_name': job.app_spec()['info']['name'],
             'job_id': job_id,
-            'job_params': job.inputs
+            'job_params': job.parameters()
         }
         return info
 
@@ -475,14 +769,36 @@ class JobManager(object):
         """
         jobs_to_lookup = list()
         # grab the list of running job ids, so we don't run into update-while-iterating problems.
-        for job_id in self._running_jobs.keys():
-            if self._running_jobs[job_id]['refresh'] > 0 or ignore_refresh_flag:
+        for (job_id, job_info) in list(self._running_jobs.items()):
+            if ignore_refresh_flag or \
+                    (job_info['refresh'] > 0 and not job_info.get('canceling')):
                 jobs_to_lookup.append(job_id)
         if len(jobs_to_lookup) > 0:
             return self._construct_job_status_set(jobs_to_lookup)
         else:
             return dict()
 
+    def lookup_job_states(self, job_ids: list) -> dict:
+        """
+        Fetches states for the given list of job ids, keyed on the job id.
+        Finished jobs are served from the cache, the rest are looked up together.
+        Raises a ValueError if job_ids isn't a list.
+        """
+        if not isinstance(job_ids, list):
+            raise ValueError("job_ids must be a list")
+        if len(job_ids) == 0:
+            return dict()
+        return self._construct_job_status_set(job_ids)
+
+    def list_active_jobs(self) -> list:
+        """
+        Returns the ids of jobs worth checking up on - those that something is listening to
+        for updates, or that haven't finished yet.
+        """
+        return [job_id for (job_id, job_info) in list(self._running_jobs.items())
+                if not job_info.get('canceling') and
+                (job_info['refresh'] > 0 or not self._completed_job_states.is_known(job_id))]
+
     def register_new_job(self, job: Job) -> None:
         """
         Registers a new Job with the manager - should only be invoked when a new Job gets
@@ -495,14 +811,14 @@ class JobManager(object):
             The new Job that was started.
         """
         kblogging.log_event(self._log, "register_new_job", {"job_id": job.job_id})
-        self._running_jobs[job.job_id] = {'job': job, 'refresh': 0}
+        self._add_job(job, 0)
 
     def get_job(self, job_id):
         """
         Returns a Job with the given job_id.
         Raises a ValueError if not found.
         """
-        if job_id in self._running_jobs:
+        if self._has_job(job_id):
             return self._running_jobs[job_id]["job"]
         else:
             raise ValueError(f"No job present with id {job_id}")
@@ -538,10 +854,8 @@ class JobManager(object):
 
         try:
             if latest_only:
-                (max_lines, logs) = job.log()
-                if num_lines is not None and max_lines > num_lines:
-                    first_line = max_lines - num_lines
-                    logs = logs[first_line:]
+                (max_lines, logs) = job.log(num_lines=num_lines, latest_only=True)
+                first_line = max_lines - len(logs)
             else:
                 (max_lines, logs) = job.log(first_line=first_line, num_lines=num_lines)
 
@@ -561,7 +875,7 @@ class JobManager(object):
 
         if job_id is None:
             raise ValueError('Job id required for cancellation!')
-        if not parent_job_id and job_id not in self._running_jobs:
+        if not parent_job_id and not self._has_job(job_id):
             raise ValueError(f"No job present with id {job_id}")
 
         try:
@@ -572,32 +886,39 @@ class JobManager(object):
         except Exception as e:
             raise transform_job_exception(e)
 
-        # Stop updating the job status while we try to cancel.
-        # Also, set it to have a special state of 'canceling' while we're doing the cancel
+        # Stop updating the job status while we try to cancel, by marking it as 'canceling'.
+        # The refresh count is left alone, so start/stop_job_update can still change it.
+        # This is a count, in case the same job gets canceled more than once at a time.
         if not parent_job_id:
-            is_refreshing = self._running_jobs[job_id].get('refresh', 0)
-            self._running_jobs[job_id]['refresh'] = 0
-            self._running_jobs[job_id]['canceling'] = True
+            with self._index_lock:
+                job_info = self._running_jobs[job_id]
+                job_info['canceling'] = job_info.get('canceling', 0) + 1
         try:
             clients.get('execution_engine2').cancel_job({'job_id': job_id})
         except Exception as e:
             raise transform_job_exception(e)
         finally:
             if not parent_job_id:
-                self._running_jobs[job_id]['refresh'] = is_refreshing
-                del self._running_jobs[job_id]['canceling']
+                with self._index_lock:
+                    job_info['canceling'] -= 1
+                    if job_info['canceling'] <= 0:
+                        del job_info['canceling']
 
     def get_job_state(self, job_id: str, parent_job_id: str=None) -> dict:
         if parent_job_id is not None:
             self._verify_job_parentage(parent_job_id, job_id)
-        if job_id is None or job_id not in self._running_jobs:
+        if job_id is None or not self._has_job(job_id):
             raise ValueError(f"No job present with id {job_id}")
-        if job_id in self._completed_job_states:
-            return self._completed_job_states[job_id]
+        state = self._get_finished_state(job_id)
+        if state is not None:
+            return state
         job = self.get_job(job_id)
-        state = self._construct_job_status(job, job.state())
-        if state.get('status') == 'completed':
-            self._completed_job_states[job_id] = state
+        # a copy, since _construct_job_status changes it
+        ee2_state = dict(job.state())
+        self._index_job_state(job_id, ee2_state)
+        ee2_status = (ee2_state.get("status"), ee2_state.get("errormsg"))
+        state = self._construct_job_status(job, ee2_state)
+        self._save_finished_state(job_id, ee2_status, state)
         return state
 
     def modify_job_refresh(self, job_id: str, update_adjust: int, parent_job_id: str=None) -> None:
@@ -608,8 +929,8 @@ class JobManager(object):
         """
         if parent_job_id is not None:
             self._verify_job_parentage(parent_job_id, job_id)
-        if job_id is None or job_id not in self._running_jobs:
+        if job_id is None or not self._has_job(job_id):
             raise ValueError(f"No job present with id {job_id}")
-        self._running_jobs[job_id]["refresh"] += update_adjust
-        if self._running_jobs[job_id]["refresh"] < 0:
-            self._running_jobs[job_id]["refresh"] = 0
+        with self._index_lock:
+            job_info = self._running_jobs[job_id]
+            job_info["refresh"] = max(job_info["refresh"] + update_adjust, 0)
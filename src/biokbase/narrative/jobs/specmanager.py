@@ -2,25 +2,283 @@ import biokbase.narrative.clients as clients
 from biokbase.narrative.app_util import (
     app_version_tags,
     check_tag,
-    app_param
+    compile_app_params
 )
+from biokbase.narrative.common.cache import TTLCache
+from biokbase.narrative.common import kblogging
+from biokbase.narrative.jobs.specsnapshot import SpecSnapshot
+from biokbase.narrative.jobs.specstore import SpecStore, spec_key
+from collections.abc import Mapping
 import json
+import threading
 from jinja2 import Template
 from IPython.display import HTML
 
+# If True, reload() starts a thread that loads all app specs in the background, so they're
+# ready when something needs all of them (like available_apps).
+WARM_SPECS_IN_BACKGROUND = True
+# Seconds between incremental refreshes of the loaded app specs, once the kernel starts them
+# (see SpecManager.start_auto_refresh). 0 or None turns that off.
+SPEC_REFRESH_INTERVAL = 600
+# Max number of compiled app params (see app_params) to keep, and for how many seconds.
+APP_PARAMS_CACHE_SIZE = 1000
+APP_PARAMS_CACHE_TTL = 3600
+
+# The shared store of app specs, so that tags with the same spec share a single copy.
+spec_store = SpecStore()
+# The on-disk snapshot of app specs shared by kernels on this host. It's only used if the
+# KB_SPEC_SNAPSHOT_DIR environment variable is set.
+spec_snapshot = SpecSnapshot()
+
+
+def _version_hash(info):
+    """
+    Returns the version marker of an app from its info or brief info - the git commit hash
+    of its module, or the version if there's no hash.
+    """
+    return info.get('git_commit_hash') or info.get('ver')
+
+
+class TagSpecs(Mapping):
+    """
+    The app specs for a single release tag, keyed on app id.
+    Nothing gets loaded until it's needed. The first lookup loads the list of app ids, and
+    each spec is fetched from the Narrative Method Store the first time it's asked for.
+    Going through all the values (values() or items()) loads all specs at once.
+
+    If client is None, this uses clients.get('narrative_method_store') when it's time to
+    load something. Specs are kept in store (a SpecStore), which defaults to the shared
+    spec_store.
+
+    If there's a fresh snapshot (a SpecSnapshot, defaults to the shared spec_snapshot), all
+    specs get loaded from that instead of the Narrative Method Store. Whenever all specs are
+    fetched from the service, they're written to the snapshot. If read_snapshot is False,
+    the snapshot only gets written, never read.
+    """
+    def __init__(self, tag, client=None, store=None, snapshot=None, read_snapshot=True):
+        self.tag = tag
+        self._client = client
+        self._spec_store = store if store is not None else spec_store
+        self._snapshot = snapshot if snapshot is not None else spec_snapshot
+        self._read_snapshot = read_snapshot
+        # set of app ids, or None if not loaded yet
+        self._ids = None
+        # keys = app id, values = spec
+        self._specs = dict()
+        # keys = app id, values = _version_hash of the loaded spec
+        self._hashes = dict()
+        self._complete = False
+        # goes up every time the loaded specs change
+        self.version = 0
+        self._lock = threading.RLock()
+
+    def _get_client(self):
+        if self._client is None:
+            return clients.get('narrative_method_store')
+        return self._client
+
+    def _index(self):
+        if self._ids is None:
+            with self._lock:
+                if self._ids is None and not self._load_snapshot():
+                    ids = self._get_client().list_method_ids_and_names({'tag': self.tag})
+                    self._ids = set(ids.keys())
+        return self._ids
+
+    def _load_snapshot(self):
+        """
+        Loads all specs from the snapshot, if there's a usable one.
+        Returns True if they were loaded.
+        """
+        if not self._read_snapshot:
+            return False
+        specs = self._snapshot.read(self.tag)
+        if specs is None:
+            return False
+        self._load_specs(specs)
+        return True
+
+    def _load_specs(self, specs):
+        self.release_all()
+        for spec in specs:
+            self._store(spec)
+        self._ids = set(self._specs.keys())
+        self._complete = True
+
+    def load_index(self):
+        """
+        Loads the list of app ids for this tag, if it isn't already.
+        """
+        self._index()
+
+    def load_all(self):
+        """
+        Loads every spec for this tag in a single call, if they aren't already.
+        """
+        if self._complete:
+            return
+        with self._lock:
+            if self._complete:
+                return
+            if self._load_snapshot():
+                return
+            specs = self._get_client().list_methods_spec({'tag': self.tag})
+            self._load_specs(specs)
+            self._snapshot.write(self.tag, specs)
+
+    def _store(self, spec):
+        self.version += 1
+        app_id = spec['info']['id']
+        old_spec = self._specs.get(app_id)
+        # replacing keeps the app's place in the order
+        self._specs[app_id] = self._spec_store.add(spec)
+        self._hashes[app_id] = _version_hash(spec['info'])
+        if old_spec is not None:
+            self._spec_store.release(old_spec)
+
+    def _drop(self, app_id):
+        spec = self._specs.pop(app_id, None)
+        self._hashes.pop(app_id, None)
+        if spec is not None:
+            self.version += 1
+            self._spec_store.release(spec)
+
+    def release_all(self):
+        """
+        Drops all loaded specs, and releases them from the spec store.
+        """
+        with self._lock:
+            for app_id in list(self._specs.keys()):
+                self._drop(app_id)
+            self._complete = False
+
+    def refresh(self):
+        """
+        Brings this tag up to date without downloading every spec again. This fetches the
+        brief info of each app (list_methods), and only fetches the full specs of loaded apps
+        whose git commit hash changed. If all specs were loaded, new apps get fetched too.
+        If nothing's been loaded for this tag, there's nothing to refresh, and this does nothing.
+
+        Returns the set of app ids that were added, changed, or removed.
+        """
+        with self._lock:
+            old_ids = self._ids
+            loaded_hashes = dict(self._hashes)
+            complete = self._complete
+        if old_ids is None:
+            return set()
+
+        client = self._get_client()
+        new_hashes = {brief['id']: _version_hash(brief)
+                      for brief in client.list_methods({'tag': self.tag})}
+        added = set(new_hashes.keys()) - old_ids
+        removed = old_ids - set(new_hashes.keys())
+        changed = set(app_id for app_id, old_hash in loaded_hashes.items()
+                      if app_id in new_hashes and new_hashes[app_id] != old_hash)
+        to_fetch = changed | added if complete else changed
+        fetched = list()
+        if len(to_fetch):
+            fetched = client.get_method_spec({'ids': sorted(to_fetch), 'tag': self.tag})
+
+        with self._lock:
+            for app_id in removed | (changed - set(spec['info']['id'] for spec in fetched)):
+                self._drop(app_id)
+            for spec in fetched:
+                self._store(spec)
+                # compare against the same marker that list_methods gives next time
+                self._hashes[spec['info']['id']] = new_hashes.get(spec['info']['id'])
+            # keep the specs in the same order as the service lists them
+            self._specs = {app_id: self._specs[app_id] for app_id in new_hashes
+                           if app_id in self._specs}
+            self._ids = set(new_hashes.keys())
+            self._complete = complete and self._ids.issubset(self._specs.keys())
+            updates = added | changed | removed
+            if self._complete and len(updates):
+                self._snapshot.write(self.tag, list(self._specs.values()))
+        return updates
+
+    def is_loaded(self):
+        return self._complete
+
+    def loaded_count(self):
+        """
+        The number of specs that have been loaded so far.
+        """
+        return len(self._specs)
+
+    def __contains__(self, app_id):
+        return app_id in self._index()
+
+    def __getitem__(self, app_id):
+        spec = self._specs.get(app_id)
+        if spec is not None:
+            return spec
+        if app_id not in self._index():
+            raise KeyError(app_id)
+        with self._lock:
+            if app_id not in self._specs:
+                specs = self._get_client().get_method_spec({'ids': [app_id], 'tag': self.tag})
+                for spec in specs:
+                    self._store(spec)
+        if app_id not in self._specs:
+            raise KeyError(app_id)
+        return self._specs[app_id]
+
+    def __iter__(self):
+        return iter(sorted(self._index()))
+
+    def __len__(self):
+        return len(self._index())
+
+    def values(self):
+        self.load_all()
+        return self._specs.values()
+
+    def items(self):
+        self.load_all()
+        return self._specs.items()
+
+    def versioned_items(self):
+        """
+        Loads all specs, and returns a tuple of the version and a copy of the specs as a dict
+        (keys = app id, values = spec). Both are read together, so the specs are the ones at
+        that version.
+        """
+        self.load_all()
+        with self._lock:
+            return (self.version, dict(self._specs))
+
 
 class SpecManager(object):
     __instance = None
 
+    # keys = tag, values = TagSpecs
     app_specs = dict()
-    type_specs = dict()
+    _type_specs = None
+    _client = None
+    _warm_thread = None
+    _refresh_timer = None
+    _refresh_interval = None
+    _refresh_lock = threading.Lock()
+    _app_params = TTLCache(maxsize=APP_PARAMS_CACHE_SIZE, ttl=APP_PARAMS_CACHE_TTL)
+    _log = kblogging.get_logger(__name__)
 
     def __new__(cls):
         if SpecManager.__instance is None:
             SpecManager.__instance = object.__new__(cls)
-            SpecManager.__instance.reload()
+            SpecManager.__instance.app_specs = {tag: TagSpecs(tag) for tag in app_version_tags}
         return SpecManager.__instance
 
+    @property
+    def type_specs(self):
+        """
+        All the type specs, keyed on type id. These get loaded the first time they're needed.
+        """
+        if self._type_specs is None:
+            client = self._client or clients.get('narrative_method_store')
+            self._type_specs = client.list_categories({'load_types': 1})[3]
+        return self._type_specs
+
     def get_spec(self, app_id, tag='release'):
         self.check_app(app_id, tag, raise_exception=True)
         return self.app_specs[tag][app_id]
@@ -35,18 +293,113 @@ class SpecManager(object):
 
     def reload(self):
         """
-        Reloads all app specs into memory from the latest update.
+        Reloads the list of available apps for each tag from the latest update. Specs of
+        individual apps, and the type specs, get fetched again when they're next needed.
+        This always goes to the Narrative Method Store, never the spec snapshot.
+        If WARM_SPECS_IN_BACKGROUND is True, this then loads all specs on a background thread.
         """
         client = clients.get('narrative_method_store')
+        app_specs = dict()
         for tag in app_version_tags:
-            specs = client.list_methods_spec({'tag': tag})
-            spec_dict = dict()
-            for spec in specs:
-                spec_dict[spec['info']['id']] = spec
-            self.app_specs[tag] = spec_dict
+            app_specs[tag] = TagSpecs(tag, client=client, read_snapshot=False)
+            app_specs[tag].load_index()
+        self._client = client
+        old_specs = self.app_specs
+        self.app_specs = app_specs
+        self._type_specs = None
+        for specs in old_specs.values():
+            specs.release_all()
+        if WARM_SPECS_IN_BACKGROUND:
+            self._warm_thread = threading.Thread(target=self._warm_specs,
+                                                 args=(list(app_specs.values()),),
+                                                 daemon=True)
+            self._warm_thread.start()
+
+    def refresh(self):
+        """
+        Incrementally updates the loaded app specs for each tag. Only the brief info of each
+        app gets fetched, and then the full specs of apps whose git commit hash changed - see
+        TagSpecs.refresh. Type specs aren't refreshed, use reload() for those.
 
-        # And let's load all types from the beginning and cache them
-        self.type_specs = client.list_categories({'load_types': 1})[3]
+        Returns a dict where keys = tag, values = set of app ids that were added, changed,
+        or removed.
+        """
+        updates = dict()
+        for tag, specs in self.app_specs.items():
+            updates[tag] = specs.refresh()
+        return updates
+
+    def start_auto_refresh(self, interval=None):
+        """
+        Starts refreshing the app specs (see refresh()) every interval seconds, on a Timer
+        thread. If that's already running, it restarts with the new interval.
+        interval defaults to SPEC_REFRESH_INTERVAL, and if that's 0 or None, this does nothing.
+        This gets started by the Narrative when the kernel starts up, not when a SpecManager
+        is made, so nothing else ends up with a thread calling the Narrative Method Store.
+        """
+        if interval is None:
+            interval = SPEC_REFRESH_INTERVAL
+        if not interval:
+            return
+        with self._refresh_lock:
+            self._refresh_interval = interval
+            self._schedule_refresh()
+
+    def stop_auto_refresh(self):
+        with self._refresh_lock:
+            self._refresh_interval = None
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+            self._refresh_timer = None
+
+    def _schedule_refresh(self):
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+        self._refresh_timer = threading.Timer(self._refresh_interval, self._auto_refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _auto_refresh(self):
+        """
+        Runs on the refresh Timer thread. Errors just get logged, and the next refresh
+        gets scheduled either way.
+        """
+        try:
+            updates = self.refresh()
+            updated = {tag: sorted(ids) for tag, ids in updates.items() if len(ids)}
+            if len(updated):
+                kblogging.log_event(self._log, "refresh_specs", {"updated": updated})
+        except Exception as e:
+            kblogging.log_event(self._log, "refresh_specs_error", {"err": str(e)})
+        with self._refresh_lock:
+            if self._refresh_interval:
+                self._schedule_refresh()
+
+    def memory_report(self):
+        """
+        Returns a dict describing the memory used by the loaded app specs:
+        {
+            "specs": int - number of distinct specs stored,
+            "references": int - number of loaded (tag, app) specs,
+            "bytes": int - approximate memory used by the stored specs,
+            "tags": dict - keys = tag, values = number of specs loaded for that tag
+        }
+        """
+        report = spec_store.memory_report()
+        report["tags"] = {tag: specs.loaded_count() for tag, specs in self.app_specs.items()}
+        return report
+
+    def _warm_specs(self, tag_specs):
+        """
+        Loads all app specs for each TagSpecs in the list. Errors just get logged - anything
+        that isn't loaded here gets fetched when it's needed.
+        """
+        for specs in tag_specs:
+            try:
+                specs.load_all()
+            except Exception as e:
+                kblogging.log_event(self._log, "warm_specs_error", {"tag": specs.tag,
+                                                                    "err": str(e)})
 
     def app_description(self, app_id, tag='release'):
         """
@@ -152,37 +505,17 @@ class SpecManager(object):
 
     def app_params(self, spec):
         """
-        Should return a dict of params with key = id, val =
-        {
-            optional = boolean,
-            is_constant = boolean,
-            value = (whatever, optional),
-            type = [text|int|float|list],
-            is_output = boolean,
-            short_hint = string,
-            description = string,
-            allowed_values = list (optional),
-        }
+        Returns the compiled parameters of the app spec, an AppParams. That's a list of param
+        infos, with indexes by id, group, outputs, and allowed types - see
+        app_util.compile_app_params. These are cached for each distinct spec (by app id and
+        git commit hash), and shared, so don't change them.
         """
-        params = list()
-        for p in spec['parameters']:
-            p_info = app_param(p)
-            params.append(p_info)
-
-        for p in spec.get('parameter_groups', []):
-            p_info = {'id': p.get('id', ''), 'is_group': True}
-            p_info['optional'] = p.get('optional', 0) == 1
-            p_info['short_hint'] = p.get('short_hint', '')
-            p_info['description'] = p.get('ui_name', '')
-            p_info['parameter_ids'] = p.get('parameter_ids', [])
-            p_info['id_mapping'] = p.get('id_mapping', {})
-            p_info['allow_multiple'] = p.get('allow_multiple', 0)
-            p_info['type'] = 'group'
-
-            params.append(p_info)
-
-        return sorted(params, key=lambda p: (p.get('optional', False), p.get('is_output', False)))
-
+        key = spec_key(spec)
+        params = self._app_params.get(key)
+        if params is None:
+            params = compile_app_params(spec)
+            self._app_params.put(key, params)
+        return params
 
 
 class AppUsage(object):
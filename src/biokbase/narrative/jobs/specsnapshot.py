@@ -0,0 +1,147 @@
+"""
+An on-disk snapshot of app specs that can be shared by all kernels on a host.
+
+Each tag gets its own JSON-lines file. The first line is a header with the snapshot format
+version, when it was written, and which Narrative Method Store it came from. Each line after
+that is a single app spec.
+
+Writes go to a temporary file that replaces the snapshot with os.replace, so readers never
+see a partly written file and don't need to lock anything. Writers take an exclusive lock on
+a separate lock file, so only one kernel writes at a time - if another one is writing, the
+write gets skipped.
+"""
+import json
+import os
+import tempfile
+import time
+from biokbase.narrative.common import kblogging
+from biokbase.narrative.common.url_config import URLS
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# If set, this environment variable is the directory where spec snapshots are kept.
+# If it's not set, no snapshot gets used.
+SPEC_SNAPSHOT_ENV = "KB_SPEC_SNAPSHOT_DIR"
+# Snapshots older than this many seconds are stale, and don't get read.
+SPEC_SNAPSHOT_MAX_AGE = 3600
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def default_snapshot_dir():
+    return os.environ.get(SPEC_SNAPSHOT_ENV)
+
+
+class SpecSnapshot(object):
+    """
+    Reads and writes snapshots of the app specs for each tag.
+    read() returns None whenever there's no usable snapshot - it's missing, stale, from a
+    different Narrative Method Store, or can't be read - so the caller can fall back to
+    fetching specs from the service.
+    """
+    _log = kblogging.get_logger(__name__)
+
+    def __init__(self, directory=None, max_age=SPEC_SNAPSHOT_MAX_AGE, source=None):
+        """
+        directory - where the snapshot files go. If None, this uses the KB_SPEC_SNAPSHOT_DIR
+            environment variable. If that's not set either, snapshots are turned off.
+        max_age - the number of seconds before a snapshot is stale.
+        source - the Narrative Method Store URL that specs come from. Defaults to the
+            configured one.
+        """
+        self._directory = directory
+        self.max_age = max_age
+        self._source = source
+
+    @property
+    def directory(self):
+        if self._directory is None:
+            return default_snapshot_dir()
+        return self._directory
+
+    @property
+    def source(self):
+        if self._source is None:
+            return URLS.narrative_method_store
+        return self._source
+
+    def enabled(self):
+        return bool(self.directory)
+
+    def path(self, tag):
+        return os.path.join(self.directory, "app_specs.{}.jsonl".format(tag))
+
+    def read(self, tag):
+        """
+        Returns the list of app specs in the snapshot for the given tag, or None if there's
+        no usable snapshot.
+        """
+        if not self.enabled():
+            return None
+        try:
+            with open(self.path(tag)) as snapshot:
+                header = json.loads(snapshot.readline())
+                if not self._is_usable(header, tag):
+                    return None
+                specs = [json.loads(line) for line in snapshot if line.strip()]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            kblogging.log_event(self._log, "spec_snapshot_error", {"err": str(e), "tag": tag})
+            return None
+        if len(specs) != header.get("count"):
+            return None
+        return specs
+
+    def _is_usable(self, header, tag):
+        return (isinstance(header, dict) and
+                header.get("version") == SNAPSHOT_FORMAT_VERSION and
+                header.get("tag") == tag and
+                header.get("source") == self.source and
+                time.time() - header.get("created", 0) < self.max_age)
+
+    def write(self, tag, specs):
+        """
+        Writes a new snapshot of the specs for the given tag.
+        Returns True if it got written, or False if snapshots are off, another process is
+        writing, or the write failed.
+        """
+        if not self.enabled():
+            return False
+        lock_file = None
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            lock_file = open(self.path(tag) + ".lock", "w")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+            header = {
+                "version": SNAPSHOT_FORMAT_VERSION,
+                "tag": tag,
+                "source": self.source,
+                "created": time.time(),
+                "count": len(specs)
+            }
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".app_specs.")
+            with os.fdopen(fd, "w") as snapshot:
+                snapshot.write(json.dumps(header) + "\n")
+                for spec in specs:
+                    snapshot.write(json.dumps(spec) + "\n")
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            os.replace(tmp_path, self.path(tag))
+            tmp_path = None
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            kblogging.log_event(self._log, "spec_snapshot_error", {"err": str(e), "tag": tag})
+            return False
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if lock_file is not None:
+                lock_file.close()
@@ -0,0 +1,126 @@
+"""
+A shared, content-addressed store for app specs.
+
+Most apps have the same spec under the release, beta, and dev tags. Instead of keeping a
+full copy of each spec per tag, the SpecStore keeps a single copy of each distinct spec,
+keyed on the app id and the git commit hash of its module (or a digest of its content, if
+there's no hash). Strings in stored specs are interned, so the many repeated keys and
+values (field types, widget names, etc.) are only kept once.
+"""
+import hashlib
+import json
+import sys
+import threading
+
+
+def intern_strings(obj):
+    """
+    Returns a copy of a JSON-like structure (dicts, lists, and scalars) where all strings -
+    both keys and values - are interned.
+    """
+    if isinstance(obj, str):
+        return sys.intern(obj)
+    if isinstance(obj, dict):
+        return {intern_strings(k): intern_strings(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [intern_strings(v) for v in obj]
+    return obj
+
+
+def deep_size(obj, seen=None):
+    """
+    Returns the approximate size in bytes of a JSON-like structure, including everything
+    it contains. Objects that are shared are only counted once.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += deep_size(k, seen) + deep_size(v, seen)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            size += deep_size(v, seen)
+    return size
+
+
+def spec_key(spec):
+    """
+    Returns the key that identifies the content of a spec. That's the app id and the git
+    commit hash of its module, or a digest of the whole spec if it doesn't have a hash.
+    """
+    info = spec.get('info', {})
+    commit_hash = info.get('git_commit_hash')
+    if commit_hash:
+        return "{}@{}".format(info.get('id'), commit_hash)
+    digest = hashlib.sha1(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+    return "sha1:{}".format(digest)
+
+
+class SpecStore(object):
+    """
+    Keeps one shared copy of each distinct app spec, with a count of how many places use it.
+    add() returns the shared copy of a spec, and release() gets called when a place stops
+    using it. Once nothing uses a spec, it's dropped.
+    """
+    def __init__(self):
+        # keys = spec_key, values = spec
+        self._specs = dict()
+        # keys = spec_key, values = number of users
+        self._refs = dict()
+        self._lock = threading.Lock()
+
+    def add(self, spec):
+        """
+        Adds a spec, and returns the shared copy of it. If the same spec is already stored,
+        that gets returned, otherwise it's a copy of spec with its strings interned.
+        """
+        key = spec_key(spec)
+        with self._lock:
+            if key not in self._specs:
+                self._specs[key] = intern_strings(spec)
+                self._refs[key] = 0
+            self._refs[key] += 1
+            return self._specs[key]
+
+    def release(self, spec):
+        """
+        Marks that one user of spec doesn't need it any more. Does nothing if it's not stored.
+        """
+        key = spec_key(spec)
+        with self._lock:
+            if key not in self._refs:
+                return
+            self._refs[key] -= 1
+            if self._refs[key] <= 0:
+                del self._refs[key]
+                del self._specs[key]
+
+    def clear(self):
+        with self._lock:
+            self._specs.clear()
+            self._refs.clear()
+
+    def memory_report(self):
+        """
+        Returns a dict describing what's stored:
+        {
+            "specs": int - number of distinct specs stored,
+            "references": int - number of places using them (e.g. tags),
+            "bytes": int - approximate memory used by the stored specs
+        }
+        """
+        with self._lock:
+            specs = list(self._specs.values())
+            references = sum(self._refs.values())
+        return {
+            "specs": len(specs),
+            "references": references,
+            "bytes": deep_size(specs)
+        }
+
+    def __len__(self):
+        return len(self._specs)
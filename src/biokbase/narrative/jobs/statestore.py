@@ -0,0 +1,202 @@
+"""
+A store for the states of finished jobs.
+
+Once a job reaches a terminal state, its state never changes, so there's no need to ask
+EE2 about it again - not even after the kernel restarts. The JobStateStore keeps those
+states in a SQLite file, and keeps the most recently used ones in memory.
+"""
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+from biokbase.narrative.common import kblogging
+
+# If set, this environment variable is the path to the job state cache file. If set to an
+# empty string, job states are only cached in memory.
+JOB_STATE_CACHE_ENV = "KB_JOB_STATE_CACHE"
+DEFAULT_JOB_STATE_CACHE = os.path.join(os.path.expanduser("~"), ".kbase", "job_state_cache.sqlite3")
+# Number of job states kept in memory.
+MEMORY_CACHE_SIZE = 1000
+# Number of job states kept on disk. Past that, the least recently used ones are dropped.
+DISK_CACHE_SIZE = 20000
+
+
+def default_store_path():
+    return os.environ.get(JOB_STATE_CACHE_ENV, DEFAULT_JOB_STATE_CACHE)
+
+
+class JobStateStore(object):
+    """
+    A dict-like cache of terminal job states, keyed on job id.
+    Supports "job_id in store", store[job_id], store[job_id] = state, and get().
+
+    Lookups check memory first, then the cache file. The file gets opened on first use, and
+    if it can't be opened or read, the store just works from memory.
+    """
+    _log = kblogging.get_logger(__name__)
+
+    def __init__(self, path=None, memory_size=MEMORY_CACHE_SIZE, disk_size=DISK_CACHE_SIZE):
+        """
+        path - the SQLite file to use. If None, this uses the KB_JOB_STATE_CACHE environment
+            variable, or ~/.kbase/job_state_cache.sqlite3 if that's not set. If it's an empty
+            string, nothing gets stored on disk.
+        """
+        if memory_size < 1:
+            raise ValueError("memory_size must be at least 1")
+        self._path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        # keys = job_id, values = job state
+        self._memory = OrderedDict()
+        # ids of all the job states that have been stored or read, even if they've since
+        # been dropped from memory
+        self._known = set()
+        self._db = None
+        self._db_opened = False
+        self._lock = threading.RLock()
+
+    @property
+    def path(self):
+        if self._path is None:
+            return default_store_path()
+        return self._path
+
+    def _connect(self):
+        """
+        Returns the open SQLite connection, or None if there's no cache file to use.
+        """
+        if self._db_opened:
+            return self._db
+        self._db_opened = True
+        path = self.path
+        if not path:
+            return None
+        try:
+            dir_name = os.path.dirname(path)
+            if dir_name:
+                os.makedirs(dir_name, exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute("CREATE TABLE IF NOT EXISTS job_states "
+                       "(job_id TEXT PRIMARY KEY, state TEXT NOT NULL, used REAL NOT NULL)")
+            db.commit()
+            self._db = db
+        except (OSError, sqlite3.Error) as e:
+            kblogging.log_event(self._log, "job_state_store_error", {"err": str(e), "path": path})
+            self._db = None
+        return self._db
+
+    def _remember(self, job_id, state):
+        self._known.add(job_id)
+        self._memory[job_id] = state
+        self._memory.move_to_end(job_id)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, job_id, default=None):
+        with self._lock:
+            if job_id in self._memory:
+                self._memory.move_to_end(job_id)
+                return self._memory[job_id]
+            db = self._connect()
+            if db is None:
+                return default
+            try:
+                row = db.execute("SELECT state FROM job_states WHERE job_id = ?",
+                                 (job_id,)).fetchone()
+                if row is None:
+                    return default
+                state = json.loads(row[0])
+                db.execute("UPDATE job_states SET used = ? WHERE job_id = ?",
+                           (time.time(), job_id))
+                db.commit()
+            except (sqlite3.Error, ValueError) as e:
+                kblogging.log_event(self._log, "job_state_store_error", {"err": str(e)})
+                return default
+            self._remember(job_id, state)
+            return state
+
+    def put(self, job_id, state):
+        with self._lock:
+            self._remember(job_id, state)
+            db = self._connect()
+            if db is None:
+                return
+            try:
+                db.execute("INSERT OR REPLACE INTO job_states (job_id, state, used) "
+                           "VALUES (?, ?, ?)", (job_id, json.dumps(state), time.time()))
+                db.execute("DELETE FROM job_states WHERE job_id NOT IN "
+                           "(SELECT job_id FROM job_states ORDER BY used DESC LIMIT ?)",
+                           (self.disk_size,))
+                db.commit()
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                kblogging.log_event(self._log, "job_state_store_error", {"err": str(e)})
+
+    def remove(self, job_id):
+        """
+        Removes a single job state. Does nothing if it's not there.
+        """
+        with self._lock:
+            self._memory.pop(job_id, None)
+            self._known.discard(job_id)
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM job_states WHERE job_id = ?", (job_id,))
+                db.commit()
+
+    def clear(self):
+        """
+        Removes all job states, both in memory and on disk.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._known.clear()
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM job_states")
+                db.commit()
+
+    def close(self):
+        """
+        Closes the cache file. It gets opened again on the next use.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+            self._db = None
+            self._db_opened = False
+
+    def in_memory(self, job_id):
+        """
+        Returns True if the job's state is kept in memory. This never touches the cache file,
+        so it's cheap enough to check often.
+        """
+        with self._lock:
+            return job_id in self._memory
+
+    def is_known(self, job_id):
+        """
+        Returns True if the job's state has been stored or read by this store, even if it's
+        no longer kept in memory. Like in_memory, this never touches the cache file.
+        """
+        with self._lock:
+            return job_id in self._known
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+    def __getitem__(self, job_id):
+        state = self.get(job_id)
+        if state is None:
+            raise KeyError(job_id)
+        return state
+
+    def __setitem__(self, job_id, state):
+        self.put(job_id, state)
+
+    def __len__(self):
+        """
+        The number of job states kept in memory.
+        """
+        return len(self._memory)
@@ -26,3 +26,34 @@ def sanitize_all_states(states):
     for job_id in states.get('job_states', {}):
         states['job_states'][job_id] = sanitize_state(states['job_states'][job_id])
     return states
+
+
+def _escape_path_part(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def diff_states(old, new, path=""):
+    """
+    Returns the list of changes that turn old into new, as JSON Patch (RFC 6902) style
+    operations:
+    {"op": "add" | "replace", "path": "/state/status", "value": "running"}
+    {"op": "remove", "path": "/state/errormsg"}
+    Dicts are compared key by key, and anything else (including lists) that differs is
+    replaced whole. If old is None, the whole of new is given as a replacement of the root
+    path "". If nothing differs, this returns an empty list.
+    """
+    if old == new:
+        return []
+    if old is None or not isinstance(old, dict) or not isinstance(new, dict):
+        return [{"op": "replace", "path": path, "value": new}]
+    ops = list()
+    for key in old:
+        if key not in new:
+            ops.append({"op": "remove", "path": path + "/" + _escape_path_part(key)})
+    for key, value in new.items():
+        key_path = path + "/" + _escape_path_part(key)
+        if key not in old:
+            ops.append({"op": "add", "path": key_path, "value": value})
+        else:
+            ops += diff_states(old[key], value, key_path)
+    return ops
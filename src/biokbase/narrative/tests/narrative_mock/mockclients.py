@@ -1,5 +1,22 @@
 from ..util import TestConfig
 from biokbase.workspace.baseclient import ServerError
+from copy import deepcopy
+
+
+def exclude_job_fields(info, fields):
+    """
+    Returns a copy of an EE2 job state without the given fields. Like EE2, a field can be
+    a dotted path into the state, like "job_input.params".
+    """
+    info = deepcopy(info)
+    for field in fields or []:
+        path = field.split('.')
+        target = info
+        for key in path[:-1]:
+            target = target.get(key, {}) if isinstance(target, dict) else {}
+        if isinstance(target, dict):
+            target.pop(path[-1], None)
+    return info
 
 
 class MockClients:
@@ -47,13 +64,26 @@ class MockClients:
         return "bar"
 
     def check_workspace_jobs(self, params):
-        return self.ee2_job_info
+        return {job_id: exclude_job_fields(info, params.get('exclude_fields'))
+                for (job_id, info) in self.ee2_job_info.items()}
 
     # ----- Narrative Method Store functions ------
 
     def list_methods_spec(self, params):
         return self.config.load_json_file(self.config.get('specs', 'app_specs_file'))
 
+    def list_methods(self, params):
+        specs = self.config.load_json_file(self.config.get('specs', 'app_specs_file'))
+        return [spec['info'] for spec in specs]
+
+    def list_method_ids_and_names(self, params):
+        specs = self.config.load_json_file(self.config.get('specs', 'app_specs_file'))
+        return {spec['info']['id']: spec['info']['name'] for spec in specs}
+
+    def get_method_spec(self, params):
+        specs = self.config.load_json_file(self.config.get('specs', 'app_specs_file'))
+        return [spec for spec in specs if spec['info']['id'] in params['ids']]
+
     def list_categories(self, params):
         return self.config.load_json_file(self.config.get('specs', 'type_specs_file'))
 
@@ -93,57 +123,46 @@ class MockClients:
         But we introspect the params a little bit to return something crafted to the test.
         Add more to this if it's helpful.
         """
-        random_obj_info = [5, 'Sbicolor2', 'KBaseGenomes.Genome-12.3', '2017-03-31T23:42:59+0000', 1,
-            'wjriehl', 18836, 'wjriehl:1490995018528', '278abf8f0dbf8ab5ce349598a8674a6e', 109180038, None]
-
-        obj_info = random_obj_info
-        infos = []
-        for obj_ident in params.get('objects', [{'name': 'Sbicolor2', 'workspace': 'whatever'}]):
-            if obj_ident.get('name') == 'rhodobacterium.art.q20.int.PE.reads':
-                infos.append([7,
-                    'rhodobacterium.art.q20.int.PE.reads',
-                    'KBaseFile.PairedEndLibrary-2.1',
-                    '2018-06-26T19:31:41+0000',
-                    1,
-                    'wjriehl',
-                    12345,
-                    'random_workspace',
-                    'a20f2df66f973de41b84164f2c2bedd3',
-                    765,
-                    None])
-            elif obj_ident.get('name') == 'rhodobacterium.art.q10.PE.reads':
-                infos.append([8,
-                    'rhodobacterium.art.q10.PE.reads',
-                    'KBaseFile.PairedEndLibrary-2.1',
-                    '2018-08-13T23:13:09+0000',
-                    1,
-                    'wjriehl',
-                    12345,
-                    'random_workspace',
-                    '9f014a3c08368537a40fa2e4b90f9cab',
-                    757,
-                    None])
-            else:
-                infos.append(random_obj_info)
-        return infos
-
-        infos = [[5, 'Sbicolor2', 'KBaseGenomes.Genome-12.3', '2017-03-31T23:42:59+0000', 1,
-                  'wjriehl', 18836, 'wjriehl:1490995018528', '278abf8f0dbf8ab5ce349598a8674a6e',
-                  109180038, None]]
-        ret_val = infos * len(params.get('objects', [0]))
-        return ret_val
+        return [self._object_info(obj_ident) for obj_ident in
+                params.get('objects', [{'name': 'Sbicolor2', 'workspace': 'whatever'}])]
 
     def get_object_info3(self, params):
-        infos = [[5, 'Sbicolor2', 'KBaseGenomes.Genome-12.3', '2017-03-31T23:42:59+0000', 1,
-                  'wjriehl', 18836, 'wjriehl:1490995018528', '278abf8f0dbf8ab5ce349598a8674a6e',
-                  109180038, None]]
-        paths = [['18836/5/1']]
-        num_objects = len(params.get('objects', [0]))
+        infos = [self._object_info(obj_ident) for obj_ident in params.get('objects', [{}])]
+        paths = [["{}/{}/{}".format(info[6], info[0], info[4])] for info in infos]
         return {
-            'infos': infos * num_objects,
-            'paths': paths * num_objects
+            'infos': infos,
+            'paths': paths
         }
 
+    def _object_info(self, obj_ident):
+        if obj_ident.get('name') == 'rhodobacterium.art.q20.int.PE.reads':
+            return [7,
+                'rhodobacterium.art.q20.int.PE.reads',
+                'KBaseFile.PairedEndLibrary-2.1',
+                '2018-06-26T19:31:41+0000',
+                1,
+                'wjriehl',
+                12345,
+                'random_workspace',
+                'a20f2df66f973de41b84164f2c2bedd3',
+                765,
+                None]
+        elif obj_ident.get('name') == 'rhodobacterium.art.q10.PE.reads':
+            return [8,
+                'rhodobacterium.art.q10.PE.reads',
+                'KBaseFile.PairedEndLibrary-2.1',
+                '2018-08-13T23:13:09+0000',
+                1,
+                'wjriehl',
+                12345,
+                'random_workspace',
+                '9f014a3c08368537a40fa2e4b90f9cab',
+                757,
+                None]
+        return [5, 'Sbicolor2', 'KBaseGenomes.Genome-12.3', '2017-03-31T23:42:59+0000', 1,
+                'wjriehl', 18836, 'wjriehl:1490995018528', '278abf8f0dbf8ab5ce349598a8674a6e',
+                109180038, None]
+
     # ----- Narrative Job Service functions -----
 
     def run_job(self, params):
@@ -166,12 +185,8 @@ class MockClients:
         job_id = params.get('job_id')
         if not job_id:
             return {}
-        info = self.ee2_job_info.get(job_id, {})
-        if "exclude_fields" in params:
-            for f in params["exclude_fields"]:
-                if f in info:
-                    del info[f]
-        return info
+        return exclude_job_fields(self.ee2_job_info.get(job_id, {}),
+                                  params.get('exclude_fields'))
 
     def check_jobs(self, params):
         job_ids = params.get('job_ids')
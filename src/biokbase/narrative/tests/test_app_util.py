@@ -8,9 +8,21 @@ from biokbase.narrative.app_util import (
     system_variable,
     get_result_sub_path,
     map_inputs_from_job,
-    map_outputs_from_state
+    map_outputs_from_state,
+    collect_object_values,
+    resolve_object_infos,
+    validate_parameters,
+    resolve_ref,
+    get_object_info,
+    lookup_objects,
+    invalidate_object_info,
+    object_info_cache_stats,
+    clear_system_variable_cache,
+    compile_app_params,
+    params_index,
+    AppParams
 )
-from .narrative_mock.mockclients import get_mock_client
+from .narrative_mock.mockclients import get_mock_client, MockClients
 import os
 import mock
 from . import util
@@ -24,6 +36,41 @@ class DummyWorkspace():
         return [12345]
 
 
+class CountingMockClients(MockClients):
+    """
+    Counts the calls made to each object info function.
+    """
+    calls = {'get_object_info3': 0, 'get_object_info_new': 0, 'get_workspace_info': 0}
+
+    def get_workspace_info(self, params):
+        CountingMockClients.calls['get_workspace_info'] += 1
+        return super().get_workspace_info(params)
+
+    def get_object_info3(self, params):
+        CountingMockClients.calls['get_object_info3'] += 1
+        return super().get_object_info3(params)
+
+    def get_object_info_new(self, params):
+        CountingMockClients.calls['get_object_info_new'] += 1
+        return super().get_object_info_new(params)
+
+
+def get_counting_mock_client(client_name, token=None):
+    return CountingMockClients(token=token)
+
+
+def _obj_param(param_id, allow_multiple=False, is_output=False):
+    return {
+        'id': param_id,
+        'optional': True,
+        'default': None,
+        'type': 'text',
+        'allow_multiple': allow_multiple,
+        'allowed_types': ['KBaseGenomes.Genome', 'KBaseFile.PairedEndLibrary'],
+        'is_output': is_output
+    }
+
+
 class AppUtilTestCase(unittest.TestCase):
     @classmethod
     def setUpClass(self):
@@ -39,6 +86,10 @@ class AppUtilTestCase(unittest.TestCase):
         self.bad_fake_token = "NotAGoodTokenLOL"
         self.workspace = "valid_workspace"
 
+    def setUp(self):
+        invalidate_object_info()
+        clear_system_variable_cache()
+
     def test_check_tag_good(self):
         self.assertTrue(check_tag(self.good_tag))
 
@@ -78,6 +129,36 @@ class AppUtilTestCase(unittest.TestCase):
         os.environ['KB_WORKSPACE_ID'] = 'invalid_workspace'
         self.assertIsNone(system_variable('workspace_id'))
 
+    @mock.patch('biokbase.narrative.app_util.clients.get', get_counting_mock_client)
+    def test_sys_var_workspace_id_memoized(self):
+        CountingMockClients.calls['get_workspace_info'] = 0
+        os.environ['KB_WORKSPACE_ID'] = self.workspace
+        self.assertEqual(system_variable('workspace_id'), 12345)
+        self.assertEqual(system_variable('workspace_id'), 12345)
+        self.assertEqual(CountingMockClients.calls['get_workspace_info'], 1)
+        # a new session looks it up again
+        old_env = dict(os.environ)
+        biokbase.auth.init_session_env({'token': os.environ.get('KB_AUTH_TOKEN')}, '127.0.0.1')
+        os.environ.clear()
+        os.environ.update(old_env)
+        self.assertEqual(system_variable('workspace_id'), 12345)
+        self.assertEqual(CountingMockClients.calls['get_workspace_info'], 2)
+
+    @mock.patch('biokbase.narrative.app_util.biokbase.auth.get_user_info')
+    def test_sys_var_user_memoized(self, mock_user_info):
+        old_token = os.environ.get('KB_AUTH_TOKEN')
+        mock_user_info.return_value = {'user': 'some_user'}
+        biokbase.auth.set_environ_token('some_token')
+        self.assertEqual(system_variable('user_id'), 'some_user')
+        self.assertEqual(system_variable('user_id'), 'some_user')
+        self.assertEqual(mock_user_info.call_count, 1)
+        # a different token is a different user
+        mock_user_info.return_value = {'user': 'other_user'}
+        biokbase.auth.set_environ_token('other_token')
+        self.assertEqual(system_variable('user_id'), 'other_user')
+        self.assertEqual(mock_user_info.call_count, 2)
+        biokbase.auth.set_environ_token(old_token)
+
     def test_sys_var_user_bad(self):
         biokbase.auth.set_environ_token(self.bad_fake_token)
         self.assertIsNone(system_variable('user_id'))
@@ -264,6 +345,158 @@ class AppUtilTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             map_outputs_from_state(state, params, app_spec)
 
+    def test_collect_object_values(self):
+        spec_params = [
+            _obj_param('reads'),
+            _obj_param('genomes', allow_multiple=True),
+            _obj_param('output', is_output=True),
+            {'id': 'a_number', 'type': 'int', 'allow_multiple': False, 'is_output': False},
+            {'id': 'group', 'type': 'group', 'parameter_ids': ['reads']}
+        ]
+        param_sets = [{
+            'reads': 'reads1',
+            'genomes': ['genome1', '1/2/3'],
+            'output': 'an_output',
+            'a_number': 5
+        }, {
+            'reads': 'reads1',
+            'group': [{'reads': 'reads2'}, {'reads': 'reads3'}]
+        }]
+        self.assertEqual(collect_object_values(spec_params, param_sets),
+                         ['reads1', 'genome1', '1/2/3', 'reads1', 'reads2', 'reads3'])
+
+    def test_compile_app_params(self):
+        def raw_param(p_id, optional=0, text_options=None):
+            return {'id': p_id, 'optional': optional, 'short_hint': '', 'description': '',
+                    'field_type': 'text', 'allow_multiple': 0, 'default_values': [''],
+                    'text_options': text_options or {}}
+        spec = {
+            'parameters': [
+                raw_param('output', text_options={'is_output_name': 1}),
+                raw_param('extra', optional=1),
+                raw_param('reads', text_options={'valid_ws_types': ['KBaseFile.\\w+Reads']}),
+                raw_param('in_group', optional=1)
+            ],
+            'parameter_groups': [{'id': 'group', 'parameter_ids': ['in_group'], 'optional': 1}]
+        }
+        params = compile_app_params(spec)
+        self.assertIsInstance(params, AppParams)
+        # required first, then outputs, then the optional ones
+        self.assertEqual([p['id'] for p in params], ['reads', 'output', 'extra', 'in_group', 'group'])
+        self.assertEqual(set(params.by_id.keys()), {'reads', 'output', 'extra', 'in_group', 'group'})
+        self.assertIs(params_index(params), params.by_id)
+        self.assertEqual(params_index(list(params)), params.by_id)
+        self.assertEqual(params.group_of, {'in_group': 'group'})
+        self.assertEqual(params.output_ids, ['output'])
+        self.assertEqual(list(params.type_patterns.keys()), ['reads'])
+        self.assertTrue(params.type_patterns['reads'][0].match('KBaseFile.PairedEndLibraryReads'))
+        self.assertFalse(params.type_patterns['reads'][0].match('KBaseGenomes.Genome'))
+
+        # group params don't get used to transform outputs
+        app_spec = dict(spec, behavior={'output_mapping': [
+            {'input_parameter': 'group', 'target_property': 'group'}
+        ]})
+        self.assertEqual(map_outputs_from_state({}, {'group': {'in_group': 'x'}}, app_spec,
+                                                spec_params=params),
+                         map_outputs_from_state({}, {'group': {'in_group': 'x'}}, app_spec))
+
+    @mock.patch('biokbase.narrative.app_util.clients.get', get_counting_mock_client)
+    def test_resolve_object_infos(self):
+        CountingMockClients.calls['get_object_info3'] = 0
+        values = ['rhodobacterium.art.q20.int.PE.reads', self.workspace + '/rhodobacterium.art.q20.int.PE.reads',
+                  '1/2/3', '1/2/3/4', '', 5]
+        infos = resolve_object_infos(self.workspace, values)
+        self.assertEqual(CountingMockClients.calls['get_object_info3'], 1)
+        # name and ws/name are the same object, and the bad ref is left out
+        self.assertEqual(set(infos.keys()), {self.workspace + '/rhodobacterium.art.q20.int.PE.reads', '1/2/3'})
+        self.assertEqual(infos['1/2/3'][0], 5)
+        self.assertEqual(infos[self.workspace + '/rhodobacterium.art.q20.int.PE.reads'][0], 7)
+
+    @mock.patch('biokbase.narrative.app_util.clients.get', get_counting_mock_client)
+    def test_resolve_object_infos_empty(self):
+        CountingMockClients.calls['get_object_info3'] = 0
+        self.assertEqual(resolve_object_infos(self.workspace, []), {})
+        self.assertEqual(CountingMockClients.calls['get_object_info3'], 0)
+
+    @mock.patch('biokbase.narrative.app_util.clients.get', get_counting_mock_client)
+    def test_validate_parameters_bulk_lookup(self):
+        os.environ['KB_WORKSPACE_ID'] = self.workspace
+        CountingMockClients.calls['get_object_info3'] = 0
+        CountingMockClients.calls['get_object_info_new'] = 0
+        spec_params = [_obj_param('reads'), _obj_param('more_reads', allow_multiple=True)]
+        params = {
+            'reads': 'rhodobacterium.art.q20.int.PE.reads',
+            'more_reads': ['rhodobacterium.art.q10.PE.reads', 'rhodobacterium.art.q20.int.PE.reads']
+        }
+        (params, ws_refs) = validate_parameters('an_app', 'release', spec_params, params)
+        self.assertEqual(ws_refs, ['12345/7/1', '12345/8/1', '12345/7/1'])
+        self.assertEqual(CountingMockClients.calls['get_object_info3'], 1)
+        self.assertEqual(CountingMockClients.calls['get_object_info_new'], 0)
+
+    @mock.patch('biokbase.narrative.app_util.clients.get', get_counting_mock_client)
+    def test_resolve_ref_with_infos(self):
+        CountingMockClients.calls['get_object_info_new'] = 0
+        infos = resolve_object_infos(self.workspace, ['rhodobacterium.art.q10.PE.reads'])
+        self.assertEqual(resolve_ref(self.workspace, 'rhodobacterium.art.q10.PE.reads', ws_infos=infos),
+                         '12345/8/1')
+        self.assertEqual(CountingMockClients.calls['get_object_info_new'], 0)
+        # not in the infos, so it gets looked up on its own
+        self.assertEqual(resolve_ref(self.workspace, ['rhodobacterium.art.q20.int.PE.reads'], ws_infos=infos),
+                         ['12345/7/1'])
+        self.assertEqual(CountingMockClients.calls['get_object_info_new'], 1)
+
+    @mock.patch('biokbase.narrative.app_util.clients.get', get_counting_mock_client)
+    def test_object_info_cache(self):
+        CountingMockClients.calls['get_object_info3'] = 0
+        CountingMockClients.calls['get_object_info_new'] = 0
+        object_info_cache_stats(reset_counts=True)
+        name = 'rhodobacterium.art.q10.PE.reads'
+        found = lookup_objects(self.workspace, [name, '1/2/3'])
+        self.assertEqual(found[self.workspace + '/' + name][1], ['12345/8/1'])
+        self.assertEqual(found['1/2/3'][1], ['18836/5/1'])
+        # all cached now
+        self.assertEqual(lookup_objects(self.workspace, [name, '1/2/3']), found)
+        self.assertEqual(get_object_info(self.workspace, name)[0], 8)
+        self.assertEqual(resolve_ref(self.workspace, '1/2/3'), '18836/5/1')
+        self.assertEqual(CountingMockClients.calls['get_object_info3'], 1)
+        self.assertEqual(CountingMockClients.calls['get_object_info_new'], 0)
+        stats = object_info_cache_stats()
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hits'], 4)
+
+    @mock.patch('biokbase.narrative.app_util.clients.get', get_counting_mock_client)
+    def test_object_info_cache_single_lookup(self):
+        CountingMockClients.calls['get_object_info_new'] = 0
+        name = 'rhodobacterium.art.q20.int.PE.reads'
+        self.assertEqual(get_object_info(self.workspace, name)[0], 7)
+        self.assertEqual(get_object_info(self.workspace, name)[0], 7)
+        self.assertEqual(CountingMockClients.calls['get_object_info_new'], 1)
+
+    @mock.patch('biokbase.narrative.app_util.clients.get', get_counting_mock_client)
+    def test_object_info_cache_unversioned(self):
+        CountingMockClients.calls['get_object_info3'] = 0
+        name = 'rhodobacterium.art.q10.PE.reads'
+        with mock.patch('biokbase.narrative.app_util._object_name_cache.ttl', 0):
+            lookup_objects(self.workspace, [name, '1/2/3'])
+            # the name can point to a new version now, so it's looked up again
+            found = lookup_objects(self.workspace, [name, '1/2/3'])
+        self.assertEqual(found[self.workspace + '/' + name][1], ['12345/8/1'])
+        self.assertEqual(CountingMockClients.calls['get_object_info3'], 2)
+        self.assertEqual(lookup_objects(self.workspace, ['1/2/3'])['1/2/3'][1], ['18836/5/1'])
+        self.assertEqual(CountingMockClients.calls['get_object_info3'], 2)
+
+    @mock.patch('biokbase.narrative.app_util.clients.get', get_counting_mock_client)
+    def test_invalidate_object_info(self):
+        CountingMockClients.calls['get_object_info3'] = 0
+        lookup_objects(self.workspace, ['some_object', 'other_ws/other_object'])
+        self.assertEqual(object_info_cache_stats()['size'], 2)
+        invalidate_object_info(self.workspace)
+        self.assertEqual(object_info_cache_stats()['size'], 1)
+        lookup_objects(self.workspace, ['some_object', 'other_ws/other_object'])
+        self.assertEqual(CountingMockClients.calls['get_object_info3'], 2)
+        invalidate_object_info()
+        self.assertEqual(object_info_cache_stats()['size'], 0)
+
 
 if __name__ == '__main__':
     unittest.main()
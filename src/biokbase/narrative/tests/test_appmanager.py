@@ -55,6 +55,13 @@ class AppManagerTestCase(unittest.TestCase):
         info = self.am.app_usage(self.good_app_id, self.good_tag)
         self.assertTrue(info)
 
+    @mock.patch('biokbase.narrative.jobs.specmanager.clients.get', get_mock_client)
+    def test_reload_incremental(self):
+        with mock.patch.object(self.am.spec_manager, 'reload') as reload:
+            self.am.reload(incremental=True)
+            reload.assert_not_called()
+        self.assertTrue(self.am.spec_manager.check_app(self.good_app_id, self.good_tag))
+
     def test_app_usage(self):
         # good id and good tag
         usage = self.am.app_usage(self.good_app_id, self.good_tag)
@@ -0,0 +1,68 @@
+import unittest
+import time
+from biokbase.narrative.common.cache import TTLCache
+
+
+class TTLCacheTestCase(unittest.TestCase):
+    def test_get_put(self):
+        cache = TTLCache(maxsize=5, ttl=60)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('a', 'nope'), 'nope')
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_bad_maxsize(self):
+        with self.assertRaises(ValueError):
+            TTLCache(maxsize=0)
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # touch a, so b is the least recently used
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expiration(self):
+        cache = TTLCache(maxsize=2, ttl=0.05)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = TTLCache()
+        cache.put('ws1/a', 1)
+        cache.put('ws1/b', 2)
+        cache.put('ws2/a', 3)
+        cache.invalidate('ws1/a')
+        cache.invalidate('not_there')
+        self.assertIsNone(cache.get('ws1/a'))
+        cache.invalidate_matching(lambda k: k.startswith('ws1/'))
+        self.assertIsNone(cache.get('ws1/b'))
+        self.assertEqual(cache.get('ws2/a'), 3)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_stats(self):
+        cache = TTLCache()
+        self.assertEqual(cache.stats()['hit_rate'], 0.0)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        stats = cache.stats(reset_counts=True)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(cache.stats()['hits'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import os
+import biokbase.narrative.clients as clients
+import biokbase.auth
+from biokbase.workspace.client import Workspace
+from biokbase.execution_engine2.execution_engine2Client import execution_engine2
+
+
+class ClientsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.old_token = os.environ.get('KB_AUTH_TOKEN')
+        clients.reset()
+        clients.cache_stats(reset_counts=True)
+
+    def tearDown(self):
+        biokbase.auth.set_environ_token(self.old_token)
+
+    def test_get_unknown(self):
+        with self.assertRaises(ValueError):
+            clients.get('not_a_client')
+
+    def test_get_reuses_client(self):
+        ws1 = clients.get('workspace', token='token1')
+        ws2 = clients.get('workspace', token='token1')
+        self.assertIsInstance(ws1, Workspace)
+        self.assertIs(ws1, ws2)
+        self.assertEqual(clients.cache_stats(), {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_get_different_tokens(self):
+        ws1 = clients.get('workspace', token='token1')
+        ws2 = clients.get('workspace', token='token2')
+        self.assertIsNot(ws1, ws2)
+        self.assertEqual(ws2._client._headers['AUTHORIZATION'], 'token2')
+
+    def test_get_aliases(self):
+        ee2 = clients.get('execution_engine2', token='token1')
+        self.assertIsInstance(ee2, execution_engine2)
+        self.assertIs(ee2, clients.get('job_service', token='token1'))
+        self.assertIs(ee2, clients.get('execution_engine', token='token1'))
+
+    def test_token_change_invalidates(self):
+        biokbase.auth.set_environ_token('token1')
+        ws1 = clients.get('workspace')
+        self.assertIs(ws1, clients.get('workspace'))
+        biokbase.auth.set_environ_token('token2')
+        self.assertEqual(clients.cache_stats()['size'], 0)
+        ws2 = clients.get('workspace')
+        self.assertIsNot(ws1, ws2)
+        self.assertEqual(ws2._client._headers['AUTHORIZATION'], 'token2')
+
+    def test_reset(self):
+        ws1 = clients.get('workspace', token='token1')
+        clients.reset()
+        self.assertIsNot(ws1, clients.get('workspace', token='token1'))
+
+    def test_cache_stats_reset(self):
+        clients.get('catalog', token='token1')
+        clients.get('catalog', token='token1')
+        stats = clients.cache_stats(reset_counts=True)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(clients.cache_stats(), {'hits': 0, 'misses': 0, 'size': 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
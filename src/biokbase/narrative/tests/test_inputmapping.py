@@ -0,0 +1,89 @@
+import unittest
+import mock
+from biokbase.narrative.jobs.inputmapping import (
+    InputMappingPlan,
+    split_target_property,
+    generate_input
+)
+
+
+def _param(p_id, p_type='text'):
+    return {'id': p_id, 'type': p_type, 'is_output': False, 'allow_multiple': False}
+
+
+class InputMappingPlanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.spec_params = {
+            'name': _param('name'),
+            'count': _param('count', 'int'),
+            'label': _param('label'),
+            'group': {'id': 'group', 'type': 'group', 'parameter_ids': ['label'],
+                      'id_mapping': {'label': 'the_label'}}
+        }
+        self.mapping = [
+            {'input_parameter': 'name', 'target_argument_position': 1,
+             'target_property': 'output/object\\/name'},
+            {'narrative_system_variable': 'workspace', 'target_property': 'ws',
+             'target_argument_position': 1},
+            {'input_parameter': 'count', 'target_property': 'count',
+             'target_argument_position': 1, 'target_type_transform': 'int'},
+            {'constant_value': 'a constant', 'target_argument_position': 0},
+            {'generated_value': {'prefix': 'gen_'}, 'target_property': 'generated',
+             'target_argument_position': 1},
+            {'input_parameter': 'group', 'target_property': 'groups',
+             'target_argument_position': 1}
+        ]
+
+    def test_split_target_property(self):
+        self.assertIsNone(split_target_property('simple'))
+        self.assertEqual(split_target_property('a/b/c'), ('a', 'b', 'c'))
+        self.assertEqual(split_target_property('a\\/b/c'), ('a/b', 'c'))
+        self.assertEqual(split_target_property('a\\\\/b'), ('a\\', 'b'))
+
+    @mock.patch('biokbase.narrative.jobs.inputmapping.system_variable', return_value='my_ws')
+    def test_apply_all(self, sys_var):
+        plan = InputMappingPlan(self.mapping, self.spec_params,
+                                generate=lambda g: g['prefix'] + 'X')
+        param_sets = [
+            {'name': 'obj1', 'count': '5', 'group': [{'label': 'a'}, {'label': None}]},
+            {'name': '', 'count': 7}
+        ]
+        inputs = plan.apply_all(param_sets)
+        self.assertEqual(inputs, [
+            ['a constant', {
+                'output': {'object/name': 'obj1'},
+                'ws': 'my_ws',
+                'count': 5,
+                'generated': 'gen_X',
+                'groups': [{'the_label': 'a'}, {'the_label': None}]
+            }],
+            ['a constant', {
+                'output': {'object/name': None},
+                'ws': 'my_ws',
+                'count': 7,
+                'generated': 'gen_X',
+                'groups': None
+            }]
+        ])
+        # system variables get looked up once per batch
+        sys_var.assert_called_once_with('workspace')
+        self.assertEqual(plan.apply(param_sets[0]), inputs[0])
+
+    def test_bad_group_mapping(self):
+        del self.spec_params['label']
+        plan = InputMappingPlan([{'input_parameter': 'group', 'target_argument_position': 0}],
+                                self.spec_params)
+        # only fails when there's a value to map
+        self.assertEqual(plan.apply({}), [None])
+        with self.assertRaisesRegex(ValueError, "Unknown parameter id in group mapping: label"):
+            plan.apply({'group': {'label': 'a'}})
+
+    def test_generate_input(self):
+        value = generate_input({'prefix': 'pre_', 'symbols': 4, 'suffix': '_post'})
+        self.assertRegex(value, '^pre_[A-Z]{4}_post$')
+        with self.assertRaises(ValueError):
+            generate_input({'symbols': 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
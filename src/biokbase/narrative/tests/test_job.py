@@ -1,11 +1,13 @@
 import unittest
 import mock
-from biokbase.narrative.jobs.job import Job
+from biokbase.narrative.jobs.job import Job, JobLogBuffer
 from .util import TestConfig
-from .narrative_mock.mockclients import get_mock_client
+from .narrative_mock.mockclients import get_mock_client, MockClients
 from contextlib import contextmanager
 from io import StringIO
 import sys
+import threading
+import time
 
 
 @contextmanager
@@ -178,6 +180,97 @@ class JobTest(unittest.TestCase):
         self.assertEqual(logs[0], total_lines)
         self.assertEqual(len(logs[1]), 0)
 
+    @mock.patch("biokbase.narrative.jobs.job.clients.get", get_mock_client)
+    def test_log_latest_only(self):
+        job = self._mocked_job()
+        (total, lines) = job.log(num_lines=10, latest_only=True)
+        self.assertEqual(total, 100)
+        self.assertEqual([line["line"] for line in lines],
+                         ["This is line {}".format(i) for i in range(90, 100)])
+        (total, lines) = job.log(first_line=5, num_lines=500, latest_only=True)
+        self.assertEqual(len(lines), 100)
+        self.assertIn("line 0", lines[0]["line"])
+
+    @mock.patch("biokbase.narrative.jobs.job.clients.get", get_mock_client)
+    def test_log_per_job(self):
+        job1 = self._mocked_job()
+        job2 = self._mocked_job()
+        job1.log()
+        self.assertEqual(len(job1._job_logs), 100)
+        self.assertIsNone(job2._job_logs)
+
+    def test_log_dropped_lines(self):
+        job = self._mocked_job()
+        job._job_logs = JobLogBuffer(max_lines=20)
+        calls = list()
+        mock_client = MockClients()
+
+        def get_job_logs(params):
+            calls.append(params)
+            return MockClients.get_job_logs(mock_client, params)
+        mock_client.get_job_logs = get_job_logs
+        with mock.patch("biokbase.narrative.jobs.job.clients.get", return_value=mock_client):
+            (total, lines) = job.log(first_line=90, num_lines=5)
+            self.assertEqual(total, 100)
+            self.assertEqual(job._job_logs.first_line, 80)
+            self.assertEqual(len(calls), 1)
+            self.assertIn("line 90", lines[0]["line"])
+
+            # old lines get fetched again, just the range that's needed
+            (total, lines) = job.log(first_line=10, num_lines=5)
+            self.assertEqual(calls[-1], {"job_id": job.job_id, "skip_lines": 10, "limit": 5})
+            self.assertEqual([line["line"] for line in lines],
+                             ["This is line {}".format(i) for i in range(10, 15)])
+
+            # once the job's finished and its log is fetched, there's no need to look again
+            job._last_state = {"status": "completed"}
+            job.log(first_line=90)
+            num_calls = len(calls)
+            job.log(first_line=90)
+            self.assertEqual(len(calls), num_calls)
+
+    def test_log_concurrent(self):
+        job = self._mocked_job()
+        mock_client = MockClients()
+
+        def get_job_logs(params):
+            # make sure both threads are fetching at once, if they can
+            time.sleep(0.1)
+            return MockClients.get_job_logs(mock_client, params)
+        mock_client.get_job_logs = get_job_logs
+        with mock.patch("biokbase.narrative.jobs.job.clients.get", return_value=mock_client):
+            threads = [threading.Thread(target=job.log) for _ in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            (total, lines) = job.log()
+        self.assertEqual(total, 100)
+        self.assertEqual([line["line"] for line in lines],
+                         ["This is line {}".format(i) for i in range(100)])
+
+    def test_log_buffer(self):
+        buf = JobLogBuffer(max_lines=8)
+        buf.append(list(range(5)))
+        self.assertEqual(len(buf), 5)
+        self.assertEqual(buf.get(1, 2), [1, 2])
+        buf.append(list(range(5, 20)))
+        self.assertEqual(len(buf), 20)
+        self.assertFalse(buf.has_lines(0))
+        self.assertTrue(buf.has_lines(buf.first_line))
+        self.assertEqual(buf.get(15, 10), [15, 16, 17, 18, 19])
+        with self.assertRaises(ValueError):
+            JobLogBuffer(max_lines=0)
+
+    @mock.patch("biokbase.narrative.jobs.job.clients.get", get_mock_client)
+    def test_job_from_state_lazy_inputs(self):
+        job = Job.from_state(self.job_id, {"service_ver": self.app_version}, self.owner,
+                             self.app_id, tag=self.app_tag)
+        self.assertIsNone(job.inputs)
+        self.assertFalse(hasattr(job, "__dict__"))
+        self.assertIsNotNone(job.parameters())
+        self.assertEqual(job.inputs, job.parameters())
+
     @mock.patch("biokbase.narrative.jobs.job.clients.get", get_mock_client)
     def test_parameters(self):
         job = self._mocked_job()
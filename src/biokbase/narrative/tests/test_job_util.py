@@ -1,4 +1,5 @@
 from biokbase.narrative.jobs.util import (
+    diff_states,
     sanitize_all_states,
     sanitize_state
 )
@@ -89,6 +90,28 @@ class JobUtilTestCase(unittest.TestCase):
         self.assertEqual(all_states, sanitize_all_states(all_states))
 
 
+    def test_diff_states(self):
+        old = {'state': {'status': 'running', 'finished': None, 'a/b': 1}, 'outputs': {}}
+        new = deepcopy(old)
+        self.assertEqual(diff_states(old, new), [])
+        new['state']['status'] = 'completed'
+        new['state']['finished'] = 12345
+        new['state']['a/b'] = 2
+        del new['outputs']
+        new['widget_info'] = {'name': 'x'}
+        ops = diff_states(old, new)
+        self.assertCountEqual(ops, [
+            {'op': 'replace', 'path': '/state/status', 'value': 'completed'},
+            {'op': 'replace', 'path': '/state/finished', 'value': 12345},
+            {'op': 'replace', 'path': '/state/a~1b', 'value': 2},
+            {'op': 'remove', 'path': '/outputs'},
+            {'op': 'add', 'path': '/widget_info', 'value': {'name': 'x'}}
+        ])
+
+    def test_diff_states_no_old(self):
+        self.assertEqual(diff_states(None, {'state': 1}),
+                         [{'op': 'replace', 'path': '', 'value': {'state': 1}}])
+
 
 if __name__ == '__main__':
     unittest.main()
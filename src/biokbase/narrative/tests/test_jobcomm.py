@@ -1,10 +1,13 @@
 import unittest
 from unittest import mock
 import os
+import time
+import threading
 
 import biokbase.narrative.jobs.jobcomm
 import biokbase.narrative.jobs.jobmanager
 from biokbase.narrative.jobs.jobcomm import JobRequest
+from biokbase.narrative.jobs.statestore import JobStateStore
 from biokbase.narrative.exception_util import NarrativeException
 from .util import (
     TestConfig,
@@ -42,6 +45,7 @@ class JobCommTestCase(unittest.TestCase):
     @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
     def setUpClass(cls):
         cls.jm = biokbase.narrative.jobs.jobmanager.JobManager()
+        cls.jm._completed_job_states = JobStateStore(path="")
         cls.job_ids = list(job_info.keys())
         os.environ['KB_WORKSPACE_ID'] = config.get('jobs', 'job_test_wsname')
 
@@ -74,6 +78,166 @@ class JobCommTestCase(unittest.TestCase):
         self.assertFalse(self.jc._running_lookup_loop)
         self.assertIsNone(self.jc._lookup_timer)
 
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
+    def test_start_job_status_loop_while_loading(self):
+        self.jm._jobs_loaded.clear()
+        try:
+            self.jc.start_job_status_loop()
+            # waits for the jobs to finish loading
+            self.assertTrue(self.jc._running_lookup_loop)
+            self.assertIsNone(self.jc._lookup_timer)
+            self.assertIsNone(self.jc._comm.last_message)
+        finally:
+            self.jm._jobs_loaded.set()
+        self.jc._finish_job_init()
+        self.assertEqual(self.jc._comm.last_message["data"]["msg_type"], "job_status_all")
+        self.assertIsNotNone(self.jc._lookup_timer)
+        self.jc.stop_job_status_loop()
+
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
+    def test_start_job_status_loop_concurrent(self):
+        full_lookups = list()
+        lookup_all = self.jc._lookup_all_job_states
+
+        def slow_lookup_all(req):
+            full_lookups.append(req)
+            time.sleep(0.1)
+            return lookup_all(req)
+
+        with mock.patch.object(self.jc, "_lookup_all_job_states", slow_lookup_all):
+            threads = [threading.Thread(target=self.jc.start_job_status_loop) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(5)
+        # only one loop got started
+        self.assertEqual(len(full_lookups), 1)
+        self.assertIsNotNone(self.jc._lookup_timer)
+        self.jc.stop_job_status_loop()
+        self.assertIsNone(self.jc._lookup_timer)
+
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
+    def test_job_status_loop_sends_changes(self):
+        self.jc.start_job_status_loop()
+        self.assertEqual(self.jc._comm.last_message["data"]["msg_type"], "job_status_all")
+        # nothing's due right after the full lookup
+        self.jc._comm.clear_message_cache()
+        self.assertEqual(self.jc._lookup_due_job_states(), {})
+        self.assertIsNone(self.jc._comm.last_message)
+
+        # make everything due - the states haven't changed, so nothing gets sent
+        running_id = "5d64935cb215ad4128de94d8"
+        for job_id in self.jc._job_poll_times:
+            self.jc._job_poll_times[job_id] = 0
+        states = self.jc._lookup_due_job_states()
+        self.assertIn(running_id, states)
+        self.assertIsNone(self.jc._comm.last_message)
+
+        # a changed job gets sent by itself
+        self.jc._last_job_states[running_id] = {"state": {"status": "queued"}}
+        self.jc._job_poll_times[running_id] = 0
+        self.jc._lookup_due_job_states()
+        msg = self.jc._comm.last_message
+        self.assertEqual(msg["data"]["msg_type"], "job_status")
+        self.assertEqual(msg["data"]["content"]["state"]["job_id"], running_id)
+        self.jc.stop_job_status_loop()
+
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
+    def test_job_status_loop_stops_without_active_jobs(self):
+        with mock.patch.object(self.jm, 'list_active_jobs', return_value=[]):
+            self.jc.start_job_status_loop()
+        self.assertFalse(self.jc._running_lookup_loop)
+        self.assertIsNone(self.jc._lookup_timer)
+
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
+    @mock.patch('biokbase.narrative.jobs.jobmanager.JOB_INIT_PAGE_SIZE', 2)
+    def test_job_status_loop_init_jobs(self):
+        sent = list()
+        with mock.patch.object(self.jc, 'send_comm_message',
+                               side_effect=lambda msg_type, content: sent.append((msg_type, content))):
+            self.jc.start_job_status_loop(init_jobs=True)
+            self.jm._init_thread.join(5)
+            self.jc.stop_job_status_loop()
+        # newest jobs first, then all of them
+        self.assertEqual([msg_type for (msg_type, _) in sent],
+                         ["job_status", "job_status", "job_status", "job_status_all"])
+        self.assertEqual([content["state"]["job_id"] for (_, content) in sent[:3]],
+                         ["5d64935cb215ad4128de94d8", "5d64935cb215ad4128de94d7",
+                          "5d64935ab215ad4128de94d6"])
+        self.assertEqual(set(sent[3][1].keys()), set(self.job_ids))
+
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_failing_mock_client)
+    def test_job_status_loop_init_jobs_fail(self):
+        sent = list()
+        with mock.patch.object(self.jc, 'send_comm_message',
+                               side_effect=lambda msg_type, content: sent.append((msg_type, content))):
+            with mock.patch.object(self.jc, '_lookup_job_status_loop') as loop:
+                self.jc.start_job_status_loop(init_jobs=True)
+                self.jm._init_thread.join(5)
+                loop.assert_called_once_with(full_lookup=True)
+            self.jc.stop_job_status_loop()
+        self.assertEqual(sent[0][0], "job_init_err")
+        self.assertIn("Job lookup failed", sent[0][1]["message"])
+
+    def test_job_poll_interval(self):
+        intervals = biokbase.narrative.jobs.jobcomm.JOB_POLL_INTERVALS
+        now_ms = time.time() * 1000
+        self.assertEqual(self.jc._job_poll_interval({"state": {"status": "queued"}}),
+                         intervals["queued"])
+        self.assertEqual(self.jc._job_poll_interval({"state": {"status": "completed"}}),
+                         intervals["finished"])
+        self.assertEqual(self.jc._job_poll_interval({"state": {"status": "running",
+                                                               "running": now_ms}}),
+                         intervals["running"])
+        self.assertEqual(self.jc._job_poll_interval({"state": {"status": "running",
+                                                               "running": now_ms - 86400000}}),
+                         intervals["long_running"])
+
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
+    def test_job_status_deltas(self):
+        running_id = "5d64935cb215ad4128de94d8"
+        req = make_comm_msg("start_job_status_deltas", None, False)
+        self.jc._handle_comm_message(req).result()
+        try:
+            self.assertTrue(self.jc._send_deltas)
+            msg = self.jc._comm.last_message["data"]
+            self.assertEqual(msg["msg_type"], "job_status_delta")
+            self.assertTrue(msg["content"]["full"])
+            self.assertIn(running_id, msg["content"]["jobs"])
+            seq = msg["content"]["seq"]
+
+            # nothing changed, so nothing gets sent
+            self.jc._comm.clear_message_cache()
+            for job_id in self.jc._job_poll_times:
+                self.jc._job_poll_times[job_id] = 0
+            self.jc._lookup_due_job_states()
+            self.assertIsNone(self.jc._comm.last_message)
+
+            # only the changed field gets sent
+            self.jc._last_job_states[running_id]["state"]["status"] = "queued"
+            self.jc._job_poll_times[running_id] = 0
+            self.jc._lookup_due_job_states()
+            msg = self.jc._comm.last_message["data"]
+            self.assertEqual(msg["msg_type"], "job_status_delta")
+            self.assertEqual(msg["content"], {
+                "seq": seq + 1,
+                "full": False,
+                "jobs": {
+                    running_id: [{"op": "replace", "path": "/state/status", "value": "running"}]
+                }
+            })
+
+            req = make_comm_msg("resync_job_status", None, False)
+            self.jc._handle_comm_message(req).result()
+            msg = self.jc._comm.last_message["data"]
+            self.assertTrue(msg["content"]["full"])
+            self.assertEqual(msg["content"]["seq"], seq + 2)
+        finally:
+            req = make_comm_msg("stop_job_status_deltas", None, False)
+            self.jc._handle_comm_message(req).result()
+            self.jc.stop_job_status_loop()
+        self.assertFalse(self.jc._send_deltas)
+
     # ---------------------
     # Lookup all job states
     # ---------------------
@@ -126,6 +290,7 @@ class JobCommTestCase(unittest.TestCase):
     # ---------------
     # Lookup job info
     # ---------------
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
     def test_lookup_job_info_ok(self):
         job_id = "5d64935ab215ad4128de94d6"
         req = make_comm_msg("job_info", job_id, True)
@@ -241,6 +406,64 @@ class JobCommTestCase(unittest.TestCase):
                 self.assertIn(str(first+idx), line["line"])
                 self.assertEqual(0, line["is_error"])
 
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
+    def test_subscribe_job_logs_finished(self):
+        job_id = "5d64935ab215ad4128de94d6"
+        req = make_comm_msg("subscribe_job_logs", job_id, False, {"first_line": 90})
+        self.jc._handle_comm_message(req).result()
+        msg = self.jc._comm.last_message["data"]
+        self.assertEqual(msg["msg_type"], "job_logs")
+        self.assertEqual(msg["content"]["first"], 90)
+        self.assertEqual(len(msg["content"]["lines"]), 10)
+        self.assertTrue(msg["content"]["done"])
+        self.assertNotIn(job_id, self.jc._log_subscriptions)
+        self.assertIsNone(self.jc._log_timer)
+
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
+    def test_subscribe_job_logs_running(self):
+        job_id = "5d64935cb215ad4128de94d8"
+        req = make_comm_msg("subscribe_job_logs", job_id, False, {"first_line": 95})
+        self.jc._handle_comm_message(req).result()
+        try:
+            msg = self.jc._comm.last_message["data"]
+            self.assertEqual(msg["msg_type"], "job_logs")
+            self.assertEqual([line["line"] for line in msg["content"]["lines"]],
+                             ["This is line {}".format(i) for i in range(95, 100)])
+            self.assertFalse(msg["content"]["done"])
+            self.assertEqual(self.jc._log_subscriptions[job_id], 100)
+            self.assertIsNotNone(self.jc._log_timer)
+
+            # no new lines, nothing gets sent
+            self.jc._comm.clear_message_cache()
+            self.jc._lookup_subscribed_logs()
+            self.assertIsNone(self.jc._comm.last_message)
+        finally:
+            req = make_comm_msg("unsubscribe_job_logs", job_id, False)
+            self.jc._handle_comm_message(req).result()
+        self.assertNotIn(job_id, self.jc._log_subscriptions)
+        self.assertIsNone(self.jc._log_timer)
+
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
+    def test_subscribe_job_logs_from_end(self):
+        job_id = "5d64935cb215ad4128de94d8"
+        req = make_comm_msg("subscribe_job_logs", job_id, False)
+        self.jc._handle_comm_message(req).result()
+        try:
+            self.assertEqual(self.jc._log_subscriptions[job_id], 100)
+            self.assertIsNone(self.jc._comm.last_message)
+        finally:
+            req = make_comm_msg("unsubscribe_job_logs", job_id, False)
+            self.jc._handle_comm_message(req).result()
+
+    def test_subscribe_job_logs_bad_job(self):
+        req = make_comm_msg("subscribe_job_logs", "not_a_job", False)
+        with self.assertRaises(ValueError):
+            self.jc._handle_comm_message(req).result()
+        self.assertEqual(self.jc._comm.last_message["data"]["msg_type"], "job_does_not_exist")
+        req = make_comm_msg("subscribe_job_logs", None, False)
+        with self.assertRaises(ValueError):
+            self.jc._handle_comm_message(req).result()
+
     @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_failing_mock_client)
     def test_get_job_logs_failure(self):
         job_id = "5d64935ab215ad4128de94d6"
@@ -290,13 +513,58 @@ class JobCommTestCase(unittest.TestCase):
             self.jc._handle_comm_message({"content": {"data": {"request_type": unknown}}})
         self.assertIn(f"Unknown KBaseJobs message '{unknown}'", str(e.exception))
 
+    def test_handle_comm_message_coalesced(self):
+        release = threading.Event()
+        calls = list()
+
+        def slow_handler(req):
+            calls.append(req.job_id)
+            release.wait(5)
+            return req.job_id
+
+        with mock.patch.dict(self.jc._msg_map, {"job_info": slow_handler}):
+            f1 = self.jc._handle_comm_message(make_comm_msg("job_info", "job1", False))
+            f2 = self.jc._handle_comm_message(make_comm_msg("job_info", "job1", False))
+            f3 = self.jc._handle_comm_message(make_comm_msg("job_info", "job2", False))
+            self.assertIs(f1, f2)
+            self.assertIsNot(f1, f3)
+            release.set()
+            self.assertEqual(f1.result(timeout=5), "job1")
+            self.assertEqual(f3.result(timeout=5), "job2")
+        self.assertEqual(sorted(calls), ["job1", "job2"])
+        self.assertEqual(self.jc._in_flight, {})
+
+    def test_handle_comm_message_concurrency_limit(self):
+        release = threading.Event()
+        running = list()
+        max_running = list()
+        lock = threading.Lock()
+
+        def slow_handler(req):
+            with lock:
+                running.append(req.job_id)
+                max_running.append(len(running))
+            release.wait(5)
+            with lock:
+                running.remove(req.job_id)
+
+        limit = biokbase.narrative.jobs.jobcomm.REQUEST_CONCURRENCY["cancel_job"]
+        with mock.patch.dict(self.jc._msg_map, {"cancel_job": slow_handler}):
+            futures = [self.jc._handle_comm_message(make_comm_msg("cancel_job", f"job{i}", False))
+                       for i in range(limit + 2)]
+            time.sleep(0.2)
+            release.set()
+            for f in futures:
+                f.result(timeout=5)
+        self.assertEqual(max(max_running), limit)
+
     # From here, this test the ability for the _handle_comm_message function to
     # deal with the various types of messages that will get passed to it. While
     # the majority of the tests above are sent directly to the function to be
     # tested, these just craft the message and pass it to the message handler.
     def test_handle_all_states_msg(self):
         req = make_comm_msg("all_status", None, False)
-        self.jc._handle_comm_message(req)
+        self.jc._handle_comm_message(req).result()
         msg = self.jc._comm.last_message
         self.assertEqual(msg["data"]["msg_type"], "job_status_all")
         states = msg["data"]["content"]
@@ -310,15 +578,16 @@ class JobCommTestCase(unittest.TestCase):
     def test_handle_job_status_msg(self):
         job_id = "5d64935ab215ad4128de94d6"
         req = make_comm_msg("job_status", job_id, False)
-        self.jc._handle_comm_message(req)
+        self.jc._handle_comm_message(req).result()
         msg = self.jc._comm.last_message
         self.assertEqual(msg["data"]["msg_type"], "job_status")
         validate_job_state(msg["data"]["content"])
 
+    @mock.patch('biokbase.narrative.jobs.jobcomm.jobmanager.clients.get', get_mock_client)
     def test_handle_job_info_msg(self):
         job_id = "5d64935ab215ad4128de94d6"
         req = make_comm_msg("job_info", job_id, False)
-        self.jc._handle_comm_message(req)
+        self.jc._handle_comm_message(req).result()
         msg = self.jc._comm.last_message
         self.assertEqual(msg["data"]["msg_type"], "job_info")
 
@@ -326,7 +595,7 @@ class JobCommTestCase(unittest.TestCase):
     def test_handle_cancel_job_msg(self):
         job_id = "5d64935ab215ad4128de94d6"
         req = make_comm_msg("cancel_job", job_id, False)
-        self.jc._handle_comm_message(req)
+        self.jc._handle_comm_message(req).result()
         msg = self.jc._comm.last_message
         self.assertEqual(msg["data"]["msg_type"], "job_status")
 
@@ -335,7 +604,7 @@ class JobCommTestCase(unittest.TestCase):
         job_id = "5d64935ab215ad4128de94d6"
         refresh_count = self.jm._running_jobs[job_id]["refresh"]
         req = make_comm_msg("start_job_update", job_id, False)
-        self.jc._handle_comm_message(req)
+        self.jc._handle_comm_message(req).result()
         msg = self.jc._comm.last_message
         self.assertEqual(msg["data"]["msg_type"], "job_status_all")
         self.assertEqual(self.jm._running_jobs[job_id]["refresh"], refresh_count + 1)
@@ -346,7 +615,7 @@ class JobCommTestCase(unittest.TestCase):
         job_id = "5d64935ab215ad4128de94d6"
         refresh_count = self.jm._running_jobs[job_id]["refresh"]
         req = make_comm_msg("stop_job_update", job_id, False)
-        self.jc._handle_comm_message(req)
+        self.jc._handle_comm_message(req).result()
         msg = self.jc._comm.last_message
         self.assertIsNone(msg)
         self.assertEqual(self.jm._running_jobs[job_id]["refresh"], max(refresh_count - 1, 0))
@@ -355,7 +624,7 @@ class JobCommTestCase(unittest.TestCase):
     def test_handle_latest_job_logs_msg(self):
         job_id = "5d64935ab215ad4128de94d6"
         req = make_comm_msg("job_logs_latest", job_id, False, content={"num_lines": 10})
-        self.jc._handle_comm_message(req)
+        self.jc._handle_comm_message(req).result()
         msg = self.jc._comm.last_message
         self.assertEqual(msg["data"]["msg_type"], "job_logs")
 
@@ -363,7 +632,7 @@ class JobCommTestCase(unittest.TestCase):
     def test_handle_job_logs_msg(self):
         job_id = "5d64935ab215ad4128de94d6"
         req = make_comm_msg("job_logs", job_id, False, content={"num_lines": 10, "first_line": 0})
-        self.jc._handle_comm_message(req)
+        self.jc._handle_comm_message(req).result()
         msg = self.jc._comm.last_message
         self.assertEqual(msg["data"]["msg_type"], "job_logs")
 
@@ -5,10 +5,12 @@ import unittest
 from unittest import mock
 import biokbase.narrative.jobs.jobmanager
 from biokbase.narrative.jobs.job import Job
+from biokbase.narrative.jobs.statestore import JobStateStore
 from .util import TestConfig
 import os
+import tempfile
 from IPython.display import HTML
-from .narrative_mock.mockclients import get_mock_client, get_failing_mock_client
+from .narrative_mock.mockclients import get_mock_client, get_failing_mock_client, MockClients
 from biokbase.narrative.exception_util import NarrativeException
 
 __author__ = "Bill Riehl <wjriehl@lbl.gov>"
@@ -17,6 +19,47 @@ config = TestConfig()
 job_info = config.load_json_file(config.get('jobs', 'ee2_job_info_file'))
 
 
+class PartlyFailingMockClients(MockClients):
+    """
+    check_jobs fails for any list of jobs that includes bad_job_id, and counts its calls.
+    """
+    def __init__(self, bad_job_id, token=None):
+        super().__init__(token=token)
+        self.bad_job_id = bad_job_id
+        self.check_jobs_calls = list()
+
+    def check_jobs(self, params):
+        self.check_jobs_calls.append(params['job_ids'])
+        if self.bad_job_id in params['job_ids']:
+            raise Exception("check_jobs failed")
+        return super().check_jobs(params)
+
+
+class FinishedMockClients(MockClients):
+    """
+    Marks completed jobs as finished, so their output viewers get built.
+    """
+    def check_job(self, params):
+        state = super().check_job(params)
+        if state.get('status') == 'completed':
+            state['finished'] = state.get('updated', 1)
+        return state
+
+
+class RegisteringMockClients(MockClients):
+    """
+    Registers a new job with the JobManager while the workspace jobs are being fetched.
+    """
+    def __init__(self, jm, job, token=None):
+        super().__init__(token=token)
+        self.jm = jm
+        self.job = job
+
+    def check_workspace_jobs(self, params):
+        self.jm.register_new_job(self.job)
+        return super().check_workspace_jobs(params)
+
+
 @mock.patch('biokbase.narrative.jobs.job.clients.get', get_mock_client)
 def phony_job():
     return Job.from_state('phony_job',
@@ -41,6 +84,7 @@ class JobManagerTest(unittest.TestCase):
     @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
     def setUpClass(cls):
         cls.jm = biokbase.narrative.jobs.jobmanager.JobManager()
+        cls.jm._completed_job_states = JobStateStore(path="")
         cls.job_ids = list(job_info.keys())
         os.environ['KB_WORKSPACE_ID'] = config.get('jobs', 'job_test_wsname')
 
@@ -91,6 +135,26 @@ class JobManagerTest(unittest.TestCase):
         self.jm.register_new_job(new_job)
         self.jm.cancel_job(job_id)
 
+    def test_cancel_job_keeps_refresh(self):
+        new_job = phony_job()
+        job_id = new_job.job_id
+        self.jm.register_new_job(new_job)
+        client = MockClients()
+        during_cancel = dict()
+
+        def cancel_job(params):
+            # something starts listening to the job while it's being canceled
+            self.jm.modify_job_refresh(job_id, 1)
+            during_cancel["active"] = job_id in self.jm.list_active_jobs()
+            during_cancel["looked_up"] = job_id in self.jm.lookup_all_job_states()
+        client.cancel_job = cancel_job
+        with mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', return_value=client):
+            self.jm.cancel_job(job_id)
+        self.assertEqual(during_cancel, {"active": False, "looked_up": False})
+        self.assertEqual(self.jm._running_jobs[job_id]["refresh"], 1)
+        self.assertNotIn("canceling", self.jm._running_jobs[job_id])
+        self.jm.modify_job_refresh(job_id, -1)
+
     def test_cancel_job_bad(self):
         with self.assertRaises(ValueError):
             self.jm.cancel_job(None)
@@ -103,6 +167,235 @@ class JobManagerTest(unittest.TestCase):
         states = self.jm.lookup_all_job_states(ignore_refresh_flag=True)
         self.assertEqual(len(states), 3)
 
+    @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
+    def test_completed_job_states_persist(self):
+        completed_id = "5d64935ab215ad4128de94d6"
+        old_store = self.jm._completed_job_states
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "job_states.sqlite3")
+            try:
+                self.jm._completed_job_states = JobStateStore(path=path)
+                state = self.jm.lookup_job_states([completed_id])[completed_id]
+                self.jm._completed_job_states.close()
+
+                # a new store, like after a kernel restart, doesn't need to ask EE2
+                self.jm._completed_job_states = JobStateStore(path=path)
+                with mock.patch('biokbase.narrative.jobs.jobmanager.clients.get',
+                                get_failing_mock_client):
+                    states = self.jm.lookup_job_states([completed_id])
+                self.assertEqual(states[completed_id], state)
+                self.jm._completed_job_states.close()
+            finally:
+                self.jm._completed_job_states = old_store
+
+    @mock.patch('biokbase.narrative.clients.get', get_mock_client)
+    def test_get_job_state_caches_finished(self):
+        completed_id = "5d64935ab215ad4128de94d6"
+        running_id = "5d64935cb215ad4128de94d8"
+        old_store = self.jm._completed_job_states
+        self.jm._completed_job_states = JobStateStore(path="")
+        try:
+            with mock.patch('biokbase.narrative.jobs.jobmanager.invalidate_object_info') as inval:
+                state = self.jm.get_job_state(completed_id)
+                self.assertEqual(state["state"]["status"], "completed")
+                self.assertIn(completed_id, self.jm._completed_job_states)
+                # only the job's workspace is invalidated, and only when it's first saved
+                inval.assert_called_once_with(job_info[completed_id]["wsid"])
+                self.jm.get_job_state(completed_id)
+                self.jm.get_job_state(running_id)
+                self.assertNotIn(running_id, self.jm._completed_job_states)
+                self.assertEqual(inval.call_count, 1)
+        finally:
+            self.jm._completed_job_states = old_store
+
+    @mock.patch('biokbase.narrative.clients.get', lambda name, token=None: FinishedMockClients())
+    def test_finished_state_not_saved_on_viewer_error(self):
+        completed_id = "5d64935ab215ad4128de94d6"
+        old_store = self.jm._completed_job_states
+        self.jm._completed_job_states = JobStateStore(path="")
+        try:
+            with mock.patch.object(Job, 'get_viewer_params', side_effect=Exception("NMS is down")), \
+                    mock.patch('biokbase.narrative.jobs.jobmanager.invalidate_object_info') as inval:
+                state = self.jm.lookup_job_states([completed_id])[completed_id]
+            inval.assert_not_called()
+            self.assertEqual(state["state"]["status"], "error")
+            self.assertNotIn(completed_id, self.jm._completed_job_states)
+            self.assertIn(completed_id, self.jm.list_active_jobs())
+
+            # once the viewer can be built, it's saved, without the session fields
+            with mock.patch.object(Job, 'get_viewer_params', return_value={"some": "viewer"}):
+                state = self.jm.lookup_job_states([completed_id])[completed_id]
+            self.assertEqual(state["widget_info"], {"some": "viewer"})
+            self.assertEqual(state["state"]["status"], "completed")
+            self.assertIn("listener_count", state)
+            saved = self.jm._completed_job_states[completed_id]
+            self.assertNotIn("listener_count", saved)
+            self.assertNotIn(completed_id, self.jm.list_active_jobs())
+            self.assertEqual(self.jm.lookup_job_states([completed_id])[completed_id], state)
+        finally:
+            self.jm._completed_job_states = old_store
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.CHECK_JOBS_CHUNK_SIZE', 1)
+    def test_check_jobs_chunks(self):
+        mock_client = PartlyFailingMockClients(self.job_ids[0])
+        with mock.patch('biokbase.narrative.jobs.jobmanager.clients.get',
+                        return_value=mock_client):
+            (states, errors) = self.jm._check_jobs(self.job_ids)
+        self.assertEqual(sorted(mock_client.check_jobs_calls),
+                         sorted([[job_id] for job_id in self.job_ids]))
+        self.assertEqual(set(states.keys()), set(self.job_ids[1:]))
+        self.assertEqual(errors, {self.job_ids[0]: "check_jobs failed"})
+        self.assertEqual(self.jm._check_jobs([]), ({}, {}))
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.CHECK_JOBS_CHUNK_SIZE', 1)
+    def test_lookup_job_states_partial_failure(self):
+        bad_job_id = "5d64935ab215ad4128de94d6"
+        mock_client = PartlyFailingMockClients(bad_job_id)
+        old_store = self.jm._completed_job_states
+        self.jm._completed_job_states = JobStateStore(path="")
+        try:
+            with mock.patch('biokbase.narrative.jobs.jobmanager.clients.get',
+                            return_value=mock_client):
+                states = self.jm.lookup_job_states(self.job_ids)
+            self.assertEqual(set(states.keys()), set(self.job_ids))
+            self.assertEqual(states[bad_job_id]["state"]["status"], "error")
+            self.assertEqual(states[bad_job_id]["state"]["job_id"], bad_job_id)
+            self.assertNotIn(bad_job_id, self.jm._completed_job_states)
+            for job_id in self.job_ids:
+                if job_id != bad_job_id:
+                    self.assertNotIn("errormsg", states[job_id]["state"])
+        finally:
+            self.jm._completed_job_states = old_store
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
+    @mock.patch('biokbase.narrative.jobs.job.clients.get', get_mock_client)
+    def test_initialize_jobs_lazy_inputs(self):
+        job_id = "5d64935cb215ad4128de94d8"
+        job = self.jm.get_job(job_id)
+        self.assertIsNone(job.inputs)
+        self.assertEqual(job.cell_id, "9329ac6c-604c-42a9-aca2-a15dba6278cf")
+        self.assertEqual(job.parameters(), job_info[job_id]["job_input"]["params"])
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
+    def test_load_job_inputs(self):
+        job_ids = ["5d64935ab215ad4128de94d6", "5d64935cb215ad4128de94d7"]
+        self.jm._load_job_inputs(job_ids + ["not_a_job"])
+        for job_id in job_ids:
+            self.assertEqual(self.jm.get_job(job_id).inputs,
+                             job_info[job_id]["job_input"]["params"])
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
+    @mock.patch('biokbase.narrative.jobs.jobmanager.JOB_INIT_PAGE_SIZE', 2)
+    def test_initialize_jobs_pages(self):
+        pages = list()
+        self.jm.initialize_jobs(page_callback=pages.append)
+        self.assertEqual(pages, [["5d64935cb215ad4128de94d8", "5d64935cb215ad4128de94d7"],
+                                 ["5d64935ab215ad4128de94d6"]])
+        self.assertTrue(self.jm._jobs_loaded.is_set())
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
+    def test_start_initialize_jobs(self):
+        done = list()
+        thread = self.jm.start_initialize_jobs(done_callback=done.append)
+        # waits for the jobs to load
+        self.assertEqual(self.jm.get_job(self.job_ids[0]).job_id, self.job_ids[0])
+        thread.join(5)
+        self.assertEqual(done, [None])
+
+    def test_initialize_jobs_keeps_new_jobs(self):
+        new_job = phony_job()
+        mock_client = RegisteringMockClients(self.jm, new_job)
+        try:
+            with mock.patch('biokbase.narrative.jobs.jobmanager.clients.get',
+                            return_value=mock_client):
+                self.jm.initialize_jobs()
+            self.assertIs(self.jm.get_job('phony_job'), new_job)
+            self.assertEqual(self.jm._running_jobs['phony_job']['refresh'], 0)
+            for job_id in self.job_ids:
+                self.assertEqual(self.jm.get_job(job_id).job_id, job_id)
+        finally:
+            self.jm._running_jobs.pop('phony_job', None)
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_failing_mock_client)
+    def test_start_initialize_jobs_fail(self):
+        done = list()
+        self.jm.start_initialize_jobs(done_callback=done.append).join(5)
+        self.assertEqual(len(done), 1)
+        self.assertIsInstance(done[0], NarrativeException)
+        self.assertTrue(self.jm._jobs_loaded.is_set())
+
+    def test_get_jobs_for_cells(self):
+        cell_1 = "9329ac6c-604c-42a9-aca2-a15dba6278ce"
+        cell_2 = "9329ac6c-604c-42a9-aca2-a15dba6278cf"
+        self.assertEqual(self.jm.get_jobs_for_cells([cell_1, cell_2, "not_a_cell"]), {
+            cell_1: ["5d64935ab215ad4128de94d6", "5d64935cb215ad4128de94d7"],
+            cell_2: ["5d64935cb215ad4128de94d8"],
+            "not_a_cell": []
+        })
+
+    def test_get_jobs_for_runs(self):
+        run_id = "6546971e-757a-4a26-8439-325497c6d843"
+        self.assertEqual(self.jm.get_jobs_for_runs([run_id]),
+                         {run_id: ["5d64935cb215ad4128de94d8"]})
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
+    def test_get_jobs_by_status(self):
+        self.assertEqual(self.jm.get_jobs_by_status(["created", "running"]),
+                         ["5d64935cb215ad4128de94d7", "5d64935cb215ad4128de94d8"])
+        self.assertEqual(self.jm.get_jobs_by_status(["completed"]),
+                         ["5d64935ab215ad4128de94d6"])
+        self.assertEqual(self.jm.get_jobs_by_status(["not_a_status"]), [])
+        # status changes move jobs between buckets
+        self.jm._index_job_state("5d64935cb215ad4128de94d8", {"status": "completed"})
+        self.assertEqual(self.jm.get_jobs_by_status(["running"]), [])
+        self.assertIn("5d64935cb215ad4128de94d8", self.jm.get_jobs_by_status(["completed"]))
+
+    def test_get_child_jobs(self):
+        parent_id = "5d64935cb215ad4128de94d8"
+        self.assertEqual(self.jm.get_child_jobs(parent_id), [])
+        self.jm._index_job_state(parent_id, {"status": "running", "sub_jobs": ["child1"]})
+        self.jm._index_job_state("child2", {"status": "queued", "parent_job_id": parent_id})
+        self.assertEqual(self.jm.get_child_jobs(parent_id), ["child1", "child2"])
+
+    def test_register_new_job_indexed(self):
+        new_job = phony_job()
+        new_job.cell_id = "phony_cell"
+        self.jm.register_new_job(new_job)
+        self.assertEqual(self.jm.get_jobs_for_cells(["phony_cell"]),
+                         {"phony_cell": [new_job.job_id]})
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
+    def test_lookup_job_states(self):
+        states = self.jm.lookup_job_states(self.job_ids[:2])
+        self.assertEqual(set(states.keys()), set(self.job_ids[:2]))
+        self.assertEqual(self.jm.lookup_job_states([]), {})
+        with self.assertRaises(ValueError):
+            self.jm.lookup_job_states(self.job_ids[0])
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
+    def test_list_active_jobs(self):
+        completed_id = "5d64935ab215ad4128de94d6"
+        self.jm.lookup_all_job_states(ignore_refresh_flag=True)
+        # the completed job drops out, unless something is listening to it
+        self.assertEqual(set(self.jm.list_active_jobs()), set(self.job_ids) - {completed_id})
+        self.jm.modify_job_refresh(completed_id, 1)
+        self.assertEqual(set(self.jm.list_active_jobs()), set(self.job_ids))
+        self.jm.modify_job_refresh(completed_id, -1)
+
+    @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
+    def test_list_active_jobs_evicted(self):
+        completed_id = "5d64935ab215ad4128de94d6"
+        old_store = self.jm._completed_job_states
+        self.jm._completed_job_states = JobStateStore(path="", memory_size=1)
+        try:
+            self.jm.lookup_all_job_states(ignore_refresh_flag=True)
+            # push the finished job out of memory, it still stays out of the active jobs
+            self.jm._completed_job_states["other_job"] = {"state": {"status": "completed"}}
+            self.assertFalse(self.jm._completed_job_states.in_memory(completed_id))
+            self.assertNotIn(completed_id, self.jm.list_active_jobs())
+        finally:
+            self.jm._completed_job_states = old_store
+
     # @mock.patch('biokbase.narrative.jobs.jobmanager.clients.get', get_mock_client)
     # def test_job_status_fetching(self):
     #     self.jm._handle_comm_message(create_jm_message("all_status"))
@@ -161,6 +454,12 @@ class JobManagerTest(unittest.TestCase):
         with self.assertRaises(NarrativeException) as e:
             self.jm.initialize_jobs()
         self.assertIn('Job lookup failed', str(e.exception))
+        # the jobs that were already known are kept
+        for job_id in self.job_ids:
+            self.assertEqual(self.jm.get_job(job_id).job_id, job_id)
+        cell_id = "9329ac6c-604c-42a9-aca2-a15dba6278cf"
+        self.assertIn("5d64935cb215ad4128de94d8",
+                      self.jm.get_jobs_for_cells([cell_id])[cell_id])
 
 if __name__ == "__main__":
     unittest.main()
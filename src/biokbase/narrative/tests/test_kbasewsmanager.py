@@ -1,6 +1,9 @@
+import os
 import unittest
 import mock
+import nbformat
 from biokbase.narrative.contents.kbasewsmanager import KBaseWSManager
+from biokbase.narrative.contents import narrativeio
 from .narrative_mock.mockclients import get_mock_client
 from biokbase.narrative.common.narrative_ref import NarrativeRef
 from tornado.web import HTTPError
@@ -35,3 +38,55 @@ class KBWSManagerTestCase(unittest.TestCase):
             with self.assertRaises(HTTPError) as e:
                 manager._parse_path(c)
             self.assertIn("Invalid Narrative path {}".format(c), str(e.exception))
+
+    def test_save_workspace_calls(self):
+        ws = mock.MagicMock()
+        ws.get_permissions.return_value = {"some_user": "a"}
+        ws.save_objects.return_value = [
+            [1, "Narrative.123", "KBaseNarrative.Narrative-4.0", "2020-01-01T00:00:00+0000", 5,
+             "some_user", 123, "some_workspace", "abc", 100, {}]
+        ]
+        nb = nbformat.v4.new_notebook()
+        nb.metadata["name"] = "My Narrative"
+        nb.metadata["ws_name"] = "some_workspace"
+        model = {"type": "notebook", "content": nb}
+        with mock.patch("biokbase.narrative.clients.get", return_value=ws), \
+                mock.patch.dict(os.environ, {"KB_USER_ID": "some_user", "KB_NARRATIVE": "none"}):
+            manager = KBaseWSManager()
+            manager.narrative_logger = mock.MagicMock()
+            narrativeio._permissions_cache.clear()
+            narrativeio._ws_metadata_cache.clear()
+            saved = manager.save(dict(model), "ws.123.obj.1")
+            self.assertEqual(saved["type"], "notebook")
+            self.assertEqual(saved["path"], "ws.123.obj.1")
+            self.assertTrue(saved["writable"])
+            self.assertEqual(ws.get_permissions.call_count, 1)
+            self.assertEqual(ws.alter_workspace_metadata.call_count, 1)
+            self.assertEqual(ws.save_objects.call_count, 1)
+            ws.get_object_info3.assert_not_called()
+
+            # saving again with the same name only saves the object
+            manager.save(dict(model), "ws.123.obj.1")
+            self.assertEqual(ws.get_permissions.call_count, 1)
+            self.assertEqual(ws.alter_workspace_metadata.call_count, 1)
+            self.assertEqual(ws.save_objects.call_count, 2)
+
+            # a new name updates the workspace metadata, using the cached permissions
+            nb.metadata["name"] = "New Name"
+            manager.save(dict(model), "ws.123.obj.1")
+            self.assertEqual(ws.get_permissions.call_count, 1)
+            self.assertEqual(ws.alter_workspace_metadata.call_count, 2)
+            self.assertEqual(ws.alter_workspace_metadata.call_args[0][0]["new"]["narrative_nice_name"],
+                             "New Name")
+
+            # without admin rights the metadata isn't set, or remembered
+            narrativeio._permissions_cache.clear()
+            narrativeio._ws_metadata_cache.clear()
+            ws.get_permissions.return_value = {"some_user": "w"}
+            manager.save(dict(model), "ws.123.obj.1")
+            manager.save(dict(model), "ws.123.obj.1")
+            self.assertEqual(ws.get_permissions.call_count, 2)
+            self.assertEqual(ws.alter_workspace_metadata.call_count, 2)
+            self.assertEqual(ws.save_objects.call_count, 5)
+            narrativeio._permissions_cache.clear()
+            narrativeio._ws_metadata_cache.clear()
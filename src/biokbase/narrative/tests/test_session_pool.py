@@ -0,0 +1,92 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from biokbase import session_pool
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1, so the connection stays open between requests
+    protocol_version = "HTTP/1.1"
+    # don't wait forever on an idle kept-alive connection
+    timeout = 5
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b'{"result": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SessionPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        session_pool.configure(pool_size=session_pool.DEFAULT_POOL_SIZE,
+                               max_retries=session_pool.DEFAULT_MAX_RETRIES,
+                               backoff_factor=session_pool.DEFAULT_BACKOFF_FACTOR)
+
+    def tearDown(self):
+        session_pool.reset()
+
+    def test_same_endpoint_shares_session(self):
+        s1 = session_pool.get_session("https://ci.kbase.us/services/ws")
+        s2 = session_pool.get_session("https://ci.kbase.us/services/catalog")
+        s3 = session_pool.get_session("https://ci.kbase.us:443/services/ee2")
+        self.assertIs(s1, s2)
+        self.assertIs(s1, s3)
+
+    def test_different_endpoints_get_different_sessions(self):
+        s1 = session_pool.get_session("https://ci.kbase.us/services/ws")
+        s2 = session_pool.get_session("https://kbase.us/services/ws")
+        s3 = session_pool.get_session("http://ci.kbase.us/services/ws")
+        self.assertIsNot(s1, s2)
+        self.assertIsNot(s1, s3)
+
+    def test_reset_makes_new_session(self):
+        s1 = session_pool.get_session("https://ci.kbase.us/services/ws")
+        session_pool.reset()
+        s2 = session_pool.get_session("https://ci.kbase.us/services/ws")
+        self.assertIsNot(s1, s2)
+
+    def test_configure(self):
+        session_pool.configure(pool_size=3, max_retries=0)
+        session = session_pool.get_session("https://ci.kbase.us/services/ws")
+        adapter = session.get_adapter("https://ci.kbase.us")
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertEqual(adapter.max_retries.connect, 0)
+        self.assertEqual(adapter.max_retries.read, 0)
+
+    def test_configure_bad_values(self):
+        with self.assertRaises(ValueError):
+            session_pool.configure(pool_size=0)
+        with self.assertRaises(ValueError):
+            session_pool.configure(max_retries=-1)
+
+    def test_connection_stats(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            endpoint = "http://127.0.0.1:{}".format(server.server_address[1])
+            session_pool.connection_stats(reset_counts=True)
+            for service in ["ws", "catalog", "ee2"]:
+                url = "{}/services/{}".format(endpoint, service)
+                resp = session_pool.get_session(url).post(url, data='{"method": "x"}')
+                self.assertEqual(resp.json(), {"result": []})
+            # one connection gets opened, then used for the other requests
+            stats = session_pool.connection_stats(reset_counts=True)
+            self.assertEqual(stats[endpoint], {"new": 1, "reused": 2})
+            self.assertNotIn(endpoint, session_pool.connection_stats())
+        finally:
+            session_pool.reset()
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
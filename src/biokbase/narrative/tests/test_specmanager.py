@@ -1,9 +1,13 @@
+import copy
+import time
 import unittest
 
 import mock
 
-from biokbase.narrative.jobs.specmanager import SpecManager
-from .narrative_mock.mockclients import get_mock_client
+import biokbase.narrative.jobs.specmanager as specmanager
+from biokbase.narrative.jobs.specmanager import SpecManager, TagSpecs
+from biokbase.narrative.jobs.specstore import SpecStore
+from .narrative_mock.mockclients import get_mock_client, MockClients
 
 
 class SpecManagerTestCase(unittest.TestCase):
@@ -45,6 +49,122 @@ class SpecManagerTestCase(unittest.TestCase):
         with self.assertRaisesRegex(ValueError, "Unknown type"):
             self.assertIn("export_functions", list(self.sm.get_type_spec("KBaseExpression.NU_FBA").keys()))
 
+    def test_app_specs_lazy(self):
+        client = MockClients()
+        with mock.patch.object(client, 'list_methods_spec', wraps=client.list_methods_spec) as list_specs, \
+                mock.patch.object(client, 'get_method_spec', wraps=client.get_method_spec) as get_spec:
+            specs = TagSpecs(self.good_tag, client=client, store=SpecStore())
+            self.assertIn(self.good_app_id, specs)
+            self.assertNotIn(self.bad_app_id, specs)
+            self.assertEqual(specs[self.good_app_id]['info']['id'], self.good_app_id)
+            self.assertEqual(specs.get(self.good_app_id)['info']['id'], self.good_app_id)
+            self.assertIsNone(specs.get(self.bad_app_id))
+            with self.assertRaises(KeyError):
+                specs[self.bad_app_id]
+            # one spec fetched, only once
+            get_spec.assert_called_once_with({'ids': [self.good_app_id], 'tag': self.good_tag})
+            list_specs.assert_not_called()
+            self.assertFalse(specs.is_loaded())
+
+            all_specs = list(specs.values())
+            self.assertEqual(len(all_specs), len(specs))
+            self.assertTrue(specs.is_loaded())
+            list(specs.items())
+            list_specs.assert_called_once()
+
+    def test_app_specs_refresh(self):
+        client = MockClients()
+        briefs = [dict(spec['info'], git_commit_hash='abc') for spec in client.list_methods_spec({})]
+        other_id = [b['id'] for b in briefs if b['id'] != self.good_app_id][0]
+        with mock.patch.object(client, 'list_methods', return_value=briefs), \
+                mock.patch.object(client, 'get_method_spec', wraps=client.get_method_spec) as get_spec:
+            specs = TagSpecs(self.good_tag, client=client, store=SpecStore())
+            # nothing loaded, nothing to refresh
+            self.assertEqual(specs.refresh(), set())
+            client.list_methods.assert_not_called()
+
+            # the loaded spec has no hash, so it gets fetched once
+            specs[self.good_app_id]
+            get_spec.reset_mock()
+            self.assertEqual(specs.refresh(), {self.good_app_id})
+            get_spec.assert_called_once_with({'ids': [self.good_app_id], 'tag': self.good_tag})
+
+            # nothing changed
+            get_spec.reset_mock()
+            self.assertEqual(specs.refresh(), set())
+            get_spec.assert_not_called()
+
+            # an unloaded app changed, and another was removed, so nothing gets fetched
+            briefs[:] = [dict(b, git_commit_hash='def') for b in briefs if b['id'] != other_id]
+            self.assertEqual(specs.refresh(), {self.good_app_id, other_id})
+            get_spec.assert_called_once_with({'ids': [self.good_app_id], 'tag': self.good_tag})
+            self.assertNotIn(other_id, specs)
+            self.assertIn(self.good_app_id, specs)
+
+    @mock.patch('biokbase.narrative.jobs.specmanager.clients.get', get_mock_client)
+    def test_auto_refresh(self):
+        # making a SpecManager doesn't start refreshing, that's up to the kernel
+        self.assertIsNone(self.sm._refresh_timer)
+        with mock.patch.object(SpecManager, 'refresh', return_value={}) as refresh:
+            try:
+                self.sm.start_auto_refresh(0.01)
+                time.sleep(0.2)
+            finally:
+                self.sm.stop_auto_refresh()
+            self.assertGreater(refresh.call_count, 1)
+        with mock.patch('biokbase.narrative.jobs.specmanager.SPEC_REFRESH_INTERVAL', 0):
+            self.sm.start_auto_refresh()
+            self.assertIsNone(self.sm._refresh_timer)
+
+    @mock.patch('biokbase.narrative.jobs.specmanager.clients.get', get_mock_client)
+    def test_app_params_cached(self):
+        spec = self.sm.get_spec(self.good_app_id, tag=self.good_tag)
+        params = self.sm.app_params(spec)
+        self.assertIs(params, self.sm.app_params(spec))
+        self.assertIs(params, self.sm.app_params(copy.deepcopy(spec)))
+        self.assertEqual(set(params.by_id.keys()), set(p['id'] for p in params))
+
+    @mock.patch('biokbase.narrative.jobs.specmanager.clients.get', get_mock_client)
+    def test_background_warming(self):
+        self.sm.reload()
+        self.sm._warm_thread.join(timeout=10)
+        for tag in specmanager.app_version_tags:
+            self.assertTrue(self.sm.app_specs[tag].is_loaded())
+        self.assertEqual(self.sm.get_spec(self.good_app_id, tag=self.good_tag)['info']['id'],
+                         self.good_app_id)
+
+    @mock.patch('biokbase.narrative.jobs.specmanager.clients.get', get_mock_client)
+    def test_app_specs_versioned_items(self):
+        client = MockClients()
+        specs = TagSpecs(self.good_tag, client=client, store=SpecStore())
+        (version, items) = specs.versioned_items()
+        self.assertEqual(version, specs.version)
+        self.assertEqual(items, dict(specs.items()))
+        # a copy, so later changes don't show up in it
+        specs._drop(self.good_app_id)
+        self.assertIn(self.good_app_id, items)
+        self.assertGreater(specs.version, version)
+
+    @mock.patch('biokbase.narrative.jobs.specmanager.clients.get', get_mock_client)
+    def test_app_specs_memory_report(self):
+        self.sm.reload()
+        self.sm._warm_thread.join(timeout=10)
+        report = self.sm.memory_report()
+        num_specs = len(self.sm.app_specs[self.good_tag])
+        # the mock has the same specs for every tag, so they're only stored once
+        self.assertEqual(report["specs"], num_specs)
+        self.assertEqual(report["references"], num_specs * len(specmanager.app_version_tags))
+        self.assertEqual(report["tags"][self.good_tag], num_specs)
+        self.assertGreater(report["bytes"], 0)
+
+    @mock.patch('biokbase.narrative.jobs.specmanager.WARM_SPECS_IN_BACKGROUND', False)
+    @mock.patch('biokbase.narrative.jobs.specmanager.clients.get', get_mock_client)
+    def test_disable_background_warming(self):
+        self.sm.reload()
+        for tag in specmanager.app_version_tags:
+            self.assertFalse(self.sm.app_specs[tag].is_loaded())
+        self.assertTrue(self.sm.check_app(self.good_app_id, self.good_tag))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,108 @@
+import fcntl
+import json
+import os
+import tempfile
+import time
+import unittest
+import mock
+from biokbase.narrative.jobs.specsnapshot import SpecSnapshot, SPEC_SNAPSHOT_ENV
+from biokbase.narrative.jobs.specmanager import TagSpecs
+from biokbase.narrative.jobs.specstore import SpecStore
+from .narrative_mock.mockclients import MockClients
+
+SOURCE = "https://fake.kbase.us/services/narrative_method_store/rpc"
+
+
+class SpecSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp_dir.name, "snapshots")
+        self.specs = MockClients().list_methods_spec({})
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_write_read(self):
+        snapshot = SpecSnapshot(directory=self.directory, source=SOURCE)
+        self.assertIsNone(snapshot.read("dev"))
+        self.assertTrue(snapshot.write("dev", self.specs))
+        self.assertEqual(snapshot.read("dev"), self.specs)
+        self.assertIsNone(snapshot.read("release"))
+        with open(snapshot.path("dev")) as f:
+            header = json.loads(f.readline())
+        self.assertEqual(header["tag"], "dev")
+        self.assertEqual(header["count"], len(self.specs))
+        # nothing left over from writing
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ["app_specs.dev.jsonl", "app_specs.dev.jsonl.lock"])
+
+    def test_disabled(self):
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop(SPEC_SNAPSHOT_ENV, None)
+            snapshot = SpecSnapshot(source=SOURCE)
+            self.assertFalse(snapshot.enabled())
+            self.assertFalse(snapshot.write("dev", self.specs))
+            self.assertIsNone(snapshot.read("dev"))
+        with mock.patch.dict(os.environ, {SPEC_SNAPSHOT_ENV: self.directory}):
+            snapshot = SpecSnapshot(source=SOURCE)
+            self.assertTrue(snapshot.write("dev", self.specs))
+            self.assertEqual(snapshot.read("dev"), self.specs)
+
+    def test_stale(self):
+        snapshot = SpecSnapshot(directory=self.directory, source=SOURCE, max_age=60)
+        with mock.patch("time.time", return_value=time.time() - 120):
+            snapshot.write("dev", self.specs)
+        self.assertIsNone(snapshot.read("dev"))
+
+    def test_other_source(self):
+        SpecSnapshot(directory=self.directory, source=SOURCE).write("dev", self.specs)
+        other = SpecSnapshot(directory=self.directory, source=SOURCE + "/other")
+        self.assertIsNone(other.read("dev"))
+
+    def test_truncated(self):
+        snapshot = SpecSnapshot(directory=self.directory, source=SOURCE)
+        snapshot.write("dev", self.specs)
+        with open(snapshot.path("dev")) as f:
+            lines = f.readlines()
+        with open(snapshot.path("dev"), "w") as f:
+            f.writelines(lines[:-1])
+        self.assertIsNone(snapshot.read("dev"))
+        with open(snapshot.path("dev"), "w") as f:
+            f.write("not json\n")
+        self.assertIsNone(snapshot.read("dev"))
+
+    def test_one_writer(self):
+        snapshot = SpecSnapshot(directory=self.directory, source=SOURCE)
+        os.makedirs(self.directory)
+        with open(snapshot.path("dev") + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.assertFalse(snapshot.write("dev", self.specs))
+        self.assertTrue(snapshot.write("dev", self.specs))
+
+    def test_tag_specs_use_snapshot(self):
+        snapshot = SpecSnapshot(directory=self.directory, source=SOURCE)
+        client = MockClients()
+        with mock.patch.object(client, "list_methods_spec", wraps=client.list_methods_spec) as list_specs:
+            specs = TagSpecs("dev", client=client, store=SpecStore(), snapshot=snapshot)
+            specs.load_all()
+            list_specs.assert_called_once()
+            self.assertEqual(len(snapshot.read("dev")), len(specs))
+
+        # a new kernel loads everything from the snapshot, without the service
+        client = mock.Mock()
+        specs = TagSpecs("dev", client=client, store=SpecStore(), snapshot=snapshot)
+        self.assertIn(self.specs[0]["info"]["id"], specs)
+        self.assertTrue(specs.is_loaded())
+        self.assertEqual(len(specs), len(self.specs))
+        self.assertEqual(client.mock_calls, [])
+
+        # unless it's told not to read it
+        client = MockClients()
+        specs = TagSpecs("dev", client=client, store=SpecStore(), snapshot=snapshot,
+                         read_snapshot=False)
+        self.assertIn(self.specs[0]["info"]["id"], specs)
+        self.assertFalse(specs.is_loaded())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from biokbase.narrative.jobs.specstore import SpecStore, intern_strings, spec_key
+from biokbase.narrative.jobs.specmanager import TagSpecs
+from .narrative_mock.mockclients import MockClients
+
+
+def make_spec(app_id, commit_hash=None, name="An App"):
+    info = {"id": app_id, "name": name}
+    if commit_hash is not None:
+        info["git_commit_hash"] = commit_hash
+    return {"info": info, "widgets": {"input": None, "output": "kbaseDefaultNarrativeOutput"}}
+
+
+class SpecStoreTestCase(unittest.TestCase):
+    def test_spec_key(self):
+        self.assertEqual(spec_key(make_spec("Mod/app", "abc")), "Mod/app@abc")
+        no_hash = spec_key(make_spec("Mod/app"))
+        self.assertTrue(no_hash.startswith("sha1:"))
+        self.assertEqual(no_hash, spec_key(make_spec("Mod/app")))
+        self.assertNotEqual(no_hash, spec_key(make_spec("Mod/app", name="Other")))
+
+    def test_intern_strings(self):
+        spec = intern_strings(make_spec("Mod/" + "app"))
+        self.assertEqual(spec, make_spec("Mod/app"))
+        other = intern_strings(make_spec("".join(["Mod/", "app"])))
+        self.assertIs(spec["info"]["id"], other["info"]["id"])
+
+    def test_add_shares_specs(self):
+        store = SpecStore()
+        spec1 = store.add(make_spec("Mod/app", "abc"))
+        spec2 = store.add(make_spec("Mod/app", "abc"))
+        spec3 = store.add(make_spec("Mod/app", "def"))
+        self.assertIs(spec1, spec2)
+        self.assertIsNot(spec1, spec3)
+        self.assertEqual(len(store), 2)
+        report = store.memory_report()
+        self.assertEqual(report["specs"], 2)
+        self.assertEqual(report["references"], 3)
+        self.assertGreater(report["bytes"], 0)
+
+    def test_release(self):
+        store = SpecStore()
+        spec = store.add(make_spec("Mod/app", "abc"))
+        store.add(make_spec("Mod/app", "abc"))
+        store.release(spec)
+        self.assertEqual(len(store), 1)
+        store.release(spec)
+        self.assertEqual(len(store), 0)
+        # releasing something that isn't there is fine
+        store.release(spec)
+        self.assertEqual(store.memory_report()["references"], 0)
+
+    def test_tags_share_specs(self):
+        store = SpecStore()
+        client = MockClients()
+        release = TagSpecs("release", client=client, store=store)
+        dev = TagSpecs("dev", client=client, store=store)
+        release.load_all()
+        dev.load_all()
+        self.assertEqual(len(store), len(release))
+        for app_id in release:
+            self.assertIs(release[app_id], dev[app_id])
+        self.assertEqual(store.memory_report()["references"], 2 * len(release))
+        release.release_all()
+        dev.release_all()
+        self.assertEqual(len(store), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import os
+import tempfile
+from biokbase.narrative.jobs.statestore import JobStateStore, JOB_STATE_CACHE_ENV
+
+
+class JobStateStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache", "job_states.sqlite3")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_put_get(self):
+        store = JobStateStore(path=self.path)
+        state = {"state": {"job_id": "job1", "status": "completed"}}
+        self.assertNotIn("job1", store)
+        self.assertIsNone(store.get("job1"))
+        with self.assertRaises(KeyError):
+            store["job1"]
+        store["job1"] = state
+        self.assertIn("job1", store)
+        self.assertEqual(store["job1"], state)
+        store.close()
+
+    def test_persists(self):
+        state = {"state": {"job_id": "job1", "status": "error"}}
+        store = JobStateStore(path=self.path)
+        store.put("job1", state)
+        store.close()
+        new_store = JobStateStore(path=self.path)
+        self.assertEqual(len(new_store), 0)
+        self.assertEqual(new_store.get("job1"), state)
+        self.assertEqual(len(new_store), 1)
+        new_store.close()
+
+    def test_memory_bound(self):
+        store = JobStateStore(path=self.path, memory_size=2)
+        for i in range(5):
+            store.put("job{}".format(i), {"n": i})
+        self.assertEqual(len(store), 2)
+        self.assertTrue(store.in_memory("job4"))
+        self.assertFalse(store.in_memory("job0"))
+        self.assertTrue(store.is_known("job0"))
+        self.assertFalse(store.is_known("job5"))
+        # the rest are still on disk
+        self.assertEqual(store.get("job0"), {"n": 0})
+        self.assertEqual(len(store), 2)
+        store.close()
+
+    def test_disk_bound(self):
+        store = JobStateStore(path=self.path, memory_size=1, disk_size=3)
+        for i in range(5):
+            store.put("job{}".format(i), {"n": i})
+        self.assertIsNone(store.get("job0"))
+        self.assertEqual(store.get("job4"), {"n": 4})
+        store.close()
+
+    def test_memory_only(self):
+        store = JobStateStore(path="")
+        store.put("job1", {"n": 1})
+        self.assertEqual(store.get("job1"), {"n": 1})
+        store.close()
+        self.assertEqual(store.get("job1"), {"n": 1})
+
+    def test_path_from_env(self):
+        old_path = os.environ.get(JOB_STATE_CACHE_ENV)
+        os.environ[JOB_STATE_CACHE_ENV] = self.path
+        try:
+            self.assertEqual(JobStateStore().path, self.path)
+        finally:
+            if old_path is None:
+                del os.environ[JOB_STATE_CACHE_ENV]
+            else:
+                os.environ[JOB_STATE_CACHE_ENV] = old_path
+
+    def test_remove_clear(self):
+        store = JobStateStore(path=self.path)
+        store.put("job1", {"n": 1})
+        store.put("job2", {"n": 2})
+        store.remove("job1")
+        self.assertNotIn("job1", store)
+        self.assertFalse(store.is_known("job1"))
+        store.clear()
+        self.assertNotIn("job2", store)
+        self.assertFalse(store.is_known("job2"))
+        store.close()
+
+    def test_bad_path(self):
+        store = JobStateStore(path=os.path.join(self.tmp_dir.name, "cache"))
+        os.makedirs(store.path)
+        # can't open a directory as a database, so it just caches in memory
+        store.put("job1", {"n": 1})
+        self.assertEqual(store.get("job1"), {"n": 1})
+
+    def test_bad_size(self):
+        with self.assertRaises(ValueError):
+            JobStateStore(memory_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
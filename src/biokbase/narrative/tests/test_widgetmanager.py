@@ -1,10 +1,13 @@
 import unittest
-from biokbase.narrative.widgetmanager import WidgetManager
+from biokbase.narrative.widgetmanager import WidgetManager, WidgetInfo
+from biokbase.narrative.jobs.specmanager import TagSpecs
+from biokbase.narrative.jobs.specstore import SpecStore
 import IPython
 import mock
 import os
 from .util import TestConfig
-from .narrative_mock.mockclients import get_mock_client
+from biokbase.narrative.app_util import invalidate_object_info
+from .narrative_mock.mockclients import get_mock_client, MockClients
 
 """
 Tests for the WidgetManager class
@@ -120,7 +123,7 @@ class WidgetManagerTestCase(unittest.TestCase):
                                               auth_required=True)
         self.assertIsInstance(widget, IPython.core.display.Javascript)
 
-    @mock.patch('biokbase.narrative.widgetmanager.clients.get', get_mock_client)
+    @mock.patch('biokbase.narrative.clients.get', get_mock_client)
     def test_show_data_cell(self):
         """
         Tests - should do the following:
@@ -138,7 +141,51 @@ class WidgetManagerTestCase(unittest.TestCase):
         print(js_obj.data)
         self.assertIsValidCellCode(js_obj, {}, "viewer", "kbaseGenomeView", "no_id", "some title")
 
-    @mock.patch('biokbase.narrative.widgetmanager.clients.get', get_mock_client)
+    def test_show_data_cells(self):
+        invalidate_object_info()
+        self.wm._viewers.clear()
+        client = MockClients()
+        upas = ["18836/5/1", "18836/5/2", "1/2/3"]
+        with mock.patch('biokbase.narrative.clients.get', return_value=client), \
+                mock.patch.object(client, 'get_object_info3', wraps=client.get_object_info3) as info3, \
+                mock.patch.object(client, 'get_object_info_new', wraps=client.get_object_info_new) as info_new, \
+                mock.patch.object(self.wm._sm, 'get_spec', wraps=self.wm._sm.get_spec) as get_spec:
+            js_objs = self.wm.show_data_widgets(upas, titles=["a", "b", "c"],
+                                                cell_ids=["id_a", "id_b", "id_c"])
+            # objects are looked up together, and reused for validation
+            self.assertEqual(info3.call_count, 1)
+            self.assertEqual(info_new.call_count, 0)
+            # the viewer app is only looked for once for the type
+            self.assertEqual(get_spec.call_count, 1)
+            # it wasn't found, so the next set looks again
+            self.wm.show_data_widgets(upas)
+            self.assertEqual(get_spec.call_count, 2)
+        self.assertEqual(len(js_objs), 3)
+        for (js_obj, title, cell_id) in zip(js_objs, ["a", "b", "c"], ["id_a", "id_b", "id_c"]):
+            self.assertIsValidCellCode(js_obj, {}, "viewer", "kbaseGenomeView", cell_id, title)
+        with self.assertRaises(ValueError):
+            self.wm.show_data_widgets(upas, titles=["a"])
+        invalidate_object_info()
+
+    @mock.patch('biokbase.narrative.clients.get', get_mock_client)
+    def test_show_data_cells_viewer_cache(self):
+        self.wm._viewers.clear()
+        type_specs = {"KBaseGenomes.Genome": {"view_method_ids": ["annotate_contigset"]}}
+        with mock.patch.object(self.wm._sm, '_type_specs', type_specs), \
+                mock.patch.object(self.wm._sm, 'get_spec', wraps=self.wm._sm.get_spec) as get_spec:
+            viewer = self.wm._viewer_for_type("KBaseGenomes.Genome", "release")
+            self.assertEqual(viewer[1], "annotate_contigset")
+            self.assertEqual(viewer[2]['info']['id'], "annotate_contigset")
+            self.assertIsNone(viewer[4])
+            self.assertIs(self.wm._viewer_for_type("KBaseGenomes.Genome", "release"), viewer)
+            self.assertEqual(get_spec.call_count, 1)
+            # new type specs mean finding the viewer again
+            with mock.patch.object(self.wm._sm, '_type_specs', dict(type_specs)):
+                self.wm._viewer_for_type("KBaseGenomes.Genome", "release")
+            self.assertEqual(get_spec.call_count, 2)
+        self.wm._viewers.clear()
+
+    @mock.patch('biokbase.narrative.clients.get', get_mock_client)
     def test_infer_upas(self):
         test_result_upa = "18836/5/1"
         upas = self.wm.infer_upas("testCrazyExample", {
@@ -164,7 +211,35 @@ class WidgetManagerTestCase(unittest.TestCase):
         self.assertEqual(upas['obj_refs'], [test_result_upa]*2)
         self.assertEqual(len(upas.keys()), 8)
 
-    @mock.patch('biokbase.narrative.widgetmanager.clients.get', get_mock_client)
+    def test_infer_upas_bulk(self):
+        invalidate_object_info()
+        client = MockClients()
+        widget_params = [("testCrazyExample", {
+            "obj_name1": f"obj_{i}",
+            "obj_names": ["a", "b"],
+            "obj_ref1": "1/2/3",
+            "obj_refs": ["7/8/9"],
+            "ws_name": "some_ws"
+        }) for i in range(50)]
+        widget_params.append(("kbaseDefaultNarrativeOutput", {"obj_ref": "1/2/3"}))
+        with mock.patch('biokbase.narrative.clients.get', return_value=client), \
+                mock.patch.object(client, 'get_object_info3', wraps=client.get_object_info3) as info3:
+            all_upas = self.wm.infer_upas_bulk(widget_params)
+            # one call for all the unique objects
+            self.assertEqual(info3.call_count, 1)
+            self.assertEqual(len(info3.call_args[0][0]['objects']), 53)
+        self.assertEqual(len(all_upas), 51)
+        for upas in all_upas[:50]:
+            self.assertEqual(upas, {
+                "obj_name1": "18836/5/1",
+                "obj_names": ["18836/5/1", "18836/5/1"],
+                "obj_ref1": "1/2/3",
+                "obj_refs": ["18836/5/1"]
+            })
+        self.assertEqual(all_upas[50], {})
+        invalidate_object_info()
+
+    @mock.patch('biokbase.narrative.clients.get', get_mock_client)
     def test_infer_upas_none(self):
         """
         Test infer_upas when no upas are given. Should return an empty dict.
@@ -176,7 +251,7 @@ class WidgetManagerTestCase(unittest.TestCase):
         self.assertIsInstance(upas, dict)
         self.assertFalse(upas)
 
-    @mock.patch('biokbase.narrative.widgetmanager.clients.get', get_mock_client)
+    @mock.patch('biokbase.narrative.clients.get', get_mock_client)
     def test_infer_upas_simple_widget(self):
         """
         Test infer_upas against the "default" widget - i.e. params don't matter and UPAs don't matter.
@@ -190,7 +265,7 @@ class WidgetManagerTestCase(unittest.TestCase):
         self.assertIsInstance(upas, dict)
         self.assertFalse(upas)
 
-    @mock.patch('biokbase.narrative.widgetmanager.clients.get', get_mock_client)
+    @mock.patch('biokbase.narrative.clients.get', get_mock_client)
     def test_infer_upas_nulls(self):
         """
         Test infer_upas when None is passed to it as an object name. Fields with None
@@ -220,7 +295,7 @@ class WidgetManagerTestCase(unittest.TestCase):
         self.assertEqual(upas['obj_ref2'], test_result_upa)
         self.assertEqual(upas['obj_refs'], [test_result_upa]*2)
 
-    @mock.patch('biokbase.narrative.widgetmanager.clients.get', get_mock_client)
+    @mock.patch('biokbase.narrative.clients.get', get_mock_client)
     def test_missing_env_path(self):
         backup_dir = os.environ["NARRATIVE_DIR"]
         del os.environ["NARRATIVE_DIR"]
@@ -235,5 +310,44 @@ class WidgetManagerTestCase(unittest.TestCase):
         self.assertEqual(code_lines[1].strip(), "require(['kbaseNarrativeOutputCell'], function(KBaseNarrativeOutputCell) {")
         self.assertTrue(code_lines[2].strip().startswith(r"var w = new KBaseNarrativeOutputCell($('#kb-vis"))
 
+    @mock.patch('biokbase.narrative.widgetmanager.system_variable', return_value='12345')
+    def test_widget_info_lazy(self, sys_var):
+        client = MockClients()
+        specs = TagSpecs("release", client=client, store=SpecStore())
+        sm = mock.Mock(app_specs={tag: specs for tag in ["release", "beta", "dev"]})
+        with mock.patch('biokbase.narrative.widgetmanager.SpecManager', return_value=sm):
+            wm = WidgetManager()
+        info = wm.widget_info["release"]
+        self.assertIsInstance(info, WidgetInfo)
+
+        expected = wm.load_widget_info("release")
+        with mock.patch.object(wm, '_method_widget_params', wraps=wm._method_widget_params) as build:
+            self.assertEqual(sorted(info.keys()), sorted(expected.keys()))
+            self.assertNotIn("null", info)
+            build.assert_not_called()
+            # two apps use kbaseTabTable, only those get looked at
+            self.assertEqual(info["kbaseTabTable"]["params"].keys(),
+                             expected["kbaseTabTable"]["params"].keys())
+            self.assertEqual(build.call_count, 2)
+            info["kbaseTabTable"]
+            self.assertEqual(build.call_count, 2)
+            with self.assertRaises(KeyError):
+                info[self.bad_widget]
+
+            # when an app changes, only its widget gets built again
+            briefs = [dict(spec['info'], git_commit_hash='abc') for spec in client.list_methods_spec({})]
+            with mock.patch.object(client, 'list_methods', return_value=briefs):
+                specs.refresh()
+                info["kbaseTabTable"]
+                briefs[5]['git_commit_hash'] = 'def'
+                self.assertEqual(specs.refresh(), {briefs[5]['id']})
+            build.reset_mock()
+            info["kbaseTabTable"]
+            build.assert_not_called()
+            self.assertEqual(info["kbaseGenomeView"]["params"].keys(),
+                             expected["kbaseGenomeView"]["params"].keys())
+            self.assertEqual(build.call_count, 2)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -5,17 +5,20 @@ import time
 from IPython.display import Javascript
 from jinja2 import Template
 from biokbase.narrative.jobs.specmanager import SpecManager
-import biokbase.narrative.clients as clients
 from biokbase.narrative.app_util import (
     map_outputs_from_state,
     validate_parameters,
     check_tag,
-    system_variable
+    system_variable,
+    get_object_info,
+    lookup_objects
 )
 from .upa import (
     is_upa,
     is_ref
 )
+from collections.abc import Mapping
+import threading
 
 """
 widgetmanager.py
@@ -26,6 +29,92 @@ KBase JavaScript widgets.
 __author__ = 'Bill Riehl <wjriehl@lbl.gov>'
 
 
+class WidgetInfo(Mapping):
+    """
+    The widget info for a single tag, keyed on widget name - see
+    WidgetManager.load_widget_info for the structure of each widget's info.
+
+    This only indexes which apps use each widget, and builds the info of a widget the first
+    time it's asked for, using each app's parameters indexed by id. Built widget info is
+    cached. When the SpecManager's specs for the tag change, only the apps whose specs
+    changed get re-indexed, and only the widgets they use get built again.
+    """
+    def __init__(self, widget_manager, tag):
+        self._wm = widget_manager
+        self.tag = tag
+        # the TagSpecs and version this was last synced with
+        self._specs = None
+        self._specs_version = None
+        # keys = app id, values = spec
+        self._app_specs = dict()
+        # keys = app id, values = dict of raw spec params, keys = param id
+        self._param_index = dict()
+        # keys = widget name, values = list of app ids using that widget
+        self._widget_apps = dict()
+        # keys = widget name, values = built widget info
+        self._widgets = dict()
+        self._lock = threading.RLock()
+
+    def _sync(self):
+        specs = self._wm._sm.app_specs[self.tag]
+        if specs is self._specs and specs.version == self._specs_version:
+            return
+        with self._lock:
+            (version, app_specs) = specs.versioned_items()
+            changed = set(app_id for app_id in set(app_specs.keys()) | set(self._app_specs.keys())
+                          if app_specs.get(app_id) is not self._app_specs.get(app_id))
+            if len(changed):
+                for app_id in changed:
+                    self._param_index.pop(app_id, None)
+                widget_apps = dict()
+                for app_id, method in app_specs.items():
+                    widget_name = self._wm._method_widget_name(method)
+                    if widget_name == 'null' or self._wm._method_output_mapping(method) is None:
+                        continue
+                    widget_apps.setdefault(widget_name, list()).append(app_id)
+                # drop the built info of the widgets used by changed apps, before and after
+                for widget_name in set(widget_apps.keys()) | set(self._widget_apps.keys()):
+                    if changed.intersection(widget_apps.get(widget_name, [])) or \
+                            changed.intersection(self._widget_apps.get(widget_name, [])):
+                        self._widgets.pop(widget_name, None)
+                self._widget_apps = widget_apps
+                self._app_specs = app_specs
+            self._specs = specs
+            self._specs_version = version
+
+    def _build(self, widget_name):
+        widgets = dict()
+        for app_id in self._widget_apps[widget_name]:
+            method = self._app_specs[app_id]
+            if app_id not in self._param_index:
+                self._param_index[app_id] = self._wm._method_param_index(method)
+            params = self._wm._method_widget_params(method, self._param_index[app_id])
+            self._wm._merge_widget_params(widgets, widget_name, params)
+        self._wm._finish_widget_info(widgets[widget_name])
+        return widgets[widget_name]
+
+    def __getitem__(self, widget_name):
+        self._sync()
+        with self._lock:
+            if widget_name not in self._widgets:
+                if widget_name not in self._widget_apps:
+                    raise KeyError(widget_name)
+                self._widgets[widget_name] = self._build(widget_name)
+            return self._widgets[widget_name]
+
+    def __contains__(self, widget_name):
+        self._sync()
+        return widget_name in self._widget_apps
+
+    def __iter__(self):
+        self._sync()
+        return iter(list(self._widget_apps.keys()))
+
+    def __len__(self):
+        self._sync()
+        return len(self._widget_apps)
+
+
 class WidgetManager(object):
     """
     Manages data (and other) visualization widgets for use in the KBase Narrative.
@@ -34,7 +123,8 @@ class WidgetManager(object):
     1. Instantiate the manager:
        wm = WidgetManager()
 
-    This loads the widget info. If things have changed, reload_info can be used to update the known widgets.
+    The widget info gets built from the app specs as it's needed, and follows changes to the specs.
+    reload_info can be used to start over.
 
     2. wm.widget_info
     This contains a large dictionary of KBase widget info as reported by the Narrative Method Store.
@@ -51,6 +141,7 @@ class WidgetManager(object):
     5. wm.show_external_widget({see method for details})
     This will fetch and render a widget and its required environment from the configured external CDN.
     """
+    # keys = tag, values = WidgetInfo
     widget_info = dict()
     _version_tags = ["release", "beta", "dev"]
     _cell_id_prefix = "kb-vis-"
@@ -69,19 +160,12 @@ class WidgetManager(object):
 
     def reload_info(self):
         """
-        Fetches all widget information from the method store and contains it in this object.
+        Resets the widget information. It gets built again from the method store specs
+        the next time it's needed - see WidgetInfo.
         """
-        self.widget_info = self._load_all_widget_info()
-
-    def _load_all_widget_info(self):
-        """
-        Loads all widget info and stores it in this object.
-        It does this by calling load_widget_info on all available tags.
-        """
-        info = dict()
-        for tag in self._version_tags:
-            info[tag] = self.load_widget_info(tag)
-        return info
+        self.widget_info = {tag: WidgetInfo(self, tag) for tag in self._version_tags}
+        # keys = (tag, object type), values = (type specs, app specs, viewer) - see _viewer_for_type
+        self._viewers = dict()
 
     def load_widget_info(self, tag="release", verbose=False):
         """
@@ -101,124 +185,156 @@ class WidgetManager(object):
                     "param_value": something, mainly when is_constant==True
                 }
         }
+        Unlike self.widget_info, this builds the info for every widget right away.
         """
         check_tag(tag, raise_exception=True)
 
         methods = list(self._sm.app_specs[tag].values())
         all_widgets = dict()
+        for method in methods:
+            widget_name = self._method_widget_name(method)
+            if widget_name == 'null':
+                if verbose:
+                    print(f"Ignoring a widget named 'null' in {tag} - {method['info']['id']}")
+                continue
+            params = self._method_widget_params(method, self._method_param_index(method))
+            if params is not None:
+                self._merge_widget_params(all_widgets, widget_name, params)
+        for widget in all_widgets.values():
+            self._finish_widget_info(widget)
+        return all_widgets
+
+    def _method_widget_name(self, method):
+        """
+        Returns the name of a method's output widget. Methods with a widget named 'null'
+        should be ignored.
+        """
+        if 'output' not in method['widgets']:
+            return self._default_output_widget
+        return method['widgets']['output']
+
+    def _method_output_mapping(self, method):
+        return method['behavior'].get('kb_service_output_mapping', method['behavior'].get('output_mapping', None))
 
-        # keys = widget names / namespaced require path / etc.
-        # Individual widget values should be:
-        # {params: {
+    def _method_param_index(self, method):
+        """
+        Returns a dict of the method spec's raw parameters, keys = param id.
+        """
+        return {spec_param['id']: spec_param for spec_param in method['parameters']}
+
+    def _method_widget_params(self, method, param_index):
+        """
+        Returns the params that the method's output mapping gives to its output widget, or
+        None if there's no output mapping.
+        param_index is the method's parameters by id - see _method_param_index.
+
+        # Individual widget params should be:
+        # {
         #     name1: {
         #         is_constant: boolean,
         #         value: (***something*** | None) (something = any structure),
-        #         allowed: [ list of allowed values, optional ],
+        #         allowed: [ set of allowed values, optional ],
         #         type: (string, int, float, boolean, etc. list? hash?)
-        #         allowed_types: [ list of allowed ws types, optional ]
+        #         allowed_types: [ set of allowed ws types, optional ]
         #     },
         #     name2: { is_constant, value }
         # }
-
-        for method in methods:
-            if 'output' not in method['widgets']:
-                widget_name = self._default_output_widget
-            else:
-                widget_name = method['widgets']['output']
-            if widget_name == 'null':
-                if verbose:
-                    print(f"Ignoring a widget named 'null' in {tag} - {method['info']['id']}")
-                continue
-            out_mapping = method['behavior'].get('kb_service_output_mapping', method['behavior'].get('output_mapping', None))
-            if out_mapping is not None:
-                params = {}
-                for p in out_mapping:
-                    param_name = p['target_property']
-                    allowed_values = set()
-                    is_constant = False
-                    param_value = None
+        """
+        out_mapping = self._method_output_mapping(method)
+        if out_mapping is None:
+            return None
+        params = {}
+        for p in out_mapping:
+            param_name = p['target_property']
+            allowed_values = set()
+            is_constant = False
+            param_value = None
+            param_type = 'string'
+            allowed_types = set()
+
+            if 'constant_value' in p:
+                # add this val to a set of constant values for that param in that widget.
+                # if more than one possible, this need to be optional
+                is_constant = True
+                allowed_values.add(p['constant_value'])
+            if 'input_parameter' in p and p['input_parameter'] in param_index:
+                # this is a user given input. look up what it expects from the
+                # associated parameter of that name
+                spec_param = param_index[p['input_parameter']]
+                # want its:
+                # field_type = text, float, number, ...
+                in_type = spec_param['field_type']
+                if in_type == 'text':
                     param_type = 'string'
-                    allowed_types = set()
-
-                    if 'constant_value' in p:
-                        # add this val to a set of constant values for that param in that widget.
-                        # if more than one possible, this need to be optional
-                        is_constant = True
-                        allowed_values.add(p['constant_value'])
-                    if 'input_parameter' in p:
-                        # this is a user given input. look up what it expects from the
-                        # associated parameter of that name
-                        in_param = p['input_parameter']
-                        for spec_param in method['parameters']:
-                            if spec_param['id'] == in_param:
-                                # want its:
-                                # field_type = text, float, number, ...
-                                in_type = spec_param['field_type']
-                                if in_type == 'text':
-                                    param_type = 'string'
-                                    if 'text_options' in spec_param:
-                                        validate_as = spec_param['text_options'].get('validate_as', None)
-                                        if validate_as == 'int':
-                                            param_type = 'int'
-                                        elif validate_as == 'float':
-                                            param_type = 'float'
-                                        if 'valid_ws_types' in spec_param['text_options']:
-                                            allowed_types.update(spec_param['text_options']['valid_ws_types'])
-                                elif param_type == 'textarea':
-                                    param_type = 'string'
-                                elif param_type == 'checkbox':
-                                    param_type = 'boolean'
-                                elif param_type == 'dropdown':
-                                    param_type = 'dropdown'
-                                    allowed_values.update([o['value'] for o in spec_param['dropdown_options']])
-                    if 'narrative_system_variable' in p:
-                        # this is something like the ws name or token that needs to get fetched
-                        # by the system. Shouldn't be handled by the user.
-                        is_constant = True
-                        param_value = system_variable(p['narrative_system_variable'])
-                    if 'service_method_output_path' in p:
-                        param_type = 'from_service_output'
-
-                    param_info = {
-                        'is_constant': is_constant,
-                        'param_type': param_type,
-                    }
-                    if allowed_values:
-                        param_info['allowed_values'] = allowed_values
-                    if allowed_types:
-                        param_info['allowed_types'] = allowed_types
-                    if param_value:
-                        param_info['param_value'] = param_value
-                    params[param_name] = param_info
-
-                if widget_name in all_widgets:
-                    # if it's already there, just update the allowed_types and allowed_values for some params that have them
-                    for p_name in params.keys():
-                        if 'allowed_types' in params[p_name]:
-                            if p_name not in all_widgets[widget_name]['params']:
-                                all_widgets[widget_name]['params'][p_name] = params[p_name]
-                            else:
-                                widget_types = all_widgets[widget_name]['params'].get(p_name, {}).get('allowed_types', set())
-                                widget_types.update(params[p_name]['allowed_types'])
-                                all_widgets[widget_name]['params'][p_name]['allowed_types'] = widget_types
-                        if 'allowed_values' in params[p_name]:
-                            if p_name not in all_widgets[widget_name]['params']:
-                                all_widgets[widget_name]['params'][p_name] = params[p_name]
-                            else:
-                                widget_vals = all_widgets[widget_name]['params'].get(p_name, {}).get('allowed_values', set())
-                                widget_vals.update(params[p_name]['allowed_values'])
-                                all_widgets[widget_name]['params'][p_name]['allowed_values'] = widget_vals
-                else:
-                    all_widgets[widget_name] = { 'params': params }
-
-        # finally, turn all sets into lists
-        for w in all_widgets:
-            for p in all_widgets[w]["params"]:
-                if "allowed_types" in all_widgets[w]["params"][p]:
-                    all_widgets[w]["params"][p]["allowed_types"] = list(all_widgets[w]["params"][p]["allowed_types"])
-                if "allowed_values" in all_widgets[w]['params'][p]:
-                    all_widgets[w]["params"][p]["allowed_values"] = list(all_widgets[w]["params"][p]["allowed_values"])
-        return all_widgets
+                    if 'text_options' in spec_param:
+                        validate_as = spec_param['text_options'].get('validate_as', None)
+                        if validate_as == 'int':
+                            param_type = 'int'
+                        elif validate_as == 'float':
+                            param_type = 'float'
+                        if 'valid_ws_types' in spec_param['text_options']:
+                            allowed_types.update(spec_param['text_options']['valid_ws_types'])
+                elif param_type == 'textarea':
+                    param_type = 'string'
+                elif param_type == 'checkbox':
+                    param_type = 'boolean'
+                elif param_type == 'dropdown':
+                    param_type = 'dropdown'
+                    allowed_values.update([o['value'] for o in spec_param['dropdown_options']])
+            if 'narrative_system_variable' in p:
+                # this is something like the ws name or token that needs to get fetched
+                # by the system. Shouldn't be handled by the user.
+                is_constant = True
+                param_value = system_variable(p['narrative_system_variable'])
+            if 'service_method_output_path' in p:
+                param_type = 'from_service_output'
+
+            param_info = {
+                'is_constant': is_constant,
+                'param_type': param_type,
+            }
+            if allowed_values:
+                param_info['allowed_values'] = allowed_values
+            if allowed_types:
+                param_info['allowed_types'] = allowed_types
+            if param_value:
+                param_info['param_value'] = param_value
+            params[param_name] = param_info
+        return params
+
+    def _merge_widget_params(self, all_widgets, widget_name, params):
+        """
+        Adds the params from one method to the widget info in all_widgets.
+        """
+        if widget_name in all_widgets:
+            # if it's already there, just update the allowed_types and allowed_values for some params that have them
+            for p_name in params.keys():
+                if 'allowed_types' in params[p_name]:
+                    if p_name not in all_widgets[widget_name]['params']:
+                        all_widgets[widget_name]['params'][p_name] = params[p_name]
+                    else:
+                        widget_types = all_widgets[widget_name]['params'].get(p_name, {}).get('allowed_types', set())
+                        widget_types.update(params[p_name]['allowed_types'])
+                        all_widgets[widget_name]['params'][p_name]['allowed_types'] = widget_types
+                if 'allowed_values' in params[p_name]:
+                    if p_name not in all_widgets[widget_name]['params']:
+                        all_widgets[widget_name]['params'][p_name] = params[p_name]
+                    else:
+                        widget_vals = all_widgets[widget_name]['params'].get(p_name, {}).get('allowed_values', set())
+                        widget_vals.update(params[p_name]['allowed_values'])
+                        all_widgets[widget_name]['params'][p_name]['allowed_values'] = widget_vals
+        else:
+            all_widgets[widget_name] = {'params': params}
+
+    def _finish_widget_info(self, widget):
+        """
+        Turns all the sets in a widget's info into lists.
+        """
+        for p in widget["params"]:
+            if "allowed_types" in widget["params"][p]:
+                widget["params"][p]["allowed_types"] = list(widget["params"][p]["allowed_types"])
+            if "allowed_values" in widget["params"][p]:
+                widget["params"][p]["allowed_values"] = list(widget["params"][p]["allowed_values"])
 
     def print_widget_inputs(self, widget_name, tag="release"):
         """
@@ -387,7 +503,55 @@ class WidgetManager(object):
         This applies for lists, too. If, above, the value for the "name" parameter was a list of
         strings, this would treat all of those as objects, and try to return a list of UPAs instead.
 
+        To infer the UPAs for many widgets at once, use infer_upas_bulk.
+        """
+        return self.infer_upas_bulk([(widget_name, params)])[0]
+
+    def infer_upas_bulk(self, widget_params, ignore_errors=False):
+        """
+        Infers the UPAs for many widgets at once - see infer_upas. All the objects referred to
+        by all the widgets are looked up together, with a single get_object_info3 call per
+        OBJECT_INFO_BATCH_SIZE unique objects (and anything cached isn't looked up again).
+
+        widget_params - list of (widget_name, params) tuples
+        ignore_errors - if True, objects that can't be found are left out of the results, and
+            don't fail the whole lookup.
 
+        Returns a list of dicts of UPAs, one for each (widget_name, params) tuple, in the same
+        order, like the ones infer_upas returns.
+        """
+        inferred = [self._collect_upa_refs(widget_name, params)
+                    for (widget_name, params) in widget_params]
+
+        # Look them all up together - these go through the object info cache, so unchanged
+        # objects aren't looked up again.
+        all_refs = list()
+        for (upas, lookup_refs, lookup_ref_lists) in inferred:
+            all_refs += lookup_refs.values()
+            for ref_list in lookup_ref_lists.values():
+                all_refs += ref_list
+        found = dict()
+        if len(all_refs):
+            found = lookup_objects(None, all_refs, ignore_errors=ignore_errors)
+
+        results = list()
+        for (upas, lookup_refs, lookup_ref_lists) in inferred:
+            for (param, ref) in lookup_refs.items():
+                if ignore_errors and ref not in found:
+                    continue
+                upas[param] = ';'.join(found[ref][1])
+            for (param, ref_list) in lookup_ref_lists.items():
+                if ignore_errors and not all(ref in found for ref in ref_list):
+                    continue
+                upas[param] = [';'.join(found[ref][1]) for ref in ref_list]
+            results.append(upas)
+        return results
+
+    def _collect_upa_refs(self, widget_name, params):
+        """
+        Works out which of the params refer to objects, for infer_upas.
+        Returns a tuple of 3 dicts, all with keys = param id:
+        (UPAs that were given directly, references to look up, lists of references to look up)
         """
         param_to_context = self.widget_param_map.get(widget_name, {})
         obj_names = list()  # list of tuples - first = param id, second = object name
@@ -421,40 +585,30 @@ class WidgetManager(object):
         # First, test obj_refs, and obj_refs_list
         # These might be references of the form ws_name/obj_name, which are not proper UPAs and
         # need to be resolved. Gotta test 'em all.
-        lookup_params = list()
-        info_params = list()
+        # keys = param id, values = reference string to look up
+        lookup_refs = dict()
 
         for (param, ref) in obj_refs:
             if is_upa(str(ref)):
                 upas[param] = ref
             elif is_ref(str(ref)):
-                info_params.append({"ref": ref})
-                lookup_params.append(param)
+                lookup_refs[param] = str(ref)
             else:
                 raise ValueError(f'Parameter {param} has value {ref} which was expected to refer to an object')
 
-        # params for get_object_info3
         for (param, name) in obj_names:
             # it's possible that these are misnamed and are actually upas already. test and add to
             # the upas dictionary if so.
             if is_upa(str(name)):
                 upas[param] = name
             elif is_ref(str(name)):
-                info_params.append({"ref": name})
-                lookup_params.append(param)
+                lookup_refs[param] = str(name)
             else:
-                info_params.append({"ref": f"{ws}/{name}"})
-                lookup_params.append(param)
-
-        if (len(lookup_params)):
-            ws_client = clients.get('workspace')
-            ws_info = ws_client.get_object_info3({'objects': info_params})
-            for (idx, path) in enumerate(ws_info['paths']):
-                upas[lookup_params[idx]] = ';'.join(path)
+                lookup_refs[param] = f"{ws}/{name}"
 
         # obj_refs and obj_names are done. Do the list versions now.
-        lookup_params = list()
-        info_params = list()
+        # keys = param id, values = list of reference strings to look up
+        lookup_ref_lists = dict()
         for (param, ref_list) in obj_ref_list:
             # error fast if any member of a list isn't actually a ref.
             # this might be me being lazy, but I suspect there's a problem if the inputs aren't
@@ -462,24 +616,12 @@ class WidgetManager(object):
             for ref in ref_list:
                 if not is_ref(str(ref)):
                     raise ValueError(f'Parameter {param} has value {ref_list} which contains an item that is not a valid object reference')
-            lookup_params.append(param)
-            info_params.append([{'ref': ref} for ref in ref_list])
+            lookup_ref_lists[param] = [str(ref) for ref in ref_list]
 
         for (param, name_list) in obj_name_list:
-            info_param = list()
-            for name in name_list:
-                if is_ref(str(name)):
-                    info_param.append({'ref': name})
-                else:
-                    info_param.append({'ref': f"{ws}/{name}"})
-            info_params.append(info_param)
-            lookup_params.append(param)
-
-        # This time we have a one->many mapping from params to each list. Run ws lookup in a loop
-        for (idx, param) in enumerate(lookup_params):
-            ws_info = ws_client.get_object_info3({'objects': info_params[idx]})
-            upas[param] = [';'.join(path) for path in ws_info['paths']]
-        return upas
+            lookup_ref_lists[param] = [str(name) if is_ref(str(name)) else f"{ws}/{name}"
+                                       for name in name_list]
+        return (upas, lookup_refs, lookup_ref_lists)
 
     def show_advanced_viewer_widget(self, widget_name, params, output_state, tag="release",
                                     title="", type="method", cell_id=None, check_widget=False,
@@ -570,15 +712,104 @@ class WidgetManager(object):
             All objects are related to their viewers by an app. This is the tag for that app's
             release state (should be one of release, beta, or dev)
         """
+        return self.show_data_widgets([upa], titles=[title], cell_ids=[cell_id], tag=tag)[0]
+
+    def show_data_widgets(self, upas, titles=None, cell_ids=None, tag="release"):
+        """
+        Renders a viewer widget for each of the given UPAs, the same way as show_data_widget,
+        and returns the list of them, in the same order.
+
+        All of the objects get looked up with a single Workspace call, and their info gets
+        reused to validate the viewer app parameters. Which viewer app to use for each object
+        type is only worked out once, and remembered until the specs change.
+
+        Parameters
+        ----------
+        upas : list of strings
+            UPAs (or Workspace reference paths) of the objects to view.
+        titles=None : list of strings
+            A title for each cell. If None, they're all empty strings.
+        cell_ids=None : list of strings
+            The id of each cell where a widget will live.
+        tag="release" : string
+            The release state of the viewer apps (should be one of release, beta, or dev)
+        """
+        if titles is None:
+            titles = [None] * len(upas)
+        if cell_ids is None:
+            cell_ids = [None] * len(upas)
+        if len(titles) != len(upas) or len(cell_ids) != len(upas):
+            raise ValueError("titles and cell_ids must be the same length as upas")
+
+        found = lookup_objects(None, upas)
+        ws_infos = dict()
+        info_tuples = list()
+        for upa in upas:
+            if upa in found:
+                info_tuple = found[upa][0]
+            else:
+                info_tuple = get_object_info(None, upa)
+            info_tuples.append(info_tuple)
+            ws_infos[upa] = info_tuple
+            if ';' not in upa:
+                # viewer params in the same workspace use the object name
+                ws_infos.setdefault("{}/{}".format(info_tuple[7], info_tuple[1]), info_tuple)
+
+        # keys = object type, values = viewer. This remembers viewers that couldn't be found,
+        # as well, but only for this set of widgets.
+        viewers = dict()
+        widgets = list()
+        for (upa, info_tuple, title, cell_id) in zip(upas, info_tuples, titles, cell_ids):
+            bare_type = info_tuple[2].split('-')[0]
+            if bare_type not in viewers:
+                viewers[bare_type] = self._viewer_for_type(bare_type, tag)
+            widgets.append(self._show_data_widget(upa, info_tuple, viewers[bare_type], title,
+                                                  cell_id, tag, ws_infos))
+        return widgets
+
+    def _viewer_for_type(self, bare_type, tag):
+        """
+        Returns the viewer for objects of the given type (without a version) as a tuple:
+        (type_spec, app_id, app_spec, spec_params, error)
+        type_spec is None if there's no spec for the type, and app_id is None if the type has
+        no viewer app. If the viewer app's spec can't be found, app_spec and spec_params are
+        None, and error is the exception.
+        Viewers that were found are remembered for each type and tag until the type specs or
+        the viewer app's spec change.
+        """
+        type_specs = self._sm.type_specs
+        specs = self._sm.app_specs.get(tag)
+        key = (tag, bare_type)
+        cached = self._viewers.get(key)
+        if cached is not None and cached[0] is type_specs and cached[1] is specs:
+            (app_id, app_spec) = cached[2][1:3]
+            if app_id is None or (app_id in specs and specs[app_id] is app_spec):
+                return cached[2]
+
+        app_id = None
+        app_spec = None
+        spec_params = None
+        type_spec = self._sm.get_type_spec(bare_type, raise_exception=False)
+        if type_spec is not None and type_spec.get('view_method_ids'):
+            app_id = type_spec['view_method_ids'][0]
+            try:
+                app_spec = self._sm.get_spec(app_id, tag=tag)
+                spec_params = self._sm.app_params(app_spec)
+            except Exception as e:
+                # not remembered, so it gets tried again next time
+                return (type_spec, app_id, None, None, e)
+        viewer = (type_spec, app_id, app_spec, spec_params, None)
+        self._viewers[key] = (type_specs, specs, viewer)
+        return viewer
+
+    def _show_data_widget(self, upa, info_tuple, viewer, title, cell_id, tag, ws_infos):
         widget_name = 'widgets/function_output/kbaseDefaultObjectView'   # set as default, overridden below
         widget_data = dict()
         upas = dict()
-        info_tuple = clients.get('workspace').get_object_info_new({'objects': [{'ref': upa}],
-                                                                   'includeMetadata': 1})[0]
         bare_type = info_tuple[2].split('-')[0]
         type_module = bare_type.split(".")[0]
 
-        type_spec = self._sm.get_type_spec(bare_type, raise_exception=False)
+        (type_spec, app_id, app_spec, spec_params, error) = viewer
 
         if type_spec is None:
             widget_data = {
@@ -589,43 +820,38 @@ class WidgetManager(object):
                 }
             }
             upas['upas'] = [upa]  # doompety-doo
-        else:
-            if not type_spec.get('view_method_ids'):
-                return f"No viewer found for objects of type {bare_type}"
-            app_id = type_spec['view_method_ids'][0]
-            app_spec = None
-            try:
-                app_spec = self._sm.get_spec(app_id, tag=tag)
-            except Exception as e:
-                widget_data = {
-                    "error": {
-                        "msg": f"Unable to find specification for viewer app {app_id}",
-                        "method_name": "WidgetManager.show_data_widget",
-                        "traceback": e.message
-                    }
+        elif app_id is None:
+            return f"No viewer found for objects of type {bare_type}"
+        elif error is not None:
+            widget_data = {
+                "error": {
+                    "msg": f"Unable to find specification for viewer app {app_id}",
+                    "method_name": "WidgetManager.show_data_widget",
+                    "traceback": str(error)
                 }
-            if app_spec is not None:
-                spec_params = self._sm.app_params(app_spec)
-                input_params = {}
-                is_ref_path = ';' in upa
-                is_external = info_tuple[7] != os.environ['KB_WORKSPACE_ID']
-                # it's not safe to use reference yet (until we switch to them all over the Apps)
-                # But in case we deal with ref-path we have to do it anyway:
-                obj_param_value = upa if (is_ref_path or is_external) else info_tuple[1]
-                upa_params = list()
-                for param in spec_params:
-                    if param.get('allowed_types') is None or any((t == bare_type or t == type_module) for t in param.get('allowed_types', [])):
-                        input_params[param['id']] = obj_param_value
-                        upa_params.append(param['id'])
-
-                (input_params, ws_refs) = validate_parameters(app_id, tag,
-                                                              spec_params, input_params)
-                (widget_name, widget_data) = map_outputs_from_state([], input_params, app_spec)
-
-                # Figure out params for upas.
-                for mapping in app_spec.get('behavior', {}).get('output_mapping', []):
-                    if mapping.get('input_parameter', '') in upa_params and 'target_property' in mapping:
-                        upas[mapping['target_property']] = upa
+            }
+        else:
+            input_params = {}
+            is_ref_path = ';' in upa
+            is_external = info_tuple[7] != os.environ['KB_WORKSPACE_ID']
+            # it's not safe to use reference yet (until we switch to them all over the Apps)
+            # But in case we deal with ref-path we have to do it anyway:
+            obj_param_value = upa if (is_ref_path or is_external) else info_tuple[1]
+            upa_params = list()
+            for param in spec_params:
+                if param.get('allowed_types') is None or any((t == bare_type or t == type_module) for t in param.get('allowed_types', [])):
+                    input_params[param['id']] = obj_param_value
+                    upa_params.append(param['id'])
+
+            (input_params, ws_refs) = validate_parameters(app_id, tag, spec_params, input_params,
+                                                          ws_infos=ws_infos)
+            (widget_name, widget_data) = map_outputs_from_state([], input_params, app_spec,
+                                                                spec_params=spec_params)
+
+            # Figure out params for upas.
+            for mapping in app_spec.get('behavior', {}).get('output_mapping', []):
+                if mapping.get('input_parameter', '') in upa_params and 'target_property' in mapping:
+                    upas[mapping['target_property']] = upa
 
         return self.show_output_widget(
             widget_name,
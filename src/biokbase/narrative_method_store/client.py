@@ -13,6 +13,7 @@ except ImportError:
     import simplejson as _json
 
 import requests as _requests
+from biokbase import session_pool as _session_pool
 import urllib.parse as _urlparse
 import random as _random
 import base64 as _base64
@@ -146,9 +147,10 @@ class NarrativeMethodStore(object):
                     }
 
         body = _json.dumps(arg_hash, cls=_JSONObjectEncoder)
-        ret = _requests.post(self.url, data=body, headers=self._headers,
-                             timeout=self.timeout,
-                             verify=not self.trust_all_ssl_certificates)
+        session = _session_pool.get_session(self.url)
+        ret = session.post(self.url, data=body, headers=self._headers,
+                           timeout=self.timeout,
+                           verify=not self.trust_all_ssl_certificates)
         if ret.status_code == _requests.codes.server_error:
             if _CT in ret.headers and ret.headers[_CT] == _AJ:
                 err = _json.loads(ret.text)
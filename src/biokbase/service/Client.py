@@ -6,6 +6,7 @@ except ImportError:
     import simplejson as _json
 
 import requests as _requests
+from biokbase import session_pool as _session_pool
 import urllib.parse as _urlparse
 import random as _random
 import base64 as _base64
@@ -143,9 +144,10 @@ class Client(object):
             arg_hash['context'] = json_rpc_context
 
         body = _json.dumps(arg_hash, cls=_JSONObjectEncoder)
-        ret = _requests.post(url, data=body, headers=self._headers,
-                             timeout=self.timeout,
-                             verify=not self.trust_all_ssl_certificates)
+        session = _session_pool.get_session(url)
+        ret = session.post(url, data=body, headers=self._headers,
+                           timeout=self.timeout,
+                           verify=not self.trust_all_ssl_certificates)
         if ret.status_code == _requests.codes.server_error:
             json_header = None
             if _CT in ret.headers:
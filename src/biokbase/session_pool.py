@@ -0,0 +1,176 @@
+"""
+Shared, keep-alive HTTP sessions for the KBase service clients.
+
+Each service endpoint (scheme + host + port) gets a single requests.Session
+with a pooled HTTPAdapter, so repeated RPC calls to the same service reuse
+open TCP/TLS connections instead of paying a fresh handshake every time.
+
+Usage from a generated client:
+    from biokbase import session_pool as _session_pool
+    ret = _session_pool.get_session(url).post(url, data=body, ...)
+
+Connection counters are available through connection_stats(), and the pool
+size and retry behavior can be changed with configure().
+"""
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import (
+    HTTPConnectionPool,
+    HTTPSConnectionPool
+)
+from urllib3.util.retry import Retry
+
+# Number of connections kept open per endpoint.
+DEFAULT_POOL_SIZE = 10
+# Number of times a failed connection attempt is retried. Only connection
+# errors are retried - JSON-RPC calls are POSTs, so we never resend a request
+# the server may already have seen.
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.2
+
+_config = {
+    "pool_size": DEFAULT_POOL_SIZE,
+    "max_retries": DEFAULT_MAX_RETRIES,
+    "backoff_factor": DEFAULT_BACKOFF_FACTOR
+}
+
+# keys = endpoint string, values = requests.Session
+_sessions = dict()
+# keys = endpoint string, values = {"new": int, "reused": int}
+_stats = dict()
+_lock = threading.Lock()
+
+
+def _endpoint(url):
+    """
+    Returns the endpoint key for a url - scheme://host:port. All services
+    behind the same host share a connection pool.
+    """
+    parsed = urlparse(url)
+    port = parsed.port
+    if port is None:
+        port = 443 if parsed.scheme == "https" else 80
+    return "{}://{}:{}".format(parsed.scheme, parsed.hostname, port)
+
+
+def _count(scheme, host, port, key):
+    endpoint = "{}://{}:{}".format(scheme, host, port)
+    with _lock:
+        counts = _stats.setdefault(endpoint, {"new": 0, "reused": 0})
+        counts[key] += 1
+
+
+class _CountingPoolMixin(object):
+    """
+    Tracks how many connections a urllib3 pool opens, versus how many
+    requests are served over an already open connection.
+    """
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        # A connection without an open socket (either brand new, or one that
+        # was dropped by the server) needs a fresh handshake.
+        if getattr(conn, "sock", None) is not None:
+            _count(self.scheme, self.host, self.port, "reused")
+        else:
+            _count(self.scheme, self.host, self.port, "new")
+        return conn
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool
+        }
+
+
+def _make_session():
+    retries = Retry(total=_config["max_retries"],
+                    connect=_config["max_retries"],
+                    read=0,
+                    redirect=0,
+                    status=0,
+                    backoff_factor=_config["backoff_factor"],
+                    raise_on_status=False)
+    adapter = _PooledAdapter(pool_connections=1,
+                             pool_maxsize=_config["pool_size"],
+                             max_retries=retries)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(url):
+    """
+    Returns the shared requests.Session for the endpoint that url points to,
+    creating it if needed.
+    """
+    endpoint = _endpoint(url)
+    session = _sessions.get(endpoint)
+    if session is None:
+        with _lock:
+            session = _sessions.get(endpoint)
+            if session is None:
+                session = _make_session()
+                _sessions[endpoint] = session
+    return session
+
+
+def configure(pool_size=None, max_retries=None, backoff_factor=None):
+    """
+    Sets the connection pool size and retry behavior used for all sessions.
+    Existing sessions are closed, and new ones get made with the new settings
+    on their next use.
+    """
+    if pool_size is not None:
+        if int(pool_size) < 1:
+            raise ValueError("pool_size must be at least 1")
+        _config["pool_size"] = int(pool_size)
+    if max_retries is not None:
+        if int(max_retries) < 0:
+            raise ValueError("max_retries must be >= 0")
+        _config["max_retries"] = int(max_retries)
+    if backoff_factor is not None:
+        _config["backoff_factor"] = float(backoff_factor)
+    reset()
+
+
+def reset():
+    """
+    Closes all pooled sessions and their open connections.
+    """
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def connection_stats(reset_counts=False):
+    """
+    Returns a dict of connection counters, keyed on endpoint:
+    {
+        "https://kbase.us:443": {"new": int, "reused": int}
+    }
+    "new" is the number of connections opened, and "reused" is the number of
+    requests that were sent over an already open connection.
+    If reset_counts is True, the counters get zeroed after reading them.
+    """
+    with _lock:
+        stats = {endpoint: dict(counts) for endpoint, counts in _stats.items()}
+        if reset_counts:
+            _stats.clear()
+    return stats